@@ -1,4 +1,5 @@
-from typing import Optional
+from typing import List, Optional
+from uuid import uuid4
 
 from fastapi import (
     APIRouter,
@@ -10,7 +11,6 @@ from fastapi import (
     status,
 )
 
-from talkingdb.clients.sqlite import sqlite_conn
 from talkingdb.helpers import spool
 from talkingdb.helpers.auth import verify_api_key
 from talkingdb.helpers.job import store as job_store
@@ -21,17 +21,32 @@ from talkingdb.helpers.validation import (
 )
 from talkingdb.models.api.response import ErrorResponse
 from talkingdb.models.job.job import JobModel
+from talkingdb.models.job.state import JobState
 from talkingdb.models.job.type import JobType
 from talkingdb.models.metadata.metadata import DEFAULT_METADATA
 
 from app.core import config as job_config
-from app.model.jobs import JobAcceptedResponse
-from app.services import jobs
+from app.core.sqlite_pool import sqlite_conn
+from app.model.jobs import JobAcceptedResponse, JobGroupAcceptedResponse
+from app.services import job_groups, jobs
 
 
 router = APIRouter(prefix="/v1", tags=["Jobs"])
 
 
+def _queue_full() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail={
+            "error": "QUEUE_FULL",
+            "error_code": "QUEUE_FULL",
+            "message": "Ingestion worker pool is at capacity",
+            "retry_after_seconds": job_config.RETRY_AFTER_SECONDS,
+        },
+        headers={"Retry-After": str(job_config.RETRY_AFTER_SECONDS)},
+    )
+
+
 @router.post(
     "/documents",
     response_model=JobAcceptedResponse,
@@ -64,16 +79,7 @@ async def submit_document_job(
     try:
         jobs.acquire_slot()
     except jobs.QueueFull:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail={
-                "error": "QUEUE_FULL",
-                "error_code": "QUEUE_FULL",
-                "message": "Ingestion worker pool is at capacity",
-                "retry_after_seconds": job_config.RETRY_AFTER_SECONDS,
-            },
-            headers={"Retry-After": str(job_config.RETRY_AFTER_SECONDS)},
-        )
+        raise _queue_full()
 
     temp_path: Optional[str] = None
     enqueued = False
@@ -101,6 +107,8 @@ async def submit_document_job(
             temp_path=temp_path,
             filename=file.filename or f"upload.{ext}",
             metadata_json=metadata_json,
+            tenant=api_key,
+            file_size_bytes=size_bytes,
         )
         enqueued = True
 
@@ -114,3 +122,137 @@ async def submit_document_job(
         if not enqueued:
             spool.discard(temp_path)
             jobs.release_slot()
+
+
+@router.post(
+    "/documents/batch",
+    response_model=JobGroupAcceptedResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Submit several documents as one batch",
+    description=(
+        "Upload many documents in one multipart request. The batch is "
+        "admitted as one unit that occupies at most ``max_parallel`` worker "
+        "queue slots, every job row is created in one transaction, and the "
+        "returned ``group_id`` reports aggregate progress at "
+        "``GET /v1/job-groups/{group_id}``. Jobs beyond ``max_parallel`` "
+        "stay QUEUED and start as earlier ones finish. The request body is "
+        "received in full (files above a small size are buffered to "
+        "temporary files) before any job is created."
+    ),
+    responses={
+        401: {"model": ErrorResponse, "description": "Invalid or missing API key"},
+        413: {"model": ErrorResponse, "description": "Too many files, or a file exceeds maximum allowed size"},
+        415: {"model": ErrorResponse, "description": "Unsupported file type"},
+        429: {"model": ErrorResponse, "description": "Worker queue has no room for the batch's parallel slots"},
+        503: {"model": ErrorResponse, "description": "Spool storage exhausted, or no job could be dispatched"},
+    },
+)
+async def submit_document_batch(
+    files: List[UploadFile] = File(..., description="Documents to upload (.docx or .pdf)"),
+    metadata: Optional[str] = Form(DEFAULT_METADATA, description="JSON metadata string applied to every file"),
+    max_parallel: int = Form(0, ge=0, description="Cap on this batch's concurrently running jobs; 0 uses the server default"),
+    api_key: str = Depends(verify_api_key),
+) -> JobGroupAcceptedResponse:
+    """Submit a batch of document ingestion jobs as one job group.
+
+    ``List[UploadFile]`` makes Starlette parse the whole multipart body
+    before this handler runs: each file is held in a spooled temporary file
+    (in memory up to 1 MB, then on disk) and then copied into the job spool.
+    Uploads are not streamed into the spool, so a batch costs up to twice
+    its size in temporary disk space while it is accepted.
+    """
+    if len(files) > job_config.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={
+                "error_code": "BATCH_TOO_LARGE",
+                "message": (
+                    f"At most {job_config.BATCH_MAX_FILES} files per batch"
+                ),
+            },
+        )
+    exts = [validate_file_type(file) for file in files]
+
+    spool.assert_spool_capacity()
+
+    try:
+        slots = jobs.acquire_group_slots(len(files), max_parallel)
+    except jobs.QueueFull:
+        raise _queue_full()
+
+    metadata_json = metadata if metadata else DEFAULT_METADATA
+    group_id = uuid4().hex
+    spooled: List[JobModel] = []
+    enqueued = False
+    try:
+        for file, ext in zip(files, exts):
+            temp_path, size_bytes = await spool.spool_upload(
+                file,
+                max_size_mb=max_file_size_mb_for(ext),
+                max_size_bytes=max_file_size_bytes_for(ext),
+            )
+            job = JobModel.new(
+                job_type=JobType.DOCUMENT,
+                filename=file.filename,
+            )
+            job.file_size_bytes = size_bytes
+            job.temp_path = temp_path
+            spooled.append(job)
+
+        with sqlite_conn() as conn:
+            for job in spooled:
+                job_store.insert(conn, job)
+            job_groups.insert(
+                conn, group_id, api_key, [job.job_id for job in spooled]
+            )
+
+        # From here the group owns its slots and spooled files.
+        enqueued = True
+        failed = set(
+            jobs.enqueue_group(
+                group=group_id,
+                slots=slots,
+                jobs=[
+                    dict(
+                        job_id=job.job_id,
+                        temp_path=job.temp_path,
+                        filename=job.filename or f"upload.{ext}",
+                        metadata_json=metadata_json,
+                        tenant=api_key,
+                        file_size_bytes=job.file_size_bytes,
+                    )
+                    for job, ext in zip(spooled, exts)
+                ],
+            )
+        )
+        if len(failed) == len(spooled):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail={
+                    "error_code": "QUEUE_UNAVAILABLE",
+                    "message": "No job of the batch could be dispatched",
+                },
+            )
+
+        return JobGroupAcceptedResponse(
+            group_id=group_id,
+            job_count=len(spooled),
+            jobs=[
+                JobAcceptedResponse(
+                    job_id=job.job_id,
+                    job_type=job.job_type.value,
+                    state=(
+                        JobState.FAILED.value
+                        if job.job_id in failed
+                        else job.state.value
+                    ),
+                )
+                for job in spooled
+            ],
+        )
+
+    finally:
+        if not enqueued:
+            for job in spooled:
+                spool.discard(job.temp_path)
+            jobs.release_slots(slots)
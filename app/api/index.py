@@ -1,20 +1,55 @@
+import json
+from typing import Callable, Optional, Tuple
 
-from fastapi import APIRouter
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse
+from talkingdb.helpers import spool
+from talkingdb.helpers.auth import verify_api_key
+from talkingdb.helpers.job import store as job_store
+from talkingdb.models.api.response import ErrorResponse
 from talkingdb.models.document.document import DocumentModel
 from talkingdb.models.document.indexes.index import FileIndexModel
 from talkingdb.models.graph.graph import GraphModel
-from talkingdb.models.metadata.metadata import Metadata
+from talkingdb.models.job.job import JobModel
+from talkingdb.models.job.type import JobType
+from talkingdb.models.metadata.metadata import DEFAULT_METADATA, Metadata
+from app.api.documents import _queue_full
 from app.services.indexer import IndexerService
+from app.core import config
+from app.services import (
+    element_stream,
+    graph_layout,
+    graph_store,
+    graph_view,
+    jobs,
+    render_cache,
+)
 from app.services.graph_html import render_graph_html
-from talkingdb.clients.sqlite import sqlite_conn
+from app.services.symbol_table import symbol_table
+from app.core.sqlite_pool import sqlite_conn
 from app.model.index import IndexElementRequest
+from app.model.jobs import JobAcceptedResponse
 router = APIRouter(prefix="/index", tags=["Indexer"])
 
 
 @router.post("/document/elements")
 async def parse_element(request: IndexElementRequest):
 
+    # Indexing is CPU-bound and writes to SQLite; keep it off the loop.
+    return await run_in_threadpool(_index_elements, request)
+
+
+def _index_elements(request: IndexElementRequest) -> dict:
     metadata = request.metadata
     metadata = Metadata.ensure_metadata(metadata)
     file_index = request.document.build_index()
@@ -26,11 +61,292 @@ async def parse_element(request: IndexElementRequest):
     return {"graph_id": index.graph_id}
 
 
+@router.post(
+    "/document/elements/stream",
+    response_model=JobAcceptedResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        401: {"model": ErrorResponse, "description": "Invalid or missing API key"},
+        413: {"model": ErrorResponse, "description": "Body exceeds INDEX_STREAM_MAX_BYTES"},
+        422: {"model": ErrorResponse, "description": "Body is not element NDJSON"},
+        429: {"model": ErrorResponse, "description": "Worker queue is full"},
+        503: {"model": ErrorResponse, "description": "Spool storage exhausted"},
+    },
+)
+async def stream_elements(
+    request: Request, api_key: str = Depends(verify_api_key)
+) -> JobAcceptedResponse:
+    """Spool an NDJSON stream of document parts and index it as a job.
+
+    See :mod:`app.services.element_stream` for the body format. The body is
+    written to the job spool as it arrives and the request returns the job
+    id at once; follow the job at ``/v1/jobs/{job_id}`` like an upload.
+    """
+    spool.assert_spool_capacity()
+
+    try:
+        jobs.acquire_slot()
+    except jobs.QueueFull:
+        raise _queue_full()
+
+    temp_path = None
+    enqueued = False
+    try:
+        try:
+            temp_path, metadata, size_bytes, parts = await element_stream.spool_body(
+                request.stream(),
+                config.INDEX_STREAM_MAX_LINE_BYTES,
+                config.INDEX_STREAM_MAX_BYTES,
+            )
+            if not parts:
+                raise element_stream.StreamFormatError(
+                    "no document lines in request body"
+                )
+            metadata_json = json.dumps(metadata) if metadata else DEFAULT_METADATA
+            Metadata.ensure_metadata(Metadata.from_json(metadata_json))
+        except element_stream.StreamTooLarge as exc:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail={"error_code": "STREAM_TOO_LARGE", "message": str(exc)},
+            )
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={"error_code": "INVALID_STREAM", "message": str(exc)},
+            )
+
+        job = JobModel.new(
+            job_type=JobType.DOCUMENT,
+            filename=element_stream.FILENAME,
+        )
+        job.file_size_bytes = size_bytes
+        job.temp_path = temp_path
+
+        with sqlite_conn() as conn:
+            job_store.insert(conn, job)
+
+        jobs.enqueue_reserved(
+            job_id=job.job_id,
+            temp_path=temp_path,
+            filename=element_stream.FILENAME,
+            metadata_json=metadata_json,
+            tenant=api_key,
+            file_size_bytes=size_bytes,
+        )
+        enqueued = True
+
+        return JobAcceptedResponse(
+            job_id=job.job_id,
+            job_type=job.job_type.value,
+            state=job.state.value,
+        )
+
+    finally:
+        if not enqueued:
+            spool.discard(temp_path)
+            jobs.release_slot()
+
+
+# (If-None-Match, Accept-Encoding) of a request for a cached rendering.
+_CacheHeaders = Tuple[Optional[str], Optional[str]]
+
+
+def _cache_headers(
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+) -> _CacheHeaders:
+    return if_none_match, accept_encoding
+
+
+def _cached_response(
+    graph_id: str,
+    key: str,
+    render: Callable[[], Tuple[bytes, str]],
+    headers: _CacheHeaders,
+) -> Response:
+    """Serve ``render()`` for the current graph version, or 304."""
+    if_none_match, accept_encoding = headers
+    version = render_cache.version(graph_id)
+    base = render_cache.tag(graph_id, version, key)
+    out = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    matched = render_cache.matches(if_none_match, base)
+    if matched is not None:
+        out["ETag"] = (
+            matched if matched != "*" else render_cache.etag(base, "identity")
+        )
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=out)
+
+    rendered = render_cache.get(graph_id, version, key, render)
+    encoding = render_cache.negotiate(accept_encoding, rendered)
+    out["ETag"] = render_cache.etag(rendered.tag, encoding)
+    if encoding != "identity":
+        out["Content-Encoding"] = encoding
+    return Response(
+        content=rendered.bodies[encoding],
+        media_type=rendered.media_type,
+        headers=out,
+    )
+
+
 @router.get("/html", response_class=HTMLResponse)
-async def view_graph(graph_id: str):
+async def view_graph(
+    graph_id: str,
+    cache: _CacheHeaders = Depends(_cache_headers),
+):
+
+    def render():
+        return _graph_page(graph_id).encode(), "text/html; charset=utf-8"
+
+    # Building the page may compute the graph's layout; keep it off the loop.
+    try:
+        return await run_in_threadpool(
+            _cached_response, graph_id, "html", render, cache
+        )
+    except KeyError:
+        render_cache.evict(graph_id)
+        raise _graph_not_found(graph_id)
+
 
+def _graph_page(graph_id: str) -> str:
+    size = graph_store.get(graph_id).graph.number_of_nodes()
+
+    # Large graphs start from a summary; the page fetches the rest.
+    if size > config.VIEWER_INLINE_MAX_NODES:
+        payload = graph_view.summary(
+            graph_id, config.VIEWER_SUMMARY_NODES, config.VIEWER_MAX_EDGES
+        )
+        return render_graph_html(payload, api_base=f"/index/graph/{graph_id}")
+
+    layout = graph_layout.get(graph_id)
     with sqlite_conn() as conn:
-        gm = GraphModel.load(conn, graph_id, True)
+        gm = graph_store.load(conn, graph_id, with_text=True)
+    symbol_table.attach_labels(gm.graph)
+    graph_layout.attach(gm.graph, layout)
+
+    graph = gm.g_json()
+    graph["layout"] = True
+    return render_graph_html(graph)
+
+
+# ------------------------------------------------------------ graph slices
+def _graph_not_found(graph_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail={
+            "error_code": "GRAPH_NOT_FOUND",
+            "message": f"Graph ID not found: {graph_id}",
+        },
+    )
+
+
+async def _node_or_404(graph_id: str, node: str):
+    try:
+        return await run_in_threadpool(graph_view.node_key, graph_id, node)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error_code": "NODE_NOT_FOUND",
+                "message": f"Node {node} not found in graph {graph_id}",
+            },
+        )
+
+
+async def _slice_or_error(fn, graph_id: str, cache: _CacheHeaders, *args):
+    key = f"{fn.__name__}:{json.dumps(args, default=str)}"
+
+    def render():
+        body = json.dumps(fn(graph_id, *args), default=str).encode()
+        return body, "application/json"
+
+    # Slices of a cold graph load it and compute its layout first.
+    try:
+        return await run_in_threadpool(
+            _cached_response, graph_id, key, render, cache
+        )
+    except KeyError:
+        render_cache.evict(graph_id)
+        raise _graph_not_found(graph_id)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error_code": "INVALID_CURSOR", "message": str(exc)},
+        )
+
+
+_NODE_LIMIT = Query(200, ge=1, le=config.VIEWER_MAX_NODES)
+_EDGE_LIMIT = Query(2000, ge=0, le=config.VIEWER_MAX_EDGES)
+_CACHE = Depends(_cache_headers)
+
+
+@router.get("/graph/{graph_id}/summary")
+async def graph_summary(
+    graph_id: str,
+    node_limit: int = Query(
+        config.VIEWER_SUMMARY_NODES, ge=1, le=config.VIEWER_MAX_NODES
+    ),
+    edge_limit: int = _EDGE_LIMIT,
+    cache: _CacheHeaders = _CACHE,
+):
+    """File-index tree plus top-degree nodes, with type counts."""
+    return await _slice_or_error(
+        graph_view.summary, graph_id, cache, node_limit, edge_limit
+    )
+
+
+@router.get("/graph/{graph_id}/ego")
+async def graph_ego(
+    graph_id: str,
+    node: str,
+    radius: int = Query(1, ge=0, le=3),
+    node_limit: int = _NODE_LIMIT,
+    edge_limit: int = _EDGE_LIMIT,
+    cache: _CacheHeaders = _CACHE,
+):
+    """Nodes within ``radius`` hops of ``node`` and the edges among them."""
+    key = await _node_or_404(graph_id, node)
+    return await _slice_or_error(
+        graph_view.ego, graph_id, cache, key, radius, node_limit, edge_limit
+    )
+
+
+@router.get("/graph/{graph_id}/neighbors")
+async def graph_neighbors(
+    graph_id: str,
+    node: str,
+    cursor: Optional[str] = None,
+    limit: int = _NODE_LIMIT,
+    cache: _CacheHeaders = _CACHE,
+):
+    """One page of a node's neighbors."""
+    key = await _node_or_404(graph_id, node)
+    return await _slice_or_error(
+        graph_view.neighbors, graph_id, cache, key, cursor, limit
+    )
+
+
+@router.get("/graph/{graph_id}/nodes")
+async def graph_nodes_by_type(
+    graph_id: str,
+    type: str,
+    cursor: Optional[str] = None,
+    limit: int = _NODE_LIMIT,
+    cache: _CacheHeaders = _CACHE,
+):
+    """One page of nodes of one type, highest degree first."""
+    return await _slice_or_error(
+        graph_view.nodes_by_type, graph_id, cache, type, cursor, limit
+    )
+
 
-    html = render_graph_html(gm.g_json())
-    return html
+@router.get("/graph/{graph_id}/search")
+async def graph_search(
+    graph_id: str,
+    q: str = Query(..., min_length=1),
+    cursor: Optional[str] = None,
+    limit: int = _NODE_LIMIT,
+    cache: _CacheHeaders = _CACHE,
+):
+    """One page of nodes whose label or id contains ``q``."""
+    return await _slice_or_error(graph_view.search, graph_id, cache, q, cursor, limit)
@@ -1,12 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, Response, status
+import json
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 
-from talkingdb.clients.sqlite import sqlite_conn
 from talkingdb.helpers.auth import verify_api_key
 from talkingdb.helpers.job import store as job_store
 from talkingdb.models.api.response import ErrorResponse
 from talkingdb.models.job.job import JobModel
 
-from app.model.jobs import JobStatusResponse
+from app.core import config
+from app.core.sqlite_pool import sqlite_conn
+from app.model.jobs import JobGroupStatusResponse, JobStatusResponse
+from app.services import job_events, job_groups
 
 
 router = APIRouter(prefix="/v1", tags=["Jobs"])
@@ -17,18 +33,22 @@ def _no_store(response: Response) -> None:
     response.headers["Cache-Control"] = "no-store"
 
 
+def _not_found(job_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail={
+            "error_code": "JOB_NOT_FOUND",
+            "message": f"Unknown job id: {job_id}",
+        },
+    )
+
+
 def _job_or_404(job_id: str) -> JobModel:
     """Return a persisted job or raise HTTP 404."""
     with sqlite_conn() as conn:
         job = job_store.get(conn, job_id)
     if job is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail={
-                "error_code": "JOB_NOT_FOUND",
-                "message": f"Unknown job id: {job_id}",
-            },
-        )
+        raise _not_found(job_id)
     return job
 
 
@@ -39,9 +59,13 @@ def _job_or_404(job_id: str) -> JobModel:
     description=(
         "Return the current lifecycle state and progress of a job. "
         "The ``job_type`` field tells the caller what kind of background "
-        "operation this job represents."
+        "operation this job represents. Every response carries an ``ETag``; "
+        "send it back as ``If-None-Match`` with ``wait`` > 0 to long-poll: "
+        "the request returns as soon as the status changes, or with 304 "
+        "after ``wait`` seconds."
     ),
     responses={
+        304: {"description": "Status unchanged within the wait window"},
         401: {"model": ErrorResponse, "description": "Invalid or missing API key"},
         404: {"model": ErrorResponse, "description": "Unknown job id"},
     },
@@ -49,12 +73,100 @@ def _job_or_404(job_id: str) -> JobModel:
 async def get_job_status(
     response: Response,
     job_id: str = Path(..., description="Stable job identifier"),
+    wait: int = Query(
+        0,
+        ge=0,
+        le=config.JOB_LONG_POLL_MAX_SECONDS,
+        description="Seconds to hold the request open for a change",
+    ),
+    if_none_match: Optional[str] = Header(None),
     api_key: str = Depends(verify_api_key),
-) -> JobStatusResponse:
-    """Fetch the latest persisted state for a job."""
+):
+    """Fetch the latest state for a job, optionally waiting for a change."""
     _no_store(response)
-    job = _job_or_404(job_id)
-    return JobStatusResponse(**job.to_status_payload())
+    if not wait and not if_none_match:
+        hit = job_events.cached(job_id)
+        if hit is None:
+            job = _job_or_404(job_id)
+            job_events.publish_job(job)
+            payload = job_events.status_payload(job)
+            hit = job_events.etag(payload), payload
+        tag, payload = hit
+        response.headers["ETag"] = tag
+        return JobStatusResponse(**payload)
+
+    known = job_events.parse_etag(if_none_match)
+    try:
+        update = await job_events.wait(job_id, known, wait)
+    except KeyError:
+        raise _not_found(job_id)
+    if update is None:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": if_none_match, "Cache-Control": "no-store"},
+        )
+
+    tag, payload = update
+    response.headers["ETag"] = tag
+    return JobStatusResponse(**payload)
+
+
+@router.get(
+    "/jobs/{job_id}/events",
+    summary="Stream status changes of a job",
+    description=(
+        "Server-Sent Events stream of a job's status. Each ``status`` event "
+        "carries the same payload as ``GET /v1/jobs/{job_id}``; the stream "
+        "ends after the terminal state. Reconnects may send "
+        "``Last-Event-ID`` to skip the status already seen."
+    ),
+    responses={
+        401: {"model": ErrorResponse, "description": "Invalid or missing API key"},
+        404: {"model": ErrorResponse, "description": "Unknown job id"},
+    },
+)
+async def stream_job_events(
+    request: Request,
+    job_id: str = Path(..., description="Stable job identifier"),
+    last_event_id: Optional[str] = Header(None),
+    api_key: str = Depends(verify_api_key),
+) -> StreamingResponse:
+    """Push stage, progress and terminal transitions as they happen."""
+    tag = job_events.parse_etag(last_event_id)
+    try:
+        first = await job_events.wait(job_id, tag, 0)
+    except KeyError:
+        raise _not_found(job_id)
+
+    async def events() -> AsyncIterator[str]:
+        nonlocal tag
+        update = first
+        while True:
+            if update is None:
+                yield ": keep-alive\n\n"
+            else:
+                tag, payload = update
+                yield (
+                    f"id: {tag}\n"
+                    f"event: status\n"
+                    f"data: {json.dumps(payload)}\n\n"
+                )
+                if job_events.is_terminal(payload):
+                    return
+            if await request.is_disconnected():
+                return
+            try:
+                update = await job_events.wait(
+                    job_id, tag, config.JOB_EVENTS_KEEPALIVE_SECONDS
+                )
+            except KeyError:
+                return
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post(
@@ -85,4 +197,73 @@ async def cancel_job(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="vanished"
         )
+    job_events.publish_job(updated)
     return JobStatusResponse(**updated.to_status_payload())
+
+
+@router.get(
+    "/job-groups/{group_id}",
+    response_model=JobGroupStatusResponse,
+    summary="Get aggregate status of a batch",
+    description=(
+        "Return state counts and mean progress over every job submitted by "
+        "one ``POST /v1/documents/batch`` call, optionally with each job's "
+        "status. Jobs already removed by retention are left out."
+    ),
+    responses={
+        401: {"model": ErrorResponse, "description": "Invalid or missing API key"},
+        404: {"model": ErrorResponse, "description": "Unknown group id"},
+    },
+)
+async def get_job_group_status(
+    response: Response,
+    group_id: str = Path(..., description="Stable batch identifier"),
+    include_jobs: bool = Query(False, description="Include per-job status"),
+    api_key: str = Depends(verify_api_key),
+) -> JobGroupStatusResponse:
+    """Aggregate the status of every job in a group."""
+    _no_store(response)
+    with sqlite_conn() as conn:
+        job_ids = job_groups.job_ids(conn, group_id)
+    if job_ids is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error_code": "JOB_GROUP_NOT_FOUND",
+                "message": f"Unknown group id: {group_id}",
+            },
+        )
+
+    payloads = {}
+    for job_id in job_ids:
+        hit = job_events.cached(job_id)
+        if hit is not None:
+            payloads[job_id] = hit[1]
+    missing = [job_id for job_id in job_ids if job_id not in payloads]
+    if missing:
+        with sqlite_conn() as conn:
+            for job_id in missing:
+                job = job_store.get(conn, job_id)
+                if job is not None:
+                    job_events.publish_job(job)
+                    payloads[job_id] = job_events.status_payload(job)
+
+    ordered = [payloads[job_id] for job_id in job_ids if job_id in payloads]
+    state_counts: Dict[str, int] = {}
+    total = 0
+    for payload in ordered:
+        state = payload["state"]
+        state_counts[state] = state_counts.get(state, 0) + 1
+        if job_events.is_terminal(payload):
+            total += 100
+        else:
+            total += payload.get("progress") or 0
+
+    return JobGroupStatusResponse(
+        group_id=group_id,
+        job_count=len(ordered),
+        state_counts=state_counts,
+        progress=round(total / len(ordered)) if ordered else 100,
+        done=all(job_events.is_terminal(p) for p in ordered),
+        jobs=[JobStatusResponse(**p) for p in ordered] if include_jobs else None,
+    )
@@ -1,4 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response, status
+
+from app.services import warmup
 
 router = APIRouter(tags=["Root"])
 
@@ -6,3 +8,11 @@ router = APIRouter(tags=["Root"])
 @router.get("/")
 def get_org():
     return "Welcome to Module TalkingDB!"
+
+
+@router.get("/ready")
+def get_ready(response: Response):
+    """Readiness probe: 503 until this worker has finished warming up."""
+    if not warmup.is_ready():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return warmup.status()
@@ -1,6 +1,15 @@
 """Configuration for asynchronous document-ingestion jobs."""
 
 import os
+import tempfile
+
+
+def _str(name: str, default: str) -> str:
+    """Read a string env var with fallback."""
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    return raw.strip()
 
 
 def _int(name: str, default: int) -> int:
@@ -18,12 +27,74 @@ def _int(name: str, default: int) -> int:
 # Small bounded worker pool for CPU-heavy ingestion.
 MAX_WORKERS = _int("TDB_JOB_MAX_WORKERS", min(4, os.cpu_count() or 1))
 
+# Parse-stage pool. Parsing mostly waits on the CE service, so it is sized
+# larger than the CPU-bound index stage (MAX_WORKERS).
+PARSE_WORKERS = _int("TDB_JOB_PARSE_WORKERS", 2 * MAX_WORKERS)
+
+# Parsed jobs allowed to wait for an index worker. Each holds its parse result
+# in memory, so this bounds the hand-off between the two stages.
+INDEX_QUEUE_DEPTH = _int("TDB_JOB_INDEX_QUEUE_DEPTH", MAX_WORKERS)
+
+# In-flight requests to the CE parser across all parse workers, and the
+# per-request budget before a parse fails with PARSE_ERROR.
+PARSE_MAX_CONCURRENCY = _int("TDB_PARSE_MAX_CONCURRENCY", PARSE_WORKERS)
+PARSE_REQUEST_TIMEOUT_SECONDS = _int("TDB_PARSE_REQUEST_TIMEOUT_SECONDS", 10 * 60)
+
+# Page-range parsing for large PDFs: files with more than PARSE_SPLIT_MIN_PAGES
+# pages are parsed as concurrent chunks of PARSE_SPLIT_PAGES pages. 0 disables.
+PARSE_SPLIT_PAGES = _int("TDB_PARSE_SPLIT_PAGES", 0)
+PARSE_SPLIT_MIN_PAGES = _int("TDB_PARSE_SPLIT_MIN_PAGES", 100)
+
+# On-disk cache of parse results keyed by file hash + parser version +
+# metadata. PARSE_CACHE_MAX_BYTES=0 disables it. PARSE_CACHE_PARSER_VERSION
+# overrides the installed CE client version as the cache's version key.
+PARSE_CACHE_DIR = _str(
+    "TDB_PARSE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tdb-parse-cache")
+)
+PARSE_CACHE_MAX_BYTES = _int("TDB_PARSE_CACHE_MAX_BYTES", 2 * 1024 ** 3)
+PARSE_CACHE_PARSER_VERSION = _str("TDB_PARSE_CACHE_PARSER_VERSION", "")
+PARSE_CACHE_STATS_EVERY = _int("TDB_PARSE_CACHE_STATS_EVERY", 100)
+
 # Max queued jobs before returning HTTP 429.
 QUEUE_CAPACITY = _int("TDB_JOB_QUEUE_CAPACITY", 2 * MAX_WORKERS)
 
 # Suggested client retry delay.
 RETRY_AFTER_SECONDS = _int("TDB_JOB_RETRY_AFTER_SECONDS", 30)
 
+# Most files one ``POST /v1/documents/batch`` may carry. A batch occupies only
+# as many admission slots as it runs jobs at once, so this bounds the request
+# size and the spool, not the queue.
+BATCH_MAX_FILES = _int("TDB_JOB_BATCH_MAX_FILES", 1000)
+
+# Jobs of one batch running at once, unless the request asks for fewer.
+JOB_GROUP_MAX_PARALLEL = _int("TDB_JOB_GROUP_MAX_PARALLEL", MAX_WORKERS)
+
+# ``POST /index/document/elements/stream``: longest NDJSON line accepted, and
+# largest body spooled as one element-stream job.
+INDEX_STREAM_MAX_LINE_BYTES = _int(
+    "TDB_INDEX_STREAM_MAX_LINE_BYTES", 64 * 1024 ** 2
+)
+INDEX_STREAM_MAX_BYTES = _int("TDB_INDEX_STREAM_MAX_BYTES", 2 * 1024 ** 3)
+
+
+# ------------------------------------------------------------------ scheduling
+# Jobs whose estimated cost (seconds of worker time) is at or below this run in
+# the fast lane, ahead of larger jobs.
+SCHED_FAST_LANE_SECONDS = _int("TDB_SCHED_FAST_LANE_SECONDS", 15)
+
+# A job that has waited this long runs next regardless of its cost, so large
+# jobs are never starved by a steady stream of small ones.
+SCHED_MAX_WAIT_SECONDS = _int("TDB_SCHED_MAX_WAIT_SECONDS", 5 * 60)
+
+# Seconds of estimated cost credited back to a job per minute it has waited.
+SCHED_AGING_SECONDS_PER_MINUTE = _int("TDB_SCHED_AGING_SECONDS_PER_MINUTE", 30)
+
+# Cost model used until per-type throughput has been observed.
+SCHED_DEFAULT_BYTES_PER_SECOND = _int(
+    "TDB_SCHED_DEFAULT_BYTES_PER_SECOND", 256 * 1024
+)
+SCHED_JOB_OVERHEAD_SECONDS = _int("TDB_SCHED_JOB_OVERHEAD_SECONDS", 2)
+
 
 # ----------------------------------------------------------- checkpoint cadence
 # The indexer reports progress / checks for cancellation every Nth element.
@@ -35,6 +106,24 @@ CHECKPOINT_BATCH = _int("TDB_JOB_CHECKPOINT_BATCH", 25)
 HEARTBEAT_MIN_GAP_SECONDS = _int("TDB_JOB_HEARTBEAT_MIN_GAP_SECONDS", 2)
 
 
+# ----------------------------------------------------------------- job events
+# Jobs run by another process are re-read from SQLite at most this often per
+# job, however many clients watch them.
+JOB_EVENTS_POLL_SECONDS = _int("TDB_JOB_EVENTS_POLL_SECONDS", 1)
+
+# SSE comment line sent after this long without a status change.
+JOB_EVENTS_KEEPALIVE_SECONDS = _int("TDB_JOB_EVENTS_KEEPALIVE_SECONDS", 15)
+
+# Status of a job this process runs is served from memory while its last
+# publish is at most this old; terminal statuses are kept for the most recent
+# JOB_STATUS_CACHE_MAX_ENTRIES jobs.
+JOB_STATUS_CACHE_MAX_AGE_SECONDS = _int("TDB_JOB_STATUS_CACHE_MAX_AGE_SECONDS", 5)
+JOB_STATUS_CACHE_MAX_ENTRIES = _int("TDB_JOB_STATUS_CACHE_MAX_ENTRIES", 4096)
+
+# Upper bound for ``?wait=`` on the long-poll status endpoint.
+JOB_LONG_POLL_MAX_SECONDS = _int("TDB_JOB_LONG_POLL_MAX_SECONDS", 30)
+
+
 # -------------------------------------------------------------------- timeouts
 # A job whose heartbeat is older than this is considered orphaned (its worker
 # died). Chosen to be far larger than the checkpoint interval so a healthy but
@@ -56,8 +145,121 @@ RETENTION_CANCELLED_SECONDS = _int("TDB_RETENTION_CANCELLED_SECONDS", 1 * 86400)
 # How often the lifecycle daemon runs its sweep (orphan + timeout + retention).
 DAEMON_INTERVAL_SECONDS = _int("TDB_JOB_DAEMON_INTERVAL_SECONDS", 60)
 
+# Expired jobs are read and deleted RETENTION_BATCH_SIZE per transaction for
+# at most RETENTION_BUDGET_SECONDS per tick; the next tick resumes after the
+# last job id reached.
+RETENTION_BATCH_SIZE = _int("TDB_RETENTION_BATCH_SIZE", 500)
+RETENTION_BUDGET_SECONDS = _int("TDB_RETENTION_BUDGET_SECONDS", 5)
+
+# Time per tick for the spool scan; it resumes where the last tick stopped.
+TEMP_GC_BUDGET_SECONDS = _int("TDB_TEMP_GC_BUDGET_SECONDS", 2)
+
+
+# ---------------------------------------------------------------------- graphs
+# Decoded graphs kept in memory per process for the query path.
+GRAPH_CACHE_MAX_GRAPHS = _int("TDB_GRAPH_CACHE_MAX_GRAPHS", 64)
+
+# Graphs with at least this many delta records are folded into their base by
+# the daemon, at most GRAPH_COMPACT_BATCH graphs per tick. A freshly indexed
+# graph has one delta, which is cheaper to replay than to compact.
+GRAPH_COMPACT_MIN_DELTAS = _int("TDB_GRAPH_COMPACT_MIN_DELTAS", 8)
+GRAPH_COMPACT_BATCH = _int("TDB_GRAPH_COMPACT_BATCH", 16)
+
+# Tombstoned graphs are deleted by the daemon GRAPH_RECLAIM_BATCH_ROWS text
+# rows per transaction, pausing GRAPH_RECLAIM_PAUSE_MS between batches, for at
+# most GRAPH_RECLAIM_BUDGET_SECONDS per tick.
+GRAPH_RECLAIM_BATCH_ROWS = _int("TDB_GRAPH_RECLAIM_BATCH_ROWS", 2000)
+GRAPH_RECLAIM_PAUSE_MS = _int("TDB_GRAPH_RECLAIM_PAUSE_MS", 20)
+GRAPH_RECLAIM_BUDGET_SECONDS = _int("TDB_GRAPH_RECLAIM_BUDGET_SECONDS", 10)
+
+# Graph viewer: graphs up to VIEWER_INLINE_MAX_NODES are inlined whole into
+# the page; larger ones start from a VIEWER_SUMMARY_NODES-node summary and
+# fetch slices. Every slice is capped at VIEWER_MAX_NODES / VIEWER_MAX_EDGES.
+VIEWER_INLINE_MAX_NODES = _int("TDB_VIEWER_INLINE_MAX_NODES", 2000)
+VIEWER_SUMMARY_NODES = _int("TDB_VIEWER_SUMMARY_NODES", 500)
+VIEWER_MAX_NODES = _int("TDB_VIEWER_MAX_NODES", 2000)
+VIEWER_MAX_EDGES = _int("TDB_VIEWER_MAX_EDGES", 10000)
+# Pages showing more than VIEWER_CANVAS_MIN_NODES nodes draw on a canvas.
+VIEWER_CANVAS_MIN_NODES = _int("TDB_VIEWER_CANVAS_MIN_NODES", 1500)
+# Rendered viewer pages and slices are cached per graph version, compressed,
+# up to VIEWER_RENDER_CACHE_MAX_BYTES per process.
+VIEWER_RENDER_CACHE_MAX_BYTES = _int(
+    "TDB_VIEWER_RENDER_CACHE_MAX_BYTES", 64 * 1024 * 1024
+)
+
+# Viewer layouts are computed server-side once per graph version. The force
+# pass (GRAPH_LAYOUT_ITERATIONS iterations) covers at most
+# GRAPH_LAYOUT_FORCE_MAX_NODES element nodes, GRAPH_LAYOUT_SPACING px apart;
+# the rest are placed around the node they collapse into.
+GRAPH_LAYOUT_ITERATIONS = _int("TDB_GRAPH_LAYOUT_ITERATIONS", 50)
+GRAPH_LAYOUT_FORCE_MAX_NODES = _int("TDB_GRAPH_LAYOUT_FORCE_MAX_NODES", 3000)
+GRAPH_LAYOUT_SPACING = _int("TDB_GRAPH_LAYOUT_SPACING", 60)
+
+# spaCy pipeline profile of the tokenizer: "lean" loads only the components
+# tokenize() reads, "full" loads the whole model (see package_text_tokenizer).
+# "full" stays the default until `make check-tokenizer` shows "lean" gives
+# the same tokens on the reference corpus.
+NLP_PROFILE = _str("TDB_NLP_PROFILE", "full")
+
+# Tokenize queries from the lexicon of forms seen at index time, falling back
+# to the full spaCy pipeline for unknown words; LEXICON_CACHE_MAX_ENTRIES
+# forms are kept in memory per process.
+TOKENIZER_FAST_QUERIES = _int("TDB_TOKENIZER_FAST_QUERIES", 1)
+LEXICON_CACHE_MAX_ENTRIES = _int("TDB_LEXICON_CACHE_MAX_ENTRIES", 200_000)
+
+# Tokenized texts reused across documents: TOKEN_MEMO_MAX_ENTRIES per process,
+# plus up to TOKEN_CACHE_MAX_BYTES of tokens in SQLite shared by all workers
+# (0 disables the shared level). Each hit an entry gets is worth
+# TOKEN_CACHE_HIT_CREDIT_SECONDS of recency when choosing what to evict.
+TOKEN_MEMO_MAX_ENTRIES = _int("TDB_TOKEN_MEMO_MAX_ENTRIES", 50_000)
+TOKEN_CACHE_MAX_BYTES = _int("TDB_TOKEN_CACHE_MAX_BYTES", 512 * 1024 ** 2)
+TOKEN_CACHE_HIT_CREDIT_SECONDS = _int("TDB_TOKEN_CACHE_HIT_CREDIT_SECONDS", 3600)
+
+# N-gram sizes indexed as symbols and tried by queries, in query order.
+# Changing them only affects documents indexed afterwards.
+SYMBOL_NGRAM_ORDERS = tuple(
+    int(n) for n in _str("TDB_SYMBOL_NGRAM_ORDERS", "1,2,3").split(",")
+    if n.strip()
+)
+
+# Symbol string <-> id pairs kept in memory per process.
+SYMBOL_CACHE_MAX_ENTRIES = _int("TDB_SYMBOL_CACHE_MAX_ENTRIES", 500_000)
+
+# After graphs were reclaimed, the daemon deletes symbols no stored graph uses
+# any more, at most every SYMBOL_GC_INTERVAL_SECONDS (0 disables). Marking the
+# ids in use reads every graph, SYMBOL_GC_BUDGET_SECONDS per tick.
+SYMBOL_GC_INTERVAL_SECONDS = _int("TDB_SYMBOL_GC_INTERVAL_SECONDS", 6 * 3600)
+SYMBOL_GC_BUDGET_SECONDS = _int("TDB_SYMBOL_GC_BUDGET_SECONDS", 5)
+
+
+# --------------------------------------------------------------------- warmup
+# Load the spaCy pipeline in the background at startup; ``/ready`` is 503
+# until it is loaded. 0 loads it on first use instead.
+NLP_PRELOAD = _int("TDB_NLP_PRELOAD", 1)
+
+# Load it while the app module is imported instead, for servers that import
+# once and fork workers (gunicorn --preload, as in the Docker image). Workers
+# share its pages copy-on-write until they write them; the vector table is
+# only read and stays shared.
+NLP_PRELOAD_ON_IMPORT = _int("TDB_NLP_PRELOAD_ON_IMPORT", 0)
+
+# spaCy pipelines a process keeps per model and profile, one per thread
+# tokenizing at once; more threads wait. Each is a full model load without
+# the vector table (shared per process), so this bounds tokenizer memory.
+NLP_MAX_PIPELINES = _int("TDB_NLP_MAX_PIPELINES", os.cpu_count() or 1)
+
 
 # ---------------------------------------------------------------------- sqlite
 # Applied as `PRAGMA busy_timeout` so concurrent writers wait instead of
 # failing immediately with SQLITE_BUSY.
 SQLITE_BUSY_TIMEOUT_MS = _int("TDB_SQLITE_BUSY_TIMEOUT_MS", 5000)
+
+# Tuning for the per-thread pooled connections (app.core.sqlite_pool).
+SQLITE_SYNCHRONOUS = _str("TDB_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE_BYTES = _int("TDB_SQLITE_MMAP_SIZE_BYTES", 256 * 1024 ** 2)
+SQLITE_CACHED_STATEMENTS = _int("TDB_SQLITE_CACHED_STATEMENTS", 256)
+
+# Free pages returned to the filesystem per daemon tick via
+# `PRAGMA incremental_vacuum` (0 disables). Only takes effect once the file
+# was converted with `make enable-auto-vacuum`, which runs a full VACUUM.
+SQLITE_INCREMENTAL_VACUUM_PAGES = _int("TDB_SQLITE_INCREMENTAL_VACUUM_PAGES", 1000)
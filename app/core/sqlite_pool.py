@@ -0,0 +1,209 @@
+"""Per-thread pooled SQLite connections.
+
+Drop-in replacement for ``talkingdb.clients.sqlite.sqlite_conn`` on hot paths.
+Each thread keeps one open connection for its lifetime instead of paying for
+open + PRAGMA setup + close on every short statement. Connections are opened
+against the same database file the client module uses (discovered once via
+``PRAGMA database_list``) with the client's ``row_factory``, isolation level
+and foreign-key setting, and are tuned with:
+
+  * ``journal_mode=WAL`` - readers no longer block the writer and vice versa.
+  * ``synchronous``      - ``SQLITE_SYNCHRONOUS`` (``NORMAL`` is durable under
+                           WAL except for the last commits on power loss).
+  * ``mmap_size``        - ``SQLITE_MMAP_SIZE_BYTES`` of memory-mapped reads.
+  * a prepared-statement cache of ``SQLITE_CACHED_STATEMENTS`` entries.
+
+``with sqlite_conn() as conn`` commits on clean exit and rolls back on error,
+like the client version. Nested blocks on the same thread share the outer
+transaction; only the outermost block commits.
+
+:func:`close_all` is called from the FastAPI lifespan on shutdown. A thread
+that touches the pool afterwards transparently reconnects.
+
+:func:`enable_incremental_vacuum` switches the file to
+``auto_vacuum=INCREMENTAL``. That needs a full ``VACUUM``, which rewrites the
+whole file under an exclusive lock, so it is an explicit migration
+(``python -m app.maintenance enable-auto-vacuum``) and never runs on startup.
+Once the file is in that mode the job daemon calls :func:`incremental_vacuum`
+each tick so deleted rows give space back to the filesystem in small steps;
+on other files it does nothing.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Tuple
+
+from talkingdb.clients.sqlite import sqlite_conn as _client_conn
+from talkingdb.logger.console import logger
+
+from app.core import config
+
+
+_local = threading.local()
+_lock = threading.Lock()
+_connections: List[Tuple[threading.Thread, sqlite3.Connection]] = []
+_generation = 0
+
+# (path, row_factory, isolation_level, foreign_keys) copied from the client.
+_template: Optional[Tuple[str, Any, Optional[str], int]] = None
+
+
+def _resolve_template() -> Tuple[str, Any, Optional[str], int]:
+    """Learn how the client module connects, once per process."""
+    global _template
+    if _template is not None:
+        return _template
+
+    with _lock:
+        if _template is None:
+            with _client_conn() as probe:
+                path = ""
+                for row in probe.execute("PRAGMA database_list").fetchall():
+                    if row[1] == "main":
+                        path = row[2] or ""
+                foreign_keys = probe.execute("PRAGMA foreign_keys").fetchone()[0]
+                _template = (
+                    path,
+                    probe.row_factory,
+                    probe.isolation_level,
+                    foreign_keys,
+                )
+            if not path:
+                logger.warning(
+                    "[sqlite] in-memory database; connection pooling disabled"
+                )
+        return _template
+
+
+def _connect() -> sqlite3.Connection:
+    """Open and tune one pooled connection."""
+    path, row_factory, isolation_level, foreign_keys = _resolve_template()
+
+    conn = sqlite3.connect(
+        path,
+        timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        isolation_level=isolation_level,
+        check_same_thread=False,
+        cached_statements=config.SQLITE_CACHED_STATEMENTS,
+    )
+    conn.row_factory = row_factory
+    conn.execute(f"PRAGMA busy_timeout = {int(config.SQLITE_BUSY_TIMEOUT_MS)}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA synchronous = {config.SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA mmap_size = {int(config.SQLITE_MMAP_SIZE_BYTES)}")
+    conn.execute(f"PRAGMA foreign_keys = {int(foreign_keys)}")
+    return conn
+
+
+def _thread_conn() -> sqlite3.Connection:
+    """Return this thread's connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.generation == _generation:
+        return conn
+
+    conn = _connect()
+    with _lock:
+        _close_dead_threads()
+        _connections.append((threading.current_thread(), conn))
+        _local.generation = _generation
+    _local.conn = conn
+    _local.depth = 0
+    return conn
+
+
+def _close_dead_threads() -> None:
+    """Close connections whose owning thread has exited; lock held."""
+    alive = []
+    for thread, conn in _connections:
+        if thread.is_alive():
+            alive.append((thread, conn))
+        else:
+            conn.close()
+    _connections[:] = alive
+
+
+@contextmanager
+def sqlite_conn() -> Iterator[sqlite3.Connection]:
+    """Yield this thread's pooled connection inside a transaction scope."""
+    if not _resolve_template()[0]:
+        with _client_conn() as conn:
+            yield conn
+        return
+
+    conn = _thread_conn()
+    outermost = _local.depth == 0
+    _local.depth += 1
+    try:
+        yield conn
+        if outermost and conn.in_transaction:
+            conn.commit()
+    except BaseException:
+        if outermost and conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        _local.depth -= 1
+
+
+def close_all() -> None:
+    """Close every pooled connection. Safe to call more than once."""
+    global _generation
+    with _lock:
+        connections = list(_connections)
+        _connections.clear()
+        _generation += 1
+
+    for _, conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as exc:
+            logger.warning(f"[sqlite] close failed: {exc}")
+
+
+# ------------------------------------------------------------------- vacuum
+_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def is_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+    """Return whether the database file uses incremental auto-vacuum."""
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    return mode == _AUTO_VACUUM_INCREMENTAL
+
+
+def enable_incremental_vacuum() -> None:
+    """Switch the database to incremental auto-vacuum if it is not yet.
+
+    Runs a full ``VACUUM``: only call it from the explicit migration, with
+    the service stopped.
+    """
+    with sqlite_conn() as conn:
+        if is_incremental_vacuum(conn):
+            return
+        if conn.in_transaction:
+            conn.commit()
+
+        logger.info("[sqlite] enabling incremental auto-vacuum (one-time VACUUM)")
+        start = time.monotonic()
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        logger.info(
+            f"[sqlite] VACUUM done in {int((time.monotonic() - start) * 1000)}ms"
+        )
+
+
+def incremental_vacuum(max_pages: int) -> int:
+    """Release up to ``max_pages`` free pages; return how many were free.
+
+    Does nothing (and returns 0) unless the file is in incremental mode.
+    """
+    with sqlite_conn() as conn:
+        if not is_incremental_vacuum(conn):
+            return 0
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free:
+            # The pragma frees one page per step and returns no rows, which
+            # execute() stops after; executescript() steps it to the end.
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+    return free
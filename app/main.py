@@ -3,18 +3,27 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.api import root, index, documents, jobs, queries
-from app.services import job_daemon
+from app.core import config, sqlite_pool
+from app.services import job_daemon, warmup
+from app.services.parser_client import parser_client
 from app.services.workers import init_database
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    warmup.start()
     init_database()
+    parser_client.start()
     job_daemon.start()
     yield
     job_daemon.stop()
+    parser_client.stop()
+    sqlite_pool.close_all()
 
 
+if config.NLP_PRELOAD_ON_IMPORT:
+    warmup.preload()
+
 app = FastAPI(lifespan=lifespan, title="Module TalkingDB")
 
 app.add_middleware(
@@ -0,0 +1,50 @@
+"""One-off maintenance steps, run explicitly rather than on startup.
+
+    python -m app.maintenance migrate-graphs
+    python -m app.maintenance enable-auto-vacuum
+
+``migrate-graphs`` converts graphs stored before symbol nodes were keyed by
+id (see :func:`app.services.graph_store.migrate_legacy`); until then the
+query path treats them as missing.
+
+``enable-auto-vacuum`` switches the database file to incremental
+auto-vacuum, so the daemon can give freed pages back to the filesystem. It
+rewrites the whole file with ``VACUUM``: stop the service first and expect
+it to take a while on a large database.
+"""
+
+import argparse
+
+from app.core.sqlite_pool import enable_incremental_vacuum
+from app.services import graph_store
+from app.services.workers import init_database
+
+
+def migrate_graphs(args: argparse.Namespace) -> None:
+    done = graph_store.migrate_legacy()
+    print(f"Migrated {done} graphs.")
+
+
+def enable_auto_vacuum(args: argparse.Namespace) -> None:
+    enable_incremental_vacuum()
+    print("Incremental auto-vacuum enabled.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    steps = parser.add_subparsers(dest="step", required=True)
+    steps.add_parser(
+        "migrate-graphs", help="re-key legacy graphs to symbol ids"
+    ).set_defaults(run=migrate_graphs)
+    steps.add_parser(
+        "enable-auto-vacuum",
+        help="convert the database to incremental auto-vacuum",
+    ).set_defaults(run=enable_auto_vacuum)
+    args = parser.parse_args()
+
+    init_database()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
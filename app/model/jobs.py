@@ -5,7 +5,7 @@ Only the fields listed here are part of the stable public contract; the
 absent so consumers cannot couple to non-contractual surface.
 """
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -65,3 +65,31 @@ class JobStatusResponse(BaseModel):
         ),
     )
     error_message: Optional[str] = None
+
+
+class JobGroupAcceptedResponse(BaseModel):
+    """Response for an accepted batch of ingestion jobs."""
+
+    group_id: str = Field(..., description="Stable id of the batch")
+    job_count: int = Field(..., description="Number of jobs in the batch")
+    jobs: List[JobAcceptedResponse] = Field(
+        ..., description="One entry per uploaded file, in upload order"
+    )
+
+
+class JobGroupStatusResponse(BaseModel):
+    """Aggregate status of a batch of jobs."""
+
+    group_id: str
+    job_count: int
+    state_counts: Dict[str, int] = Field(
+        ..., description="Number of jobs per state"
+    )
+    progress: int = Field(
+        ...,
+        description="0-100 mean over the batch; terminal jobs count as 100",
+    )
+    done: bool = Field(..., description="True once every job is terminal")
+    jobs: Optional[List[JobStatusResponse]] = Field(
+        None, description="Per-job status in upload order, if requested"
+    )
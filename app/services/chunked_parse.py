@@ -0,0 +1,408 @@
+"""Parallel page-range parsing for large PDFs.
+
+A PDF with more than ``PARSE_SPLIT_MIN_PAGES`` pages is split into chunks of
+``PARSE_SPLIT_PAGES`` pages. The chunks are parsed concurrently through the
+shared :data:`parser_client` (so ``PARSE_MAX_CONCURRENCY`` still applies) and
+the per-chunk payloads are stitched back into one ``parse_result``:
+
+  * ``document``   - list-valued fields are concatenated in page order, so
+                     element order (and with it heading-path resolution)
+                     matches a single-request parse. Scalar fields come from
+                     the first chunk.
+  * ``file_index`` - top-level outline nodes are concatenated in page order.
+                     Content at the start of a chunk (paragraphs and tables
+                     before its first heading) continues the section left
+                     open by the previous chunk and is re-attached to it;
+                     so is a top-level heading whose type the chunks show
+                     nested under an open heading's type.
+
+Each chunk is parsed as a document of its own, so its page numbers start
+over and its element ids may repeat those of earlier chunks. Element page
+numbers are shifted by the chunk's first page, and element or outline ids
+already used by an earlier chunk are renamed (``<id>~<chunk>``) together
+with the element references to them. Only the schema fields listed below
+are rewritten. A reference the parser would have drawn across a chunk
+boundary, such as a table captioned by the last paragraph of the previous
+chunk, is not recovered.
+"""
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pypdf import PdfReader, PdfWriter
+from starlette.datastructures import UploadFile
+
+from talkingdb.helpers import spool
+from talkingdb.logger.console import logger
+from talkingdb.models.document.indexes.index import IndexType
+from talkingdb.models.metadata.metadata import Metadata
+
+from app.core import config
+from app.services.job_context import JobContext
+from app.services.parser_client import parser_client
+
+
+class ChunkStitchError(ValueError):
+    """Raised when chunk results cannot be stitched into one document."""
+
+
+# The DocumentModel fields rewritten when stitching; nothing else is touched.
+# Elements carry their own id, a page number relative to the parsed file and
+# ``caption_ref_id`` pointing at another element; outline nodes carry ids
+# shared with the elements they stand for.
+_ELEMENTS = "elements"
+_ELEMENT_ID = "id"
+_ELEMENT_REFS = ("caption_ref_id",)
+_ELEMENT_PAGE = "page"
+
+# Outline node types that are content rather than a section heading.
+_CONTENT_INDEXES = frozenset(
+    {IndexType.PARA, IndexType.TABLE, IndexType.TABLE_HEADER}
+)
+
+
+# ---------------------------------------------------------------- splitting
+def page_ranges(page_count: int, pages_per_chunk: int) -> List[Tuple[int, int]]:
+    """Return ``[start, end)`` page ranges covering ``page_count`` pages."""
+    step = max(pages_per_chunk, 1)
+    return [
+        (start, min(start + step, page_count))
+        for start in range(0, page_count, step)
+    ]
+
+
+def split_page_count(filename: str, temp_path: str) -> int:
+    """Return the page count of a file that qualifies for chunked parsing.
+
+    Returns ``0`` when the file should be parsed in a single request.
+    """
+    if config.PARSE_SPLIT_PAGES <= 0:
+        return 0
+    if not (filename or "").lower().endswith(".pdf"):
+        return 0
+    try:
+        page_count = len(PdfReader(temp_path).pages)
+    except Exception as exc:
+        logger.warning(f"[parser] cannot read page count, not splitting: {exc}")
+        return 0
+    return page_count if page_count > config.PARSE_SPLIT_MIN_PAGES else 0
+
+
+def split_pdf(temp_path: str, ranges: List[Tuple[int, int]]) -> List[str]:
+    """Write one spool file per page range and return their paths."""
+    reader = PdfReader(temp_path)
+    paths: List[str] = []
+    try:
+        for start, end in ranges:
+            writer = PdfWriter()
+            for page in reader.pages[start:end]:
+                writer.add_page(page)
+
+            fd, path = tempfile.mkstemp(
+                dir=spool.SPOOL_DIR, prefix="chunk-", suffix=".pdf"
+            )
+            paths.append(path)
+            with os.fdopen(fd, "wb") as fh:
+                writer.write(fh)
+    except BaseException:
+        for path in paths:
+            spool.discard(path)
+        raise
+    return paths
+
+
+# ---------------------------------------------------------------- stitching
+def _element_ids(document: Dict[str, Any]) -> Set[str]:
+    return {
+        element[_ELEMENT_ID]
+        for element in document.get(_ELEMENTS) or []
+        if isinstance(element, dict) and isinstance(element.get(_ELEMENT_ID), str)
+    }
+
+
+def _node_ids(nodes: List[Dict[str, Any]], ids: Set[str]) -> Set[str]:
+    for node in nodes:
+        if isinstance(node.get("id"), str):
+            ids.add(node["id"])
+        _node_ids(node.get("child") or [], ids)
+    return ids
+
+
+def _localize_element(
+    element: Dict[str, Any], renames: Dict[str, str], page_offset: int
+) -> Dict[str, Any]:
+    out = dict(element)
+    for key in (_ELEMENT_ID, *_ELEMENT_REFS):
+        if isinstance(out.get(key), str):
+            out[key] = renames.get(out[key], out[key])
+    page = out.get(_ELEMENT_PAGE)
+    if isinstance(page, int) and not isinstance(page, bool):
+        out[_ELEMENT_PAGE] = page + page_offset
+    return out
+
+
+def _localize_nodes(
+    nodes: List[Dict[str, Any]], renames: Dict[str, str]
+) -> List[Dict[str, Any]]:
+    out = []
+    for node in nodes:
+        node = dict(node)
+        if isinstance(node.get("id"), str):
+            node["id"] = renames.get(node["id"], node["id"])
+        node["child"] = _localize_nodes(node.get("child") or [], renames)
+        out.append(node)
+    return out
+
+
+def _localize_parts(
+    documents: List[Dict[str, Any]],
+    outlines: List[List[Dict[str, Any]]],
+    page_offsets: List[int],
+) -> Tuple[List[Dict[str, Any]], List[List[Dict[str, Any]]]]:
+    """Rename ids that repeat an earlier part's and shift page numbers.
+
+    Part ``i`` owns the ids of its document's elements and of its outline
+    nodes ``outlines[i]``; the document's own id is not an element id.
+    """
+    taken: Set[str] = set()
+    out_documents = []
+    out_outlines = []
+    for number, (document, nodes, offset) in enumerate(
+        zip(documents, outlines, page_offsets)
+    ):
+        ids = _node_ids(nodes, _element_ids(document))
+
+        renames: Dict[str, str] = {}
+        for old in sorted(ids & taken):
+            new = f"{old}~{number}"
+            while new in taken or new in ids:
+                new += "~"
+            renames[old] = new
+        taken |= (ids - renames.keys()) | set(renames.values())
+
+        if renames or offset:
+            document = {
+                **document,
+                _ELEMENTS: [
+                    _localize_element(element, renames, offset)
+                    if isinstance(element, dict)
+                    else element
+                    for element in document.get(_ELEMENTS) or []
+                ],
+            }
+            nodes = _localize_nodes(nodes, renames)
+        out_documents.append(document)
+        out_outlines.append(nodes)
+    return out_documents, out_outlines
+
+
+def _merge_lists(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Concatenate list-valued fields of ``parts``; keep scalars from the first."""
+    merged = dict(parts[0])
+    for key, value in parts[0].items():
+        if not isinstance(value, list):
+            continue
+        merged[key] = [
+            item
+            for part in parts
+            for item in (part.get(key) or [])
+        ]
+    return merged
+
+
+def _is_content(node: Dict[str, Any]) -> bool:
+    return node.get("index") in _CONTENT_INDEXES
+
+
+def _heading_order(
+    outlines: List[List[Dict[str, Any]]],
+) -> Set[Tuple[Any, Any]]:
+    """Return ``(outer, inner)`` heading index pairs seen nested in ``outlines``.
+
+    The parser nests a heading under the closest heading above it of an
+    outer level, so every pair found here tells which heading type a later
+    chunk's top-level heading of type ``inner`` belongs under.
+    """
+    order: Set[Tuple[Any, Any]] = set()
+
+    def walk(nodes: List[Dict[str, Any]], above: List[Any]) -> None:
+        for node in nodes:
+            if _is_content(node):
+                continue
+            index = node.get("index")
+            order.update((outer, index) for outer in above if outer != index)
+            walk(node.get("child") or [], above + [index])
+
+    for nodes in outlines:
+        walk(nodes, [])
+    return order
+
+
+def _open_branch(nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return the headings still open at the end of ``nodes``, outermost first."""
+    branch: List[Dict[str, Any]] = []
+    while nodes and not _is_content(nodes[-1]):
+        branch.append(nodes[-1])
+        nodes = nodes[-1].get("child") or []
+    return branch
+
+
+def _merge_outline(
+    nodes: List[Dict[str, Any]],
+    tail: List[Dict[str, Any]],
+    order: Set[Tuple[Any, Any]],
+) -> None:
+    """Append the top-level nodes of a chunk's outline ``tail`` to ``nodes``.
+
+    A chunk starts with no heading open, so the parser leaves at top level
+    what belongs under a section still open from the previous chunk: its
+    leading content continues the deepest open section, and a heading goes
+    under the deepest open heading ``order`` ranks as outer to it.
+    """
+    for node in tail:
+        branch = _open_branch(nodes)
+        if _is_content(node):
+            depth = len(branch)
+        else:
+            depth = next(
+                (
+                    i + 1
+                    for i in range(len(branch) - 1, -1, -1)
+                    if (branch[i].get("index"), node.get("index")) in order
+                ),
+                0,
+            )
+        if not depth:
+            nodes.append(node)
+            continue
+
+        # Rebuild the open branch rather than mutating the chunk's dicts.
+        branch = branch[:depth]
+        child = {**branch[-1], "child": list(branch[-1].get("child") or []) + [node]}
+        for parent in reversed(branch[:-1]):
+            child = {**parent, "child": list(parent["child"][:-1]) + [child]}
+        nodes[-1] = child
+
+
+def stitch_documents(
+    parts: List[Dict[str, Any]],
+    page_offsets: Optional[List[int]] = None,
+) -> Dict[str, Any]:
+    """Concatenate document dicts, given in order, into one document dict.
+
+    Ids repeating an earlier part's are renamed within their part, and page
+    numbers of part ``i`` are shifted by ``page_offsets[i]``.
+    """
+    if len(parts) == 1 and not (page_offsets and page_offsets[0]):
+        return parts[0]
+
+    offsets = page_offsets or [0] * len(parts)
+    documents, _ = _localize_parts(parts, [[] for _ in parts], offsets)
+    return _merge_lists(documents)
+
+
+def stitch_results(
+    results: List[dict], page_offsets: Optional[List[int]] = None
+) -> dict:
+    """Combine per-chunk parse results, given in page order, into one."""
+    if len(results) == 1:
+        return results[0]
+
+    for number, r in enumerate(results):
+        if not isinstance(r.get("document"), dict) or not isinstance(
+            r.get("file_index"), dict
+        ):
+            raise ChunkStitchError(f"chunk {number} has no document or outline")
+
+    # The outline's ids are renamed with the document's, so headings keep
+    # pointing at their elements; the outline root is not an element.
+    documents, outlines = _localize_parts(
+        [r["document"] for r in results],
+        [r["file_index"].get("nodes") or [] for r in results],
+        page_offsets or [0] * len(results),
+    )
+
+    document = _merge_lists(documents)
+
+    order = _heading_order(outlines)
+    outline: List[Dict[str, Any]] = []
+    for nodes in outlines:
+        _merge_outline(outline, nodes, order)
+    file_index = {**results[0]["file_index"], "nodes": outline}
+
+    return {**results[0], "document": document, "file_index": file_index}
+
+
+# ------------------------------------------------------------------ parsing
+def parse_in_chunks(
+    temp_path: str,
+    filename: str,
+    metadata: Metadata,
+    page_count: int,
+    ctx: Optional[JobContext] = None,
+) -> Optional[dict]:
+    """Parse a large PDF of ``page_count`` pages as concurrent chunks.
+
+    Returns ``None`` when the chunks cannot be stitched, so the caller can
+    fall back to a single-request parse. Cancel / timeout signals raised by
+    the per-chunk checkpoints cancel every outstanding chunk request.
+    """
+    ranges = page_ranges(page_count, config.PARSE_SPLIT_PAGES)
+    chunk_paths = split_pdf(temp_path, ranges)
+    total = len(chunk_paths)
+    results: List[Optional[dict]] = [None] * total
+
+    try:
+        # Each submitted request owns (and closes) its chunk's file.
+        futures: Dict[Future, int] = {}
+        pending: Set[Future] = set()
+        try:
+            for i, path in enumerate(chunk_paths):
+                upload = UploadFile(filename=filename, file=open(path, "rb"))
+                try:
+                    future = parser_client.submit(upload, metadata)
+                except BaseException:
+                    upload.file.close()
+                    raise
+                futures[future] = i
+                pending.add(future)
+
+            if ctx is not None:
+                ctx.checkpoint(
+                    done_units=0,
+                    total_units=total,
+                    status_message=f"Parsing pages (0/{total} chunks)",
+                )
+
+            while pending:
+                done, pending = wait(
+                    pending,
+                    timeout=config.HEARTBEAT_MIN_GAP_SECONDS,
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    results[futures[future]] = future.result()
+
+                if ctx is not None:
+                    finished = total - len(pending)
+                    ctx.checkpoint(
+                        done_units=finished,
+                        total_units=total,
+                        status_message=(
+                            f"Parsing pages ({finished}/{total} chunks)"
+                        ),
+                    )
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    finally:
+        for path in chunk_paths:
+            spool.discard(path)
+
+    try:
+        return stitch_results(results, [start for start, _ in ranges])
+    except ChunkStitchError as exc:
+        logger.warning(f"[parser] chunked parse discarded for {filename}: {exc}")
+        return None
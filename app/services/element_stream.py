@@ -0,0 +1,190 @@
+"""Streamed document indexing for ``POST /index/document/elements/stream``.
+
+The request body is NDJSON instead of one ``IndexElementRequest``:
+
+  * an optional first line ``{"metadata": {...}}``
+  * one or more ``{"document": {...}}`` lines, each a partial document dict
+    in document order (list-valued fields are concatenated, as for chunked
+    parse results, see :func:`chunked_parse.stitch_documents`).
+
+The endpoint never holds the document: :func:`spool_body` checks each line
+as it arrives, each bounded by ``INDEX_STREAM_MAX_LINE_BYTES``, and appends
+the document lines to a spool file, the body as a whole bounded by
+``INDEX_STREAM_MAX_BYTES``. The spool then becomes an ordinary ingestion job
+(see :mod:`app.services.jobs`) and the request returns its job id.
+
+The job's parse stage reads the spool back with :func:`load` instead of
+calling the CE parser. The file-index tree and the element indexer both need
+the whole document, so the parts are stitched into one document there; the
+job pipeline's worker pools and index hand-off bound how many such documents
+are in memory at once, as for parsed uploads.
+"""
+
+import json
+import os
+import tempfile
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from talkingdb.helpers import spool
+
+from app.services.chunked_parse import stitch_documents
+from app.services.job_context import JobContext
+
+
+# Job file extension marking a spooled element stream, and the job filename.
+FILE_EXT = "ndjson"
+FILENAME = f"elements.{FILE_EXT}"
+
+# Lines are checked and written on a worker thread in batches of this size.
+_WRITE_BATCH_BYTES = 1024 ** 2
+
+# Spooled lines read between two job checkpoints.
+_CHECKPOINT_LINES = 256
+
+
+class StreamFormatError(ValueError):
+    """Raised when a streamed request body is not valid element NDJSON."""
+
+
+class StreamTooLarge(ValueError):
+    """Raised when a streamed request body exceeds ``INDEX_STREAM_MAX_BYTES``."""
+
+
+# ----------------------------------------------------------------- reading
+async def iter_lines(
+    chunks: AsyncIterator[bytes], max_line_bytes: int
+) -> AsyncIterator[bytes]:
+    """Yield the non-blank lines of a byte stream, each at most ``max_line_bytes``."""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            if end - start > max_line_bytes:
+                raise StreamFormatError(
+                    f"line exceeds INDEX_STREAM_MAX_LINE_BYTES={max_line_bytes}"
+                )
+            line = bytes(buffer[start:end])
+            start = end + 1
+            if line.strip():
+                yield line
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise StreamFormatError(
+                f"line exceeds INDEX_STREAM_MAX_LINE_BYTES={max_line_bytes}"
+            )
+    if buffer.strip():
+        yield bytes(buffer)
+
+
+def decode_line(
+    number: int, line: bytes
+) -> Tuple[str, Dict[str, Any]]:
+    """Return ``("metadata" | "document", value)`` for one NDJSON line."""
+    try:
+        record = json.loads(line)
+    except ValueError as exc:
+        raise StreamFormatError(f"line {number}: invalid JSON: {exc}") from None
+    if not isinstance(record, dict) or len(record) != 1:
+        raise StreamFormatError(
+            f'line {number}: expected {{"metadata": ...}} or {{"document": ...}}'
+        )
+    (kind, value), = record.items()
+    if kind not in ("metadata", "document") or not isinstance(value, dict):
+        raise StreamFormatError(
+            f'line {number}: expected {{"metadata": ...}} or {{"document": ...}}'
+        )
+    if kind == "metadata" and number != 1:
+        raise StreamFormatError(f"line {number}: metadata must be the first line")
+    return kind, value
+
+
+# ---------------------------------------------------------------- spooling
+def _write_batch(
+    fh, lines: List[Tuple[int, bytes]]
+) -> Tuple[Optional[Dict[str, Any]], int]:
+    """Check ``lines`` and append their document lines to ``fh``.
+
+    Returns the metadata, if the batch holds the first line and it is
+    metadata, and the number of document lines written.
+    """
+    metadata = None
+    parts = 0
+    for number, line in lines:
+        kind, value = decode_line(number, line)
+        if kind == "metadata":
+            metadata = value
+            continue
+        fh.write(line)
+        fh.write(b"\n")
+        parts += 1
+    return metadata, parts
+
+
+async def spool_body(
+    chunks: AsyncIterator[bytes], max_line_bytes: int, max_bytes: int
+) -> Tuple[str, Optional[Dict[str, Any]], int, int]:
+    """Spool the document lines of an NDJSON body without holding it.
+
+    Returns ``(temp_path, metadata, size_bytes, parts)``. The caller owns
+    the spool file; it is discarded here if the body is rejected or the
+    client goes away.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        dir=spool.SPOOL_DIR, prefix="elements-", suffix=f".{FILE_EXT}"
+    )
+    metadata = None
+    size = 0
+    parts = 0
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            batch: List[Tuple[int, bytes]] = []
+            batch_bytes = 0
+            number = 0
+            async for line in iter_lines(chunks, max_line_bytes):
+                number += 1
+                size += len(line) + 1
+                if size > max_bytes:
+                    raise StreamTooLarge(
+                        f"body exceeds INDEX_STREAM_MAX_BYTES={max_bytes}"
+                    )
+                batch.append((number, line))
+                batch_bytes += len(line)
+                if batch_bytes < _WRITE_BATCH_BYTES:
+                    continue
+                found, written = await run_in_threadpool(_write_batch, fh, batch)
+                metadata = metadata or found
+                parts += written
+                batch, batch_bytes = [], 0
+            if batch:
+                found, written = await run_in_threadpool(_write_batch, fh, batch)
+                metadata = metadata or found
+                parts += written
+    except BaseException:
+        spool.discard(temp_path)
+        raise
+    return temp_path, metadata, size, parts
+
+
+# ----------------------------------------------------------------- loading
+def load(temp_path: str, ctx: Optional[JobContext] = None) -> dict:
+    """Read a spooled element stream back as a parse result.
+
+    The result has the stitched ``document`` and no ``file_index``; the
+    index stage builds the outline from the document. Checkpoints ``ctx``
+    while reading.
+    """
+    parts = []
+    with open(temp_path, "rb") as fh:
+        for number, line in enumerate(fh, start=1):
+            parts.append(json.loads(line)["document"])
+            if ctx is not None and number % _CHECKPOINT_LINES == 0:
+                ctx.checkpoint(status_message=f"Reading elements ({number} parts)")
+    if not parts:
+        raise StreamFormatError("no document lines in spooled stream")
+    return {"document": stitch_documents(parts), "file_index": None}
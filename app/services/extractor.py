@@ -2,19 +2,23 @@ from typing import Dict, List
 from collections import Counter
 
 from app.services.package_text_tokenizer import TextTokenizer
-from app.services.package_symbol_generator import SymbolGenerator
-from talkingdb.helpers.graph_cache import graph_cache
+from app.services.package_symbol_generator import SymbolGenerator, gram_type
+from app.services import graph_store
+from app.services.symbol_table import symbol_table
+from app.core import config
 from app.core.thread_pool import executor
 
 
 class ExtractorService:
 
     def __init__(self, graph_ids: List[str], max_matches: int = 10):
-        self.gms = [graph_cache.get(gid) for gid in graph_ids]
+        self.gms = [graph_store.get(gid) for gid in graph_ids]
 
         self.max_matches = max_matches
-        self.tokenizer = TextTokenizer()
-        self.symbol_generator = SymbolGenerator()
+        # Query symbol string -> graph node id, filled per extract().
+        self.symbol_ids: Dict[str, int] = {}
+        self.tokenizer = TextTokenizer(fast=config.TOKENIZER_FAST_QUERIES)
+        self.symbol_generator = SymbolGenerator(config.SYMBOL_NGRAM_ORDERS)
 
         self.executor = executor
 
@@ -23,12 +27,22 @@ class ExtractorService:
     def extract(self, query: str):
 
         tokens = self.tokenizer.tokenize(query)
-        symbols = self.symbol_generator.generate(tokens)
 
-        for symbol_type in self.symbol_generator.grams():
+        # Levels are tried in order and the first with hits wins, so each
+        # level's symbols are only built (and looked up) when it is reached.
+        for n in self.symbol_generator.orders:
+
+            symbol_type = gram_type(n)
+            query_symbols = [
+                symbol
+                for _, symbol in self.symbol_generator.iter_symbols(tokens, (n,))
+            ]
+
+            # A symbol without an id was never indexed, so it matches nothing.
+            self.symbol_ids = symbol_table.lookup_many(query_symbols)
 
             elements, matched_symbols = self._collect_paragraphs(
-                symbols.get(symbol_type, []),
+                query_symbols,
                 symbol_type
             )
 
@@ -53,13 +67,14 @@ class ExtractorService:
 
             for symbol in query_symbols:
 
-                if symbol not in graph:
+                node = self.symbol_ids.get(symbol)
+                if node is None or node not in graph:
                     continue
 
-                if graph.nodes[symbol].get("type") != symbol_type:
+                if graph.nodes[node].get("type") != symbol_type:
                     continue
 
-                for neighbor in graph.neighbors(symbol):
+                for neighbor in graph.neighbors(node):
                     node_type = graph.nodes[neighbor].get("type")
 
                     if node_type not in ("paragraph", "table"):
@@ -105,29 +120,42 @@ class ExtractorService:
             ranked_symbols = ranked_symbols[: self.max_matches]
             ranked_elements = ranked_elements[: self.max_matches]
 
+        symbol_hits = [
+            (*full_id.split("##", 1), score) for full_id, score in ranked_symbols
+        ]
+        element_hits = [
+            (*full_id.split("##", 1), score) for full_id, score in ranked_elements
+        ]
+
+        # Text lives outside the cached graphs; fetch it for the returned
+        # nodes only, in one read.
+        texts = graph_store.fetch_texts(
+            [(graph_id, self.symbol_ids[symbol]) for graph_id, symbol, _ in symbol_hits]
+            + [(graph_id, element) for graph_id, element, _ in element_hits]
+        )
+
         matched_symbols = []
         matched_elements = []
 
-        for full_id, score in ranked_symbols:
-            graph_id, symbol = full_id.split("##", 1)
-            graph = graph_cache.get(graph_id).graph
+        for graph_id, symbol, score in symbol_hits:
+            graph = graph_store.get(graph_id).graph
+            node = self.symbol_ids[symbol]
 
             matched_symbols.append({
                 "id": symbol,
                 "graph_id": graph_id,
-                "content": graph.nodes[symbol].get("text"),
-                "type": graph.nodes[symbol].get("type"),
+                "content": texts.get((graph_id, node)),
+                "type": graph.nodes[node].get("type"),
                 "score": score,
             })
 
-        for full_id, score in ranked_elements:
-            graph_id, element = full_id.split("##", 1)
-            graph = graph_cache.get(graph_id).graph
+        for graph_id, element, score in element_hits:
+            graph = graph_store.get(graph_id).graph
 
             matched_elements.append({
                 "id": element,
                 "graph_id": graph_id,
-                "content": graph.nodes[element].get("text"),
+                "content": texts.get((graph_id, element)),
                 "type": graph.nodes[element].get("type"),
                 "metadata": graph.nodes[element].get("metadata"),
                 "score": score,
@@ -0,0 +1,62 @@
+"""Named counters that tell per-process caches another worker changed data.
+
+Every ingestion worker process keeps its own in-memory caches (symbol ids,
+lexicon entries, decoded graphs). A writer that invalidates what other
+processes may have cached bumps a named counter in the ``generations`` table
+inside its own transaction; readers keep a :class:`Generation` per cache and
+drop the cache when :meth:`Generation.changed` sees the counter move. The
+check is one primary-key read.
+"""
+
+import sqlite3
+import threading
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Create the generation table."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS generations (
+            name  TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        """
+    )
+
+
+def bump(conn: sqlite3.Connection, name: str) -> None:
+    """Advance counter ``name`` inside the caller's transaction."""
+    conn.execute(
+        """
+        INSERT INTO generations (name, value) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET value = value + 1
+        """,
+        (name,),
+    )
+
+
+def read(conn: sqlite3.Connection, name: str) -> int:
+    """Return counter ``name`` (0 if never bumped)."""
+    row = conn.execute(
+        "SELECT value FROM generations WHERE name = ?", (name,)
+    ).fetchone()
+    return row[0] if row is not None else 0
+
+
+class Generation:
+    """This process' last seen value of one counter."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self._seen = None
+
+    def changed(self, conn: sqlite3.Connection) -> bool:
+        """Return whether the counter moved since the previous call.
+
+        The first call only records the current value.
+        """
+        value = read(conn, self.name)
+        with self._lock:
+            seen, self._seen = self._seen, value
+        return seen is not None and seen != value
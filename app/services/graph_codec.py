@@ -0,0 +1,263 @@
+"""Compact binary encoding of networkx graphs.
+
+Layout (all integers little-endian)::
+
+    b"TDBG" | u8 format version | u8 flags (1 = directed, 2 = multigraph)
+    then one section per field, each ``u32 length + zlib(bytes)``:
+
+      strings     JSON list - every string node key and every distinct
+                  attribute dict (canonical JSON), interned once
+      keys        int64 per node - ``(string_index << 1)`` for string keys,
+                  ``(value << 1) | 1`` for integer keys
+      node_attrs  uint32 per node - string index of the node's attribute dict
+      edges       uint32 triples ``(source, target, attrs)`` as node
+                  positions / string index; a fourth column holds the edge
+                  key's string index for multigraphs
+      text_nodes  uint32 node positions that carry a ``text`` attribute
+      texts       JSON list of those texts, compressed on their own
+      graph       JSON of ``graph.graph``
+
+Symbol nodes all share a handful of attribute dicts (``{"type": "unigram"}``
+and so on), so interning them turns most of a graph into integer arrays.
+Large ``text`` values are kept out of the attribute table so they do not
+defeat interning; callers that keep text elsewhere can drop it entirely with
+``encode(graph, with_text=False)``.
+"""
+
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, List, Tuple
+
+import networkx as nx
+
+
+FORMAT_VERSION = 1
+
+_MAGIC = b"TDBG"
+_HEADER = struct.Struct("<4sBB")
+_LEN = struct.Struct("<I")
+_FLAG_DIRECTED = 1
+_FLAG_MULTI = 2
+_TEXT_ATTR = "text"
+
+
+class GraphDecodeError(ValueError):
+    """Raised when a payload is not a graph in a known binary format."""
+
+
+def _json_default(obj: Any) -> Any:
+    """Serialize enums (``IndexType`` etc.) by value, anything else as text."""
+    return getattr(obj, "value", str(obj))
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(
+        obj, sort_keys=True, separators=(",", ":"), default=_json_default
+    )
+
+
+def _pack_array(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack_array(typecode: str, raw: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(raw)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+class _Interner:
+    def __init__(self) -> None:
+        self.items: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        idx = self._index.get(value)
+        if idx is None:
+            idx = len(self.items)
+            self.items.append(value)
+            self._index[value] = idx
+        return idx
+
+
+# ------------------------------------------------------------------ encode
+def encode(graph: nx.Graph, *, with_text: bool = True) -> bytes:
+    """Encode ``graph`` (nodes, edges, attributes) to bytes.
+
+    With ``with_text=False`` string ``text`` attributes are omitted.
+    """
+    strings = _Interner()
+    keys = array("q")
+    node_attrs = array("I")
+    text_nodes = array("I")
+    texts: List[str] = []
+    position: Dict[Any, int] = {}
+
+    for pos, (node, data) in enumerate(graph.nodes(data=True)):
+        position[node] = pos
+
+        if isinstance(node, bool) or not isinstance(node, (str, int)):
+            raise TypeError(f"unsupported node key type: {type(node).__name__}")
+        if isinstance(node, int):
+            keys.append((node << 1) | 1)
+        else:
+            keys.append(strings.add(node) << 1)
+
+        if isinstance(data.get(_TEXT_ATTR), str):
+            data = dict(data)
+            text = data.pop(_TEXT_ATTR)
+            if with_text:
+                text_nodes.append(pos)
+                texts.append(text)
+        node_attrs.append(strings.add(_dumps(data)))
+
+    multi = graph.is_multigraph()
+    edges = array("I")
+    if multi:
+        for u, v, k, data in graph.edges(keys=True, data=True):
+            edges.extend((
+                position[u],
+                position[v],
+                strings.add(_dumps(data)),
+                strings.add(_dumps(k)),
+            ))
+    else:
+        for u, v, data in graph.edges(data=True):
+            edges.extend((position[u], position[v], strings.add(_dumps(data))))
+
+    flags = 0
+    if graph.is_directed():
+        flags |= _FLAG_DIRECTED
+    if multi:
+        flags |= _FLAG_MULTI
+    sections = [
+        json.dumps(strings.items, separators=(",", ":")).encode(),
+        _pack_array(keys),
+        _pack_array(node_attrs),
+        _pack_array(edges),
+        _pack_array(text_nodes),
+        json.dumps(texts, separators=(",", ":")).encode(),
+        _dumps(graph.graph).encode(),
+    ]
+
+    out = [_HEADER.pack(_MAGIC, FORMAT_VERSION, flags)]
+    for section in sections:
+        packed = zlib.compress(section, 6)
+        out.append(_LEN.pack(len(packed)))
+        out.append(packed)
+    return b"".join(out)
+
+
+# ------------------------------------------------------------------ decode
+def _sections(payload: bytes) -> Tuple[int, List[bytes]]:
+    if len(payload) < _HEADER.size:
+        raise GraphDecodeError("payload too short")
+    magic, version, flags = _HEADER.unpack_from(payload, 0)
+    if magic != _MAGIC:
+        raise GraphDecodeError("not a binary graph payload")
+    if version != FORMAT_VERSION:
+        raise GraphDecodeError(f"unsupported graph format version {version}")
+
+    offset = _HEADER.size
+    sections = []
+    while offset < len(payload):
+        (length,) = _LEN.unpack_from(payload, offset)
+        offset += _LEN.size
+        sections.append(zlib.decompress(payload[offset:offset + length]))
+        offset += length
+    if len(sections) != 7:
+        raise GraphDecodeError("truncated graph payload")
+    return flags, sections
+
+
+def _section(payload: bytes, index: int) -> bytes:
+    """Return one decompressed section without inflating the others."""
+    if not is_encoded(payload):
+        raise GraphDecodeError("not a binary graph payload")
+    offset = _HEADER.size
+    for _ in range(index):
+        (length,) = _LEN.unpack_from(payload, offset)
+        offset += _LEN.size + length
+    (length,) = _LEN.unpack_from(payload, offset)
+    offset += _LEN.size
+    return zlib.decompress(payload[offset:offset + length])
+
+
+def int_keys(payload: bytes) -> List[int]:
+    """Return the integer node keys of an encoded graph."""
+    keys = _unpack_array("q", _section(payload, 1))
+    return [code >> 1 for code in keys if code & 1]
+
+
+def graph_attrs(payload: bytes) -> Dict[str, Any]:
+    """Return the ``graph.graph`` attributes of an encoded graph."""
+    return json.loads(_section(payload, 6))
+
+
+def is_encoded(payload: bytes) -> bool:
+    """Return whether ``payload`` starts with the binary graph magic."""
+    return bytes(payload[:4]) == _MAGIC
+
+
+def decode_into(payload: bytes, graph: nx.Graph) -> nx.Graph:
+    """Populate ``graph`` from ``payload`` and return it."""
+    flags, sections = _sections(payload)
+    strings = json.loads(sections[0])
+    keys = _unpack_array("q", sections[1])
+    node_attrs = _unpack_array("I", sections[2])
+    edges = _unpack_array("I", sections[3])
+    text_nodes = _unpack_array("I", sections[4])
+    texts = json.loads(sections[5])
+
+    parsed: Dict[int, Dict[str, Any]] = {}
+
+    def attrs(idx: int) -> Dict[str, Any]:
+        # networkx copies the top-level dict on insert, so flat dicts can be
+        # shared between nodes; nested ones are parsed per use.
+        value = parsed.get(idx)
+        if value is None:
+            raw = strings[idx]
+            value = json.loads(raw)
+            if raw.count("{") == 1 and "[" not in raw:
+                parsed[idx] = value
+        return value
+
+    nodes = [
+        (code >> 1) if code & 1 else strings[code >> 1]
+        for code in keys
+    ]
+    text_of = dict(zip(text_nodes, texts))
+
+    graph.graph.update(json.loads(sections[6]))
+    graph.add_nodes_from(
+        (node, {**attrs(node_attrs[pos]), _TEXT_ATTR: text_of[pos]})
+        if pos in text_of
+        else (node, attrs(node_attrs[pos]))
+        for pos, node in enumerate(nodes)
+    )
+
+    if flags & _FLAG_MULTI and graph.is_multigraph():
+        graph.add_edges_from(
+            (
+                nodes[edges[i]],
+                nodes[edges[i + 1]],
+                json.loads(strings[edges[i + 3]]),
+                attrs(edges[i + 2]),
+            )
+            for i in range(0, len(edges), 4)
+        )
+    else:
+        width = 4 if flags & _FLAG_MULTI else 3
+        graph.add_edges_from(
+            (nodes[edges[i]], nodes[edges[i + 1]], attrs(edges[i + 2]))
+            for i in range(0, len(edges), width)
+        )
+    return graph
@@ -1,8 +1,23 @@
 import json
+from typing import Optional
 
+from app.core import config
 
-def render_graph_html(graph: dict) -> str:
+
+def render_graph_html(graph: dict, *, api_base: Optional[str] = None) -> str:
+    """Render the viewer page for ``graph`` (node-link JSON).
+
+    With ``api_base`` the page holds only a slice of a larger graph (see
+    :mod:`app.services.graph_view`) and fetches more from the slice
+    endpoints under ``api_base`` as the user explores.
+
+    Graphs of more than ``VIEWER_CANVAS_MIN_NODES`` nodes are drawn on a
+    canvas, with a quadtree for hover and clicks, instead of as SVG
+    elements; nodes cannot be dragged in that mode.
+    """
     graph_json = json.dumps(graph)
+    api_json = json.dumps(api_base)
+    canvas_min_nodes = json.dumps(config.VIEWER_CANVAS_MIN_NODES)
 
     return f"""
 <!DOCTYPE html>
@@ -22,21 +37,29 @@ def render_graph_html(graph: dict) -> str:
     }}
 
     #graph-container {{
+      position: relative;
       width: 100vw;
       height: 100vh;
     }}
 
-    svg {{
+    svg, canvas {{
       width: 100%;
       height: 100%;
       cursor: grab;
       background: #ffffff;
     }}
 
-    svg:active {{
+    svg:active, canvas:active {{
       cursor: grabbing;
     }}
 
+    canvas {{
+      position: absolute;
+      top: 0;
+      left: 0;
+      display: none;
+    }}
+
     .tooltip {{
       position: absolute;
       padding: 6px 10px;
@@ -165,6 +188,13 @@ def render_graph_html(graph: dict) -> str:
       color: #2563eb;
     }}
 
+    .more-link {{
+      margin-left: auto;
+      font-size: 10px;
+      color: #2563eb;
+      text-decoration: none;
+    }}
+
     .stats {{
       font-size: 11px;
       color: #64748b;
@@ -213,6 +243,9 @@ def render_graph_html(graph: dict) -> str:
   <label><input type="radio" name="hl-mode" value="filter" checked /> Filter (hide others)</label>
   <label><input type="radio" name="hl-mode" value="highlight" /> Highlight (fade others)</label>
 
+  <h4>Detail</h4>
+  <label><input type="checkbox" id="collapse-symbols" /> Collapse symbols into their elements</label>
+
   <div class="btn-row">
     <button class="btn" id="btn-all">Select all</button>
     <button class="btn" id="btn-none">Clear</button>
@@ -224,10 +257,13 @@ def render_graph_html(graph: dict) -> str:
 
 <div id="graph-container">
   <svg></svg>
+  <canvas></canvas>
 </div>
 
 <script>
 const data = {graph_json};
+const API_BASE = {api_json};
+const CANVAS_MIN_NODES = {canvas_min_nodes};
 
 // --- Normalize: networkx node_link_data may emit "links" or "edges" ---
 const rawLinks = data.links || data.edges || [];
@@ -264,13 +300,35 @@ function edgeKind(e) {{
   return e.type || "unknown";
 }}
 
-const edgeTypes = Array.from(new Set(rawLinks.map(edgeKind))).sort();
-const nodeTypes = Array.from(new Set(data.nodes.map(nodeKind))).sort();
+// A sliced graph lists every type up front, loaded or not.
+const edgeTypes = Array.from(new Set([
+  ...Object.keys(data.edge_types || {{}}), ...rawLinks.map(edgeKind)
+])).sort();
+const nodeTypes = Array.from(new Set([
+  ...Object.keys(data.types || {{}}), ...data.nodes.map(nodeKind)
+])).sort();
 
 const activeEdgeTypes = new Set(edgeTypes);
 const activeNodeTypes = new Set(nodeTypes);
 let highlightMode = "filter"; // or "highlight"
 let searchTerm = "";
+// Level of detail: hide symbol nodes inside the element they cluster under.
+let collapseSymbols = Boolean(API_BASE);
+document.getElementById("collapse-symbols").checked = collapseSymbols;
+
+function isCollapsed(n) {{
+  return collapseSymbols && n.cluster !== undefined && n.cluster !== null;
+}}
+
+function nodeRadius(d) {{
+  const k = nodeKind(d);
+  let r = 6;
+  if (k === "file@root") r = 14;
+  else if (k === "section@outline") r = 11;
+  else if (k === "paragraph" || k === "section@para" || k === "table") r = 9;
+  if (collapseSymbols && d.members) r += Math.min(12, 2 * Math.sqrt(d.members));
+  return r;
+}}
 
 // --- Build filter UI ---
 const edgeFilterDiv = document.getElementById("edge-filters");
@@ -292,32 +350,138 @@ nodeTypes.forEach(t => {{
   label.innerHTML = `<input type="checkbox" id="${{id}}" checked data-node="${{t}}"/>
     <span class="swatch" style="background:${{color}}"></span>
     <span>${{t}}</span>`;
+  if (API_BASE) {{
+    const more = document.createElement("a");
+    more.href = "#";
+    more.className = "more-link";
+    more.textContent = "+ more";
+    more.addEventListener("click", (event) => {{
+      event.preventDefault();
+      loadMoreOfType(t, more);
+    }});
+    label.appendChild(more);
+  }}
   nodeFilterDiv.appendChild(label);
 }});
 
 // --- D3 setup ---
-const svg = d3.select("svg");
 const container = document.getElementById("graph-container");
 let width = container.clientWidth;
 let height = container.clientHeight;
 
+// Large graphs are drawn on a canvas: one element per node / link does
+// not scale past a few thousand.
+const CANVAS = (data.total_nodes ?? data.nodes.length) > CANVAS_MIN_NODES;
+const svg = d3.select("svg");
+const canvas = d3.select("canvas");
+const surface = CANVAS ? canvas : svg;
+if (CANVAS) {{
+  svg.style("display", "none");
+  canvas.style("display", "block");
+}}
+
 const g = svg.append("g");
+let transform = d3.zoomIdentity;
 
 const zoom = d3.zoom()
-  .scaleExtent([0.1, 5])
+  .scaleExtent([CANVAS ? 0.01 : 0.1, 5])
   .on("zoom", (event) => {{
-    g.attr("transform", event.transform);
+    transform = event.transform;
+    if (CANVAS) requestDraw();
+    else g.attr("transform", transform);
   }});
 
-svg.call(zoom);
+surface.call(zoom);
+
+// Positions computed server-side are final: pin them and never simulate.
+const PRELAID = Boolean(data.layout);
+
+function pin(n) {{
+  if (PRELAID && n.x !== undefined) {{
+    n.fx = n.x;
+    n.fy = n.y;
+  }}
+}}
+
+data.nodes.forEach(pin);
+const nodeById = new Map(data.nodes.map(n => [n.id, n]));
+const linkKeys = new Set(rawLinks.map(linkKey));
+
+function linkKey(e) {{
+  return `${{edgeSrcId(e)}}|${{edgeDstId(e)}}|${{edgeKind(e)}}`;
+}}
+
+// --- Indexes: filters and search only touch the nodes / links they return ---
+const nodesByType = new Map();
+const linksByType = new Map();
+const incident = new Map();   // node id -> links touching it
+const trigrams = new Map();   // 3-char substring -> nodes containing it
+let lastSearch = null;        // {{ q, hits }} of the previous query
+
+function pushTo(map, key, value) {{
+  let bucket = map.get(key);
+  if (!bucket) map.set(key, bucket = []);
+  bucket.push(value);
+}}
+
+function indexNode(n) {{
+  pushTo(nodesByType, nodeKind(n), n);
+  n._search = [n.id, n.label, n.text]
+    .filter(v => v !== undefined && v !== null)
+    .join("\\n")
+    .toLowerCase();
+  for (let i = 0; i + 3 <= n._search.length; i++) {{
+    const gram = n._search.slice(i, i + 3);
+    let bucket = trigrams.get(gram);
+    if (!bucket) trigrams.set(gram, bucket = new Set());
+    bucket.add(n);
+  }}
+  lastSearch = null;
+}}
+
+function indexLink(e) {{
+  pushTo(linksByType, edgeKind(e), e);
+  pushTo(incident, edgeSrcId(e), e);
+  if (edgeDstId(e) !== edgeSrcId(e)) pushTo(incident, edgeDstId(e), e);
+}}
+
+data.nodes.forEach(indexNode);
+rawLinks.forEach(indexLink);
+
+// Nodes whose id / label / text contains ``q``. Candidates come from the
+// rarest trigram of the query (or the previous query's hits while typing),
+// so the cost follows the number of matches, not the graph size.
+function searchMatches(q) {{
+  q = q.toLowerCase();
+  let candidates = data.nodes;
+  if (q.length >= 3) {{
+    for (let i = 0; i + 3 <= q.length; i++) {{
+      const bucket = trigrams.get(q.slice(i, i + 3));
+      if (!bucket) return [];
+      if (candidates === data.nodes || bucket.size < candidates.size) candidates = bucket;
+    }}
+  }}
+  if (lastSearch && q.includes(lastSearch.q)) {{
+    const size = candidates.size ?? candidates.length;
+    if (lastSearch.hits.length < size) candidates = lastSearch.hits;
+  }}
+  const hits = [];
+  for (const n of candidates) {{
+    if (n._search.includes(q)) hits.push(n);
+  }}
+  lastSearch = {{ q, hits }};
+  return hits;
+}}
 
 // Force simulation — run once, then pin nodes so layout stays stable
-// while the user types/filters.
+// while the user types/filters. With a server-side layout it only resolves
+// link endpoints and serves drags; it never runs on its own.
 const simulation = d3.forceSimulation(data.nodes)
   .force("link", d3.forceLink(rawLinks).id(d => d.id).distance(90))
   .force("charge", d3.forceManyBody().strength(-350))
   .force("center", d3.forceCenter(width / 2, height / 2))
   .alphaDecay(0.035);
+if (PRELAID) simulation.stop();
 
 // Once initial layout settles, pin every node so the graph stops moving.
 // Dragging still works: dragstarted/dragended update fx/fy.
@@ -328,86 +492,349 @@ simulation.on("end", () => {{
   }});
 }});
 
-// Links
-const link = g.append("g")
-  .attr("stroke-opacity", 0.7)
-  .selectAll("line")
-  .data(rawLinks)
-  .enter()
-  .append("line")
-  .attr("stroke", d => EDGE_COLORS[edgeKind(d)] || EDGE_COLORS.unknown)
-  .attr("stroke-width", 1.4);
-
-// Nodes
-const node = g.append("g")
-  .selectAll("circle")
-  .data(data.nodes)
-  .enter()
-  .append("circle")
-  .attr("r", d => {{
-    const k = nodeKind(d);
-    if (k === "file@root") return 14;
-    if (k === "section@outline") return 11;
-    if (k === "paragraph" || k === "section@para" || k === "table") return 9;
-    return 6;
-  }})
-  .attr("fill", d => NODE_COLORS[nodeKind(d)] || NODE_COLORS.unknown)
-  .attr("stroke", "#ffffff")
-  .attr("stroke-width", 1.2)
-  .call(
-    d3.drag()
-      .on("start", dragstarted)
-      .on("drag", dragged)
-      .on("end", dragended)
-  );
+const linkLayer = g.append("g").attr("stroke-opacity", 0.7);
+const nodeLayer = g.append("g");
+let link = linkLayer.selectAll("line");
+let node = nodeLayer.selectAll("circle");
 
 // Tooltip
 const tooltip = d3.select("#tooltip");
 
-node
-  .on("mouseenter", (event, d) => {{
-    const parts = [
-      `<strong>${{d.label ?? d.id}}</strong>`,
-      `type: ${{d.type ?? "-"}}`,
-      d.index ? `index: ${{d.index}}` : null,
-      d.text ? `text: ${{(d.text + "").slice(0, 120)}}${{(d.text + "").length > 120 ? "…" : ""}}` : null
-    ].filter(Boolean);
-    tooltip.style("opacity", 1).html(parts.join("<br/>"));
-  }})
-  .on("mousemove", (event) => {{
-    tooltip
-      .style("left", event.pageX + 12 + "px")
-      .style("top", event.pageY + 12 + "px");
-  }})
-  .on("mouseleave", () => {{
-    tooltip.style("opacity", 0);
-  }})
-  .on("click", (event, d) => {{
-    event.stopPropagation();
-    focusNodeNeighborhood(d);
+function moveTooltip(event) {{
+  tooltip
+    .style("left", event.pageX + 12 + "px")
+    .style("top", event.pageY + 12 + "px");
+}}
+
+function nodeTooltip(d) {{
+  const parts = [
+    `<strong>${{d.label ?? d.id}}</strong>`,
+    `type: ${{d.type ?? "-"}}`,
+    d.index ? `index: ${{d.index}}` : null,
+    d.degree !== undefined ? `degree: ${{d.degree}}` : null,
+    d.members ? `symbols: ${{d.members}}` : null,
+    d.text ? `text: ${{(d.text + "").slice(0, 120)}}${{(d.text + "").length > 120 ? "…" : ""}}` : null
+  ].filter(Boolean);
+  tooltip.style("opacity", 1).html(parts.join("<br/>"));
+}}
+
+// (Re)bind the current node / link arrays; existing elements are kept.
+function renderGraph() {{
+  hitIndex = null;
+  simulation.nodes(data.nodes);
+  simulation.force("link").links(rawLinks);
+  if (CANVAS) {{
+    requestDraw();
+    return;
+  }}
+
+  link = link
+    .data(rawLinks, linkKey)
+    .join(enter => enter.append("line")
+      .attr("stroke", d => EDGE_COLORS[edgeKind(d)] || EDGE_COLORS.unknown)
+      .attr("stroke-width", 1.4)
+      .on("mouseenter", (event, d) => {{
+        tooltip.style("opacity", 1).html(
+          `<strong>${{edgeKind(d)}}</strong><br/>` +
+          `${{(d.source.id ?? d.source)}} → ${{(d.target.id ?? d.target)}}`
+        );
+      }})
+      .on("mousemove", moveTooltip)
+      .on("mouseleave", () => {{
+        tooltip.style("opacity", 0);
+      }}));
+
+  node = node
+    .data(data.nodes, d => d.id)
+    .join(enter => enter.append("circle")
+      .attr("r", nodeRadius)
+      .attr("fill", d => NODE_COLORS[nodeKind(d)] || NODE_COLORS.unknown)
+      .attr("stroke", "#ffffff")
+      .attr("stroke-width", 1.2)
+      .call(
+        d3.drag()
+          .on("start", dragstarted)
+          .on("drag", dragged)
+          .on("end", dragended)
+      )
+      .on("mouseenter", (event, d) => nodeTooltip(d))
+      .on("mousemove", moveTooltip)
+      .on("mouseleave", () => {{
+        tooltip.style("opacity", 0);
+      }})
+      .on("click", (event, d) => {{
+        event.stopPropagation();
+        expandAndFocus(d);
+      }}));
+}}
+
+// --- Canvas renderer ---
+const ctx = CANVAS ? canvas.node().getContext("2d") : null;
+let viewState = null;   // set by paint()
+let drawPending = false;
+let hitIndex = null;    // quadtree of drawable nodes, rebuilt lazily
+
+function resizeCanvas() {{
+  const dpr = window.devicePixelRatio || 1;
+  canvas.attr("width", Math.round(width * dpr)).attr("height", Math.round(height * dpr));
+}}
+
+function requestDraw() {{
+  if (drawPending) return;
+  drawPending = true;
+  requestAnimationFrame(draw);
+}}
+
+// null = hidden, otherwise "faded" / "normal" / "highlight".
+function nodeStyle(n) {{
+  if (!viewState || viewState.nodes.has(n.id)) return "normal";
+  return viewState.hide ? null : "faded";
+}}
+
+function linkStyle(e) {{
+  if (!viewState) return "normal";
+  if (!viewState.links.has(e)) return viewState.hide ? null : "faded";
+  return viewState.emphasize ? "highlight" : "normal";
+}}
+
+const STYLE_ALPHA = {{ faded: 0.05, normal: 0.7, highlight: 1 }};
+
+function draw() {{
+  drawPending = false;
+  const dpr = window.devicePixelRatio || 1;
+  ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+  ctx.clearRect(0, 0, width, height);
+  ctx.translate(transform.x, transform.y);
+  ctx.scale(transform.k, transform.k);
+
+  // World rectangle on screen; anything outside is skipped.
+  const [x0, y0] = transform.invert([0, 0]);
+  const [x1, y1] = transform.invert([width, height]);
+  const onScreen = (x, y, pad) =>
+    x >= x0 - pad && x <= x1 + pad && y >= y0 - pad && y <= y1 + pad;
+
+  // Links: one path per color and style.
+  const linkBatches = new Map();
+  for (const e of rawLinks) {{
+    const style = linkStyle(e);
+    if (!style || typeof e.source !== "object") continue;
+    if (!onScreen(e.source.x, e.source.y, 0) && !onScreen(e.target.x, e.target.y, 0)) continue;
+    const color = style === "highlight" ? "#0f172a" : (EDGE_COLORS[edgeKind(e)] || EDGE_COLORS.unknown);
+    pushTo(linkBatches, `${{color}}|${{style}}`, e);
+  }}
+  linkBatches.forEach((batch, key) => {{
+    const [color, style] = key.split("|");
+    ctx.beginPath();
+    for (const e of batch) {{
+      ctx.moveTo(e.source.x, e.source.y);
+      ctx.lineTo(e.target.x, e.target.y);
+    }}
+    ctx.globalAlpha = STYLE_ALPHA[style];
+    ctx.strokeStyle = color;
+    ctx.lineWidth = style === "highlight" ? 2.2 : 1.4;
+    ctx.stroke();
   }});
 
-link
-  .on("mouseenter", (event, d) => {{
-    tooltip.style("opacity", 1).html(
-      `<strong>${{edgeKind(d)}}</strong><br/>` +
-      `${{(d.source.id ?? d.source)}} → ${{(d.target.id ?? d.target)}}`
-    );
-  }})
-  .on("mousemove", (event) => {{
-    tooltip
-      .style("left", event.pageX + 12 + "px")
-      .style("top", event.pageY + 12 + "px");
-  }})
-  .on("mouseleave", () => {{
-    tooltip.style("opacity", 0);
+  // Nodes: one path per fill color and style.
+  const nodeBatches = new Map();
+  for (const n of data.nodes) {{
+    const style = nodeStyle(n);
+    if (!style || !onScreen(n.x, n.y, nodeRadius(n))) continue;
+    const color = NODE_COLORS[nodeKind(n)] || NODE_COLORS.unknown;
+    pushTo(nodeBatches, `${{color}}|${{style}}`, n);
+  }}
+  nodeBatches.forEach((batch, key) => {{
+    const [color, style] = key.split("|");
+    ctx.beginPath();
+    for (const n of batch) {{
+      const r = nodeRadius(n);
+      ctx.moveTo(n.x + r, n.y);
+      ctx.arc(n.x, n.y, r, 0, 2 * Math.PI);
+    }}
+    ctx.globalAlpha = style === "faded" ? 0.08 : 1;
+    ctx.fillStyle = color;
+    ctx.fill();
+    if (transform.k >= 0.5) {{
+      ctx.strokeStyle = "#ffffff";
+      ctx.lineWidth = 1.2;
+      ctx.stroke();
+    }}
   }});
 
+  if (viewState && viewState.focus.size) {{
+    ctx.beginPath();
+    viewState.focus.forEach(id => {{
+      const n = nodeById.get(id);
+      if (!n || !nodeStyle(n)) return;
+      const r = nodeRadius(n);
+      ctx.moveTo(n.x + r, n.y);
+      ctx.arc(n.x, n.y, r, 0, 2 * Math.PI);
+    }});
+    ctx.globalAlpha = 1;
+    ctx.strokeStyle = "#0f172a";
+    ctx.lineWidth = 2.5;
+    ctx.stroke();
+  }}
+}}
+
+function nodeAt(event) {{
+  if (!hitIndex) {{
+    hitIndex = d3.quadtree()
+      .x(n => n.x)
+      .y(n => n.y)
+      .addAll(data.nodes.filter(n => nodeStyle(n) !== null));
+  }}
+  const [x, y] = transform.invert(d3.pointer(event, canvas.node()));
+  const slack = 4 / transform.k;
+  // 26 = largest node radius (section + collapsed-symbol bonus).
+  const n = hitIndex.find(x, y, 26 + slack);
+  return n && Math.hypot(n.x - x, n.y - y) <= nodeRadius(n) + slack ? n : null;
+}}
+
+if (CANVAS) {{
+  resizeCanvas();
+  canvas
+    .on("mousemove", (event) => {{
+      const n = nodeAt(event);
+      canvas.style("cursor", n ? "pointer" : null);
+      if (!n) {{
+        tooltip.style("opacity", 0);
+        return;
+      }}
+      nodeTooltip(n);
+      moveTooltip(event);
+    }})
+    .on("mouseleave", () => {{
+      tooltip.style("opacity", 0);
+    }})
+    .on("click", (event) => {{
+      const n = nodeAt(event);
+      if (n) expandAndFocus(n);
+      else applyFilters();
+    }});
+}}
+
+// Show a view: ``nodes`` / ``links`` are the sets in view; the rest are
+// hidden (``hide``) or faded. ``focus`` nodes get a ring; ``emphasize``
+// darkens the links in view.
+function paint(state) {{
+  viewState = state;
+  hitIndex = null;
+  if (CANVAS) {{
+    requestDraw();
+    return;
+  }}
+
+  node
+    .style("display", d => state.hide && !state.nodes.has(d.id) ? "none" : null)
+    .classed("node-faded", d => !state.hide && !state.nodes.has(d.id))
+    .classed("node-highlight", d => state.focus.has(d.id));
+
+  link
+    .style("display", e => state.hide && !state.links.has(e) ? "none" : null)
+    .classed("link-faded", e => !state.hide && !state.links.has(e))
+    .classed("link-highlight", e => state.emphasize && state.links.has(e));
+}}
+
+// --- Remote slices (large graphs) ---
+async function fetchSlice(path, params) {{
+  const url = new URL(API_BASE + path, window.location.href);
+  Object.entries(params).forEach(([k, v]) => {{
+    if (v !== null && v !== undefined) url.searchParams.set(k, v);
+  }});
+  const res = await fetch(url);
+  if (!res.ok) throw new Error(`${{path}}: HTTP ${{res.status}}`);
+  return res.json();
+}}
+
+// Add unseen nodes (placed around ``anchor``) and links; returns #new nodes.
+function mergeSlice(slice, anchor) {{
+  let added = 0;
+  (slice.nodes || []).forEach(n => {{
+    if (nodeById.has(n.id)) return;
+    if (PRELAID && n.x !== undefined) {{
+      pin(n);
+    }} else if (anchor) {{
+      n.x = anchor.x + (Math.random() - 0.5) * 80;
+      n.y = anchor.y + (Math.random() - 0.5) * 80;
+    }}
+    nodeById.set(n.id, n);
+    data.nodes.push(n);
+    indexNode(n);
+    added += 1;
+  }});
+  (slice.links || []).forEach(e => {{
+    const key = linkKey(e);
+    if (linkKeys.has(key)) return;
+    if (!nodeById.has(e.source) || !nodeById.has(e.target)) return;
+    linkKeys.add(key);
+    rawLinks.push(e);
+    indexLink(e);
+  }});
+  if (added) {{
+    renderGraph();
+    if (PRELAID) ticked();
+    else simulation.alpha(0.3).restart();
+  }}
+  return added;
+}}
+
+async function expandAndFocus(d) {{
+  if (API_BASE) {{
+    try {{
+      mergeSlice(await fetchSlice("/ego", {{ node: d.id, radius: 1 }}), d);
+    }} catch (err) {{
+      console.error(err);
+    }}
+  }}
+  focusNodeNeighborhood(d);
+}}
+
+const typeCursors = new Map();
+
+async function loadMoreOfType(t, linkEl) {{
+  const cursor = typeCursors.get(t);
+  if (cursor === null) return;
+  try {{
+    const page = await fetchSlice("/nodes", {{ type: t, cursor: cursor }});
+    typeCursors.set(t, page.next_cursor);
+    if (page.next_cursor === null) linkEl.remove();
+    mergeSlice(page, {{ x: width / 2, y: height / 2 }});
+    applyFilters();
+  }} catch (err) {{
+    console.error(err);
+  }}
+}}
+
+let searchTimer = null;
+
+function remoteSearch(term) {{
+  clearTimeout(searchTimer);
+  if (!term) return;
+  searchTimer = setTimeout(async () => {{
+    try {{
+      const page = await fetchSlice("/search", {{ q: term }});
+      if (term !== searchTerm) return;
+      if (mergeSlice(page, {{ x: width / 2, y: height / 2 }})) applyFilters();
+    }} catch (err) {{
+      console.error(err);
+    }}
+  }}, 250);
+}}
+
+renderGraph();
+
 // Clear focus on background click
-svg.on("click", () => applyFilters());
+if (!CANVAS) svg.on("click", () => applyFilters());
 
 // Tick update
-simulation.on("tick", () => {{
+function ticked() {{
+  if (CANVAS) {{
+    hitIndex = null;
+    requestDraw();
+    return;
+  }}
+
   link
     .attr("x1", d => d.source.x)
     .attr("y1", d => d.source.y)
@@ -417,7 +844,31 @@ simulation.on("tick", () => {{
   node
     .attr("cx", d => d.x)
     .attr("cy", d => d.y);
-}});
+}}
+
+simulation.on("tick", ticked);
+
+// Zoom so every shown node is in view (server layouts are centered on 0,0).
+function fitTransform() {{
+  const shown = data.nodes.filter(n => !isCollapsed(n) && n.x !== undefined);
+  if (!shown.length) return d3.zoomIdentity;
+  const xs = shown.map(n => n.x);
+  const ys = shown.map(n => n.y);
+  const [x0, x1] = [Math.min(...xs), Math.max(...xs)];
+  const [y0, y1] = [Math.min(...ys), Math.max(...ys)];
+  const k = Math.min(
+    5, 0.9 / Math.max((x1 - x0) / width, (y1 - y0) / height, 1e-6)
+  );
+  return d3.zoomIdentity
+    .translate(width / 2, height / 2)
+    .scale(k)
+    .translate(-(x0 + x1) / 2, -(y0 + y1) / 2);
+}}
+
+if (PRELAID) {{
+  ticked();
+  surface.call(zoom.transform, fitTransform());
+}}
 
 // Drag handlers
 function dragstarted(event, d) {{
@@ -446,6 +897,7 @@ function edgePassesTypeFilters(e) {{
   if (!activeEdgeTypes.has(edgeKind(e))) return false;
   const sNode = typeof e.source === "object" ? e.source : null;
   const tNode = typeof e.target === "object" ? e.target : null;
+  if ((sNode && isCollapsed(sNode)) || (tNode && isCollapsed(tNode))) return false;
   if (sNode && !activeNodeTypes.has(nodeKind(sNode))) return false;
   if (tNode && !activeNodeTypes.has(nodeKind(tNode))) return false;
   return true;
@@ -453,34 +905,27 @@ function edgePassesTypeFilters(e) {{
 
 function nodeMatchesSearch(n) {{
   if (!searchTerm) return false;
-  const q = searchTerm.toLowerCase();
-  return (
-    (n.id + "").toLowerCase().includes(q) ||
-    (n.label ? (n.label + "").toLowerCase().includes(q) : false) ||
-    (n.text ? (n.text + "").toLowerCase().includes(q) : false)
-  );
+  return n._search.includes(searchTerm.toLowerCase());
 }}
 
 // Matched nodes + all neighbors reachable via currently-active edge types.
 function computeSearchSubgraph() {{
   const matched = new Set();
-  data.nodes.forEach(n => {{
-    if (activeNodeTypes.has(nodeKind(n)) && nodeMatchesSearch(n)) matched.add(n.id);
+  searchMatches(searchTerm).forEach(n => {{
+    if (activeNodeTypes.has(nodeKind(n))) matched.add(n.id);
   }});
   if (matched.size === 0) return {{ matched, nodes: new Set(), edges: new Set() }};
 
   const subNodes = new Set(matched);
   const subEdges = new Set();
 
-  rawLinks.forEach(e => {{
-    if (!activeEdgeTypes.has(edgeKind(e))) return;
-    const sid = edgeSrcId(e);
-    const tid = edgeDstId(e);
-    if (matched.has(sid) || matched.has(tid)) {{
+  matched.forEach(id => {{
+    (incident.get(id) || []).forEach(e => {{
+      if (!activeEdgeTypes.has(edgeKind(e))) return;
       subEdges.add(e);
-      subNodes.add(sid);
-      subNodes.add(tid);
-    }}
+      subNodes.add(edgeSrcId(e));
+      subNodes.add(edgeDstId(e));
+    }});
   }});
 
   return {{ matched, nodes: subNodes, edges: subEdges }};
@@ -492,16 +937,9 @@ function applyView() {{
   // SEARCH MODE: fade everything except the matched subgraph.
   if (searchTerm) {{
     const sg = computeSearchSubgraph();
-
-    node
-      .style("display", null)
-      .classed("node-faded", d => !sg.nodes.has(d.id))
-      .classed("node-highlight", d => sg.matched.has(d.id));
-
-    link
-      .style("display", null)
-      .classed("link-faded", e => !sg.edges.has(e))
-      .classed("link-highlight", e => sg.edges.has(e));
+    paint({{
+      nodes: sg.nodes, links: sg.edges, focus: sg.matched, hide: false, emphasize: true
+    }});
 
     const matchCount = sg.matched.size;
     updateStats(
@@ -515,38 +953,31 @@ function applyView() {{
   }}
 
   // FILTER-ONLY MODE: apply edge/node-type checkboxes.
-  const visibleEdges = new Set(rawLinks.filter(edgePassesTypeFilters));
+  const visibleEdges = new Set();
+  activeEdgeTypes.forEach(t => {{
+    (linksByType.get(t) || []).forEach(e => {{
+      if (edgePassesTypeFilters(e)) visibleEdges.add(e);
+    }});
+  }});
   const visibleNodes = new Set();
   visibleEdges.forEach(e => {{
     visibleNodes.add(edgeSrcId(e));
     visibleNodes.add(edgeDstId(e));
   }});
   // Keep isolated nodes whose type passes the filter
-  data.nodes.forEach(n => {{
-    if (activeNodeTypes.has(nodeKind(n))) visibleNodes.add(n.id);
+  activeNodeTypes.forEach(t => {{
+    (nodesByType.get(t) || []).forEach(n => {{
+      if (!isCollapsed(n)) visibleNodes.add(n.id);
+    }});
   }});
 
-  if (highlightMode === "filter") {{
-    node
-      .classed("node-faded", false)
-      .classed("node-highlight", false)
-      .style("display", d => visibleNodes.has(d.id) ? null : "none");
-
-    link
-      .classed("link-faded", false)
-      .classed("link-highlight", false)
-      .style("display", e => visibleEdges.has(e) ? null : "none");
-  }} else {{
-    node
-      .style("display", null)
-      .classed("node-faded", d => !visibleNodes.has(d.id))
-      .classed("node-highlight", false);
-
-    link
-      .style("display", null)
-      .classed("link-faded", e => !visibleEdges.has(e))
-      .classed("link-highlight", false);
-  }}
+  paint({{
+    nodes: visibleNodes,
+    links: visibleEdges,
+    focus: new Set(),
+    hide: highlightMode === "filter",
+    emphasize: false
+  }});
 
   updateStats(visibleEdges.size, visibleNodes.size);
 }}
@@ -559,9 +990,9 @@ function focusNodeNeighborhood(d) {{
   const keepEdges = new Set();
 
   const queue = [d.id];
-  while (queue.length) {{
-    const cur = queue.shift();
-    rawLinks.forEach(e => {{
+  for (let i = 0; i < queue.length; i++) {{
+    const cur = queue[i];
+    (incident.get(cur) || []).forEach(e => {{
       if (!activeEdgeTypes.has(edgeKind(e))) return;
       const sid = edgeSrcId(e);
       const tid = edgeDstId(e);
@@ -579,22 +1010,16 @@ function focusNodeNeighborhood(d) {{
     }});
   }}
 
-  node
-    .style("display", null)
-    .classed("node-faded", n => !neighborIds.has(n.id))
-    .classed("node-highlight", n => n.id === d.id);
-
-  link
-    .style("display", null)
-    .classed("link-faded", e => !keepEdges.has(e))
-    .classed("link-highlight", e => keepEdges.has(e));
+  paint({{
+    nodes: neighborIds, links: keepEdges, focus: new Set([d.id]), hide: false, emphasize: true
+  }});
 
   updateStats(keepEdges.size, neighborIds.size, `Focused on "${{d.label ?? d.id}}"`);
 }}
 
 function updateStats(visibleEdgeCount, visibleNodeCount, note) {{
-  const totalNodes = data.nodes.length;
-  const totalEdges = rawLinks.length;
+  const totalNodes = data.total_nodes ?? data.nodes.length;
+  const totalEdges = data.total_edges ?? rawLinks.length;
   const shownNodes = visibleNodeCount !== undefined
     ? visibleNodeCount
     : data.nodes.filter(n => activeNodeTypes.has(nodeKind(n)) && nodeMatchesSearch(n)).length;
@@ -630,9 +1055,16 @@ document.querySelectorAll('input[name="hl-mode"]').forEach(r => {{
   }});
 }});
 
+document.getElementById("collapse-symbols").addEventListener("change", (e) => {{
+  collapseSymbols = e.target.checked;
+  node.attr("r", nodeRadius);
+  applyFilters();
+}});
+
 document.getElementById("search").addEventListener("input", (e) => {{
   searchTerm = e.target.value.trim();
   applyFilters();
+  if (API_BASE) remoteSearch(searchTerm);
 }});
 
 document.getElementById("btn-all").addEventListener("click", () => {{
@@ -655,7 +1087,9 @@ document.getElementById("btn-reset").addEventListener("click", () => {{
   edgeTypes.forEach(t => activeEdgeTypes.add(t));
   nodeTypes.forEach(t => activeNodeTypes.add(t));
   document.querySelectorAll('input[data-edge], input[data-node]').forEach(cb => cb.checked = true);
-  svg.transition().duration(500).call(zoom.transform, d3.zoomIdentity);
+  surface.transition().duration(500).call(
+    zoom.transform, PRELAID ? fitTransform() : d3.zoomIdentity
+  );
   applyFilters();
 }});
 
@@ -666,6 +1100,11 @@ applyFilters();
 window.addEventListener("resize", () => {{
   width = container.clientWidth;
   height = container.clientHeight;
+  if (CANVAS) {{
+    resizeCanvas();
+    requestDraw();
+  }}
+  if (PRELAID) return;
   simulation.force("center", d3.forceCenter(width / 2, height / 2));
   simulation.alpha(0.3).restart();
 }});
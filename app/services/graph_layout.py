@@ -0,0 +1,274 @@
+"""Server-side node positions for the graph viewer.
+
+The viewer used to run a d3 force simulation over every node it was given,
+which on large graphs never settled. Instead, :func:`get` computes positions
+once per graph version (:func:`graph_store.version`) and stores them in
+:mod:`app.services.layout_store`; the page draws nodes where they are and
+runs no simulation at all.
+
+The layout is multilevel:
+
+* Symbol nodes (lemmas, n-grams, keys/values) are not part of the force pass.
+  Each one is clustered under the first element node it is linked to and
+  placed on a small spiral around it; the viewer can collapse these clusters
+  into their element (``cluster`` / ``members`` node attributes).
+* Element leaves are folded into their neighbor until at most
+  ``GRAPH_LAYOUT_FORCE_MAX_NODES`` elements remain, so the force pass stays
+  bounded however large the document is. Folded elements are placed around
+  the node they were folded into, innermost last.
+* The remaining elements get a Fruchterman-Reingold layout
+  (``nx.spring_layout``, whose sparse solver above 500 nodes needs scipy),
+  scaled so nodes sit about ``GRAPH_LAYOUT_SPACING`` px apart.
+
+Layouts are memoized per cached graph object, like the view indexes in
+:mod:`app.services.graph_view`.
+"""
+
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import networkx as nx
+from talkingdb.logger.console import logger
+from talkingdb.models.graph.graph import GraphModel
+
+from app.core import config
+from app.core.sqlite_pool import sqlite_conn
+from app.services import graph_store, layout_store
+from app.services.symbol_table import is_symbol_node
+
+
+_GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+# Spiral of collapsed nodes around their parent, in px.
+_RING = 18.0
+_RING_STEP = 9.0
+
+
+@dataclass
+class Layout:
+    version: int
+    positions: Dict[Any, Tuple[float, float]]
+    # symbol node -> element it is clustered under
+    parents: Dict[Any, Any]
+    # element -> number of symbol nodes clustered under it
+    members: Dict[Any, int]
+
+
+_layouts: "OrderedDict[str, Tuple[GraphModel, Layout]]" = OrderedDict()
+_layouts_lock = threading.Lock()
+# graph_id -> [compute lock, callers holding or waiting for it]; an entry is
+# dropped by the last of them, so every concurrent caller shares one lock.
+_computing: Dict[str, List[Any]] = {}
+
+
+# ------------------------------------------------------------------ layout
+def _fold_leaves(
+    adjacency: Dict[Any, set], limit: int
+) -> List[Tuple[Any, Any]]:
+    """Fold leaves into their neighbor until ``limit`` nodes remain.
+
+    Mutates ``adjacency``; returns ``(leaf, parent)`` in folding order.
+    """
+    folded: List[Tuple[Any, Any]] = []
+    while len(adjacency) > limit:
+        leaves = [node for node, adj in adjacency.items() if len(adj) == 1]
+        if not leaves:
+            break
+        for leaf in leaves:
+            if len(adjacency) <= limit:
+                break
+            adj = adjacency.get(leaf)
+            if adj is None or len(adj) != 1:
+                continue
+            (parent,) = adj
+            adjacency[parent].discard(leaf)
+            del adjacency[leaf]
+            folded.append((leaf, parent))
+    return folded
+
+
+def compute(
+    graph: nx.Graph,
+) -> Tuple[Dict[Any, Tuple[float, float]], Dict[Any, Any]]:
+    """Return ``(positions, parents)`` for every node of ``graph``."""
+    undirected = graph.to_undirected(as_view=True)
+    symbols = [n for n, data in graph.nodes(data=True) if is_symbol_node(data)]
+    symbol_set = set(symbols)
+    adjacency = {
+        node: {
+            other for other in undirected[node]
+            if other != node and other not in symbol_set
+        }
+        for node in graph
+        if node not in symbol_set
+    }
+
+    folded = _fold_leaves(
+        adjacency, max(config.GRAPH_LAYOUT_FORCE_MAX_NODES, 1)
+    )
+
+    core = nx.Graph()
+    core.add_nodes_from(adjacency)
+    core.add_edges_from((u, v) for u, adj in adjacency.items() for v in adj)
+    scale = max(config.GRAPH_LAYOUT_SPACING, 1) * math.sqrt(len(core) or 1)
+    positions: Dict[Any, Tuple[float, float]] = {
+        node: (float(x), float(y))
+        for node, (x, y) in nx.spring_layout(
+            core,
+            iterations=max(config.GRAPH_LAYOUT_ITERATIONS, 1),
+            scale=scale,
+            center=(0.0, 0.0),
+            seed=0,
+        ).items()
+    }
+
+    placed: Dict[Any, int] = {}
+
+    def place(node: Any, anchor: Any, origin: Tuple[float, float]) -> None:
+        i = placed.get(anchor, 0)
+        placed[anchor] = i + 1
+        radius = _RING + _RING_STEP * math.sqrt(i)
+        angle = i * _GOLDEN_ANGLE
+        positions[node] = (
+            origin[0] + radius * math.cos(angle),
+            origin[1] + radius * math.sin(angle),
+        )
+
+    # A node is always folded before its parent, so placing in reverse
+    # order finds every parent already positioned.
+    for leaf, parent in reversed(folded):
+        place(leaf, parent, positions[parent])
+
+    parents: Dict[Any, Any] = {}
+    orphans = []
+    for node in symbols:
+        parent = next(
+            (other for other in undirected[node] if other not in symbol_set),
+            None,
+        )
+        if parent is None:
+            orphans.append(node)
+        else:
+            parents[node] = parent
+            place(node, parent, positions[parent])
+
+    # Symbols linked to no element go on a spiral outside everything else.
+    outer = max((math.hypot(x, y) for x, y in positions.values()), default=0.0)
+    for i, node in enumerate(orphans):
+        radius = outer + _RING + _RING_STEP * math.sqrt(i)
+        angle = i * _GOLDEN_ANGLE
+        positions[node] = (radius * math.cos(angle), radius * math.sin(angle))
+
+    return positions, parents
+
+
+# ------------------------------------------------------------------ access
+def _entries(layout: Layout) -> List[List[Any]]:
+    return [
+        [node, round(x, 1), round(y, 1), layout.parents.get(node)]
+        for node, (x, y) in layout.positions.items()
+    ]
+
+
+def _from_entries(version: int, entries: List[List[Any]]) -> Layout:
+    positions = {node: (x, y) for node, x, y, _ in entries}
+    parents = {
+        node: parent for node, _, _, parent in entries if parent is not None
+    }
+    return Layout(version, positions, parents, dict(Counter(parents.values())))
+
+
+def _covers(layout: Layout, graph: nx.Graph) -> bool:
+    return all(node in layout.positions for node in graph)
+
+
+def get(graph_id: str, gm: Optional[GraphModel] = None) -> Layout:
+    """Return the layout of the current version of ``graph_id``.
+
+    ``gm`` defaults to the cached graph. Raises :class:`KeyError` when the
+    graph does not exist.
+    """
+    if gm is None:
+        gm = graph_store.get(graph_id)
+    with _layouts_lock:
+        entry = _layouts.get(graph_id)
+        if entry is not None and entry[0] is gm:
+            _layouts.move_to_end(graph_id)
+            return entry[1]
+        computing = _computing.setdefault(graph_id, [threading.Lock(), 0])
+        computing[1] += 1
+
+    try:
+        with computing[0]:
+            return _load_or_compute(graph_id, gm)
+    finally:
+        with _layouts_lock:
+            computing[1] -= 1
+            if computing[1] == 0:
+                del _computing[graph_id]
+
+
+def _load_or_compute(graph_id: str, gm: GraphModel) -> Layout:
+    """Body of :func:`get`, run under the graph's compute lock."""
+    with _layouts_lock:
+        entry = _layouts.get(graph_id)
+        if entry is not None and entry[0] is gm:
+            return entry[1]
+
+    with sqlite_conn() as conn:
+        version = graph_store.version(conn, graph_id)
+        stored = layout_store.get(conn, graph_id)
+
+    layout = None
+    if stored is not None and stored[0] == version:
+        layout = _from_entries(*stored)
+        # A concurrent write can leave a row for this version that was
+        # computed from the previous graph.
+        if not _covers(layout, gm.graph):
+            layout = None
+
+    if layout is None:
+        start = time.monotonic()
+        positions, parents = compute(gm.graph)
+        layout = Layout(
+            version, positions, parents, dict(Counter(parents.values()))
+        )
+        with sqlite_conn() as conn:
+            layout_store.put(conn, graph_id, version, _entries(layout))
+        logger.info(
+            f"[graph-layout] {graph_id} v{version}: "
+            f"{len(positions)} nodes in "
+            f"{int((time.monotonic() - start) * 1000)}ms"
+        )
+
+    with _layouts_lock:
+        _layouts[graph_id] = (gm, layout)
+        _layouts.move_to_end(graph_id)
+        while len(_layouts) > max(config.GRAPH_CACHE_MAX_GRAPHS, 0):
+            _layouts.popitem(last=False)
+    return layout
+
+
+def node_attrs(layout: Layout, node: Any) -> Dict[str, Any]:
+    """Return the viewer attributes (``x``/``y``, cluster info) of a node."""
+    attrs: Dict[str, Any] = {}
+    pos = layout.positions.get(node)
+    if pos is not None:
+        attrs["x"], attrs["y"] = round(pos[0], 1), round(pos[1], 1)
+    parent = layout.parents.get(node)
+    if parent is not None:
+        attrs["cluster"] = parent
+    members = layout.members.get(node)
+    if members:
+        attrs["members"] = members
+    return attrs
+
+
+def attach(graph: nx.Graph, layout: Layout) -> None:
+    """Set the viewer attributes of every node of ``graph`` in place."""
+    for node, data in graph.nodes(data=True):
+        data.update(node_attrs(layout, node))
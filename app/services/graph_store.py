@@ -0,0 +1,665 @@
+"""Persistence and process-local caching of document graphs.
+
+Graphs are stored in the ``graph_blobs`` table in the binary format from
+:mod:`app.services.graph_codec`, one row per graph, with symbol nodes keyed
+by their :mod:`~app.services.symbol_table` id. Graphs written before that
+(the ``GraphModel`` tables, or blobs keyed by symbol string) are not served:
+:func:`migrate_legacy` converts them, run as an explicit step with
+``python -m app.maintenance migrate-graphs`` (``make migrate-graphs``).
+
+Writes after the first are appended to ``graph_deltas`` by :func:`save_delta`:
+one compact record per change (added nodes and edges in the same binary
+format, plus removed keys), so persist time follows the size of the change
+rather than the graph. A delta's ``seq`` is the graph version it produced,
+so sequence numbers never repeat, not even after compaction. :func:`load`
+replays the deltas over the base blob in order, and the job daemon calls
+:func:`compact_pending` to fold them back into the base off the request path.
+Writes and compaction take the write lock up front (``BEGIN IMMEDIATE``), so
+a compaction reads, rewrites and trims a graph as one atomic step.
+
+Node ``text`` attributes are not part of the blob. They go to
+:mod:`app.services.text_store`, so decoded graphs carry only topology and
+types; ``load(..., with_text=True)`` re-attaches them for callers that need
+the full graph, and :func:`fetch_texts` serves the few nodes a query returns.
+
+:func:`get` serves the query path from an LRU of decoded graphs bounded by
+``GRAPH_CACHE_MAX_GRAPHS``. Each cached graph remembers the version it was
+loaded at and a hit is only served while the stored graph is still live at
+that version, so writes and tombstones made by other worker processes are
+seen on the next read. Writers in this process also :func:`evict` at once.
+
+Every :func:`save` and :func:`save_delta` bumps the graph's row in
+``graph_versions``; :func:`version` lets derived data (viewer layouts in
+:mod:`app.services.layout_store`) tell whether it is still current.
+Compaction leaves the version alone since it does not change the graph.
+
+Removal is two-phase. :func:`tombstone` is a single insert into
+``graph_tombstones``: from then on the graph is invisible to :func:`load` and
+:func:`get`, and :func:`save` / :func:`save_delta` refuse to write it with
+:class:`GraphRemoved`, so a failed or cancelled job can release its worker
+at once without a late write bringing the graph back. :func:`reclaim` (run
+by the job daemon) deletes the rows afterwards in small, paced transactions
+and drops the tombstone last; the ``graph_versions`` row stays behind, so a
+reclaimed id is still refused and its version never starts over.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from talkingdb.helpers.graph import rollback_graph
+from talkingdb.logger.console import logger
+from talkingdb.models.graph.graph import GraphModel
+
+from app.core import config
+from app.core.sqlite_pool import sqlite_conn
+from app.services import graph_codec, layout_store, text_store
+from app.services.symbol_table import (
+    SYMBOL_IDS_ATTR,
+    mark as mark_symbols,
+    symbol_table,
+)
+
+
+# Delta records carry removals in the encoded graph's ``graph`` attribute.
+_REMOVED_NODES = "removed_nodes"
+_REMOVED_EDGES = "removed_edges"
+
+# graph_id -> (version it was loaded at, graph)
+_cache: "OrderedDict[str, Tuple[int, GraphModel]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class GraphRemoved(KeyError):
+    """Raised when writing a graph that was tombstoned or reclaimed."""
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Create the binary graph, delta, version, tombstone and text tables."""
+    text_store.init_db(conn)
+    layout_store.init_db(conn)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS graph_tombstones (
+            graph_id   TEXT PRIMARY KEY,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS graph_deltas (
+            graph_id TEXT NOT NULL,
+            seq      INTEGER NOT NULL,
+            payload  BLOB NOT NULL,
+            PRIMARY KEY (graph_id, seq)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS graph_versions (
+            graph_id TEXT PRIMARY KEY,
+            version  INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS graph_blobs (
+            graph_id   TEXT PRIMARY KEY,
+            format     INTEGER NOT NULL,
+            node_count INTEGER NOT NULL,
+            edge_count INTEGER NOT NULL,
+            payload    BLOB NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+# ------------------------------------------------------------------- writes
+def _text_items(graph) -> Iterable[Tuple[Any, str]]:
+    return (
+        (node, data["text"])
+        for node, data in graph.nodes(data=True)
+        if isinstance(data.get("text"), str)
+    )
+
+
+def _write_base(conn: sqlite3.Connection, gm: GraphModel) -> int:
+    """Upsert the base blob of ``gm``; return its size in bytes."""
+    payload = graph_codec.encode(gm.graph, with_text=False)
+    conn.execute(
+        """
+        INSERT INTO graph_blobs
+            (graph_id, format, node_count, edge_count, payload, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(graph_id) DO UPDATE SET
+            format = excluded.format,
+            node_count = excluded.node_count,
+            edge_count = excluded.edge_count,
+            payload = excluded.payload,
+            updated_at = excluded.updated_at
+        """,
+        (
+            gm.graph_id,
+            graph_codec.FORMAT_VERSION,
+            gm.graph.number_of_nodes(),
+            gm.graph.number_of_edges(),
+            payload,
+            datetime.now(timezone.utc).isoformat(),
+        ),
+    )
+    return len(payload)
+
+
+def _begin_read(conn: sqlite3.Connection) -> None:
+    """Read the following statements from one snapshot of the database."""
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+
+
+def _begin_write(conn: sqlite3.Connection) -> None:
+    """Take the database write lock now unless the caller's transaction has.
+
+    Otherwise reads made before the first write could come from an older
+    snapshot than the write itself.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def _bump_version(conn: sqlite3.Connection, graph_id: str) -> int:
+    """Advance the version of ``graph_id``; return the new value."""
+    conn.execute(
+        """
+        INSERT INTO graph_versions (graph_id, version) VALUES (?, 1)
+        ON CONFLICT(graph_id) DO UPDATE SET version = version + 1
+        """,
+        (graph_id,),
+    )
+    return version(conn, graph_id)
+
+
+def _check_writable(
+    conn: sqlite3.Connection, graph_id: str, has_base: bool
+) -> None:
+    """Raise :class:`GraphRemoved` if ``graph_id`` was removed.
+
+    A graph without a base but with a version was reclaimed.
+    """
+    if _is_tombstoned(conn, graph_id) or (
+        not has_base and version(conn, graph_id) > 0
+    ):
+        raise GraphRemoved(graph_id)
+
+
+def _has_base(conn: sqlite3.Connection, graph_id: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM graph_blobs WHERE graph_id = ?", (graph_id,)
+    ).fetchone() is not None
+
+
+def save(conn: sqlite3.Connection, gm: GraphModel) -> None:
+    """Persist the full graph of ``gm`` as a new base, dropping its deltas.
+
+    Raises :class:`GraphRemoved` if the graph was tombstoned or reclaimed.
+    """
+    start = time.monotonic()
+    _begin_write(conn)
+    _check_writable(conn, gm.graph_id, _has_base(conn, gm.graph_id))
+    text_store.put_many(conn, gm.graph_id, _text_items(gm.graph))
+    size = _write_base(conn, gm)
+    conn.execute("DELETE FROM graph_deltas WHERE graph_id = ?", (gm.graph_id,))
+    _bump_version(conn, gm.graph_id)
+    evict(gm.graph_id)
+    logger.info(
+        f"[graph-store] saved {gm.graph_id}: {size} bytes in "
+        f"{int((time.monotonic() - start) * 1000)}ms"
+    )
+
+
+def save_delta(
+    conn: sqlite3.Connection,
+    gm: GraphModel,
+    *,
+    nodes: Iterable[Tuple[Any, Dict[str, Any]]] = (),
+    edges: Iterable[Tuple[Any, ...]] = (),
+    removed_nodes: Iterable[Any] = (),
+    removed_edges: Iterable[Tuple[Any, Any]] = (),
+) -> None:
+    """Append one change record for ``gm``.
+
+    ``nodes`` and ``edges`` take the tuples ``add_nodes_from`` /
+    ``add_edges_from`` accept; removals are applied before additions on
+    replay. Falls back to :func:`save` when the graph was never written,
+    and raises :class:`GraphRemoved` if it was tombstoned or reclaimed.
+    """
+    _begin_write(conn)
+    has_base = _has_base(conn, gm.graph_id)
+    _check_writable(conn, gm.graph_id, has_base)
+    if not has_base:
+        save(conn, gm)
+        return
+
+    start = time.monotonic()
+    delta = gm.graph.__class__()
+    delta.add_nodes_from(nodes)
+    delta.add_edges_from(edges)
+    removed = list(removed_nodes)
+    delta.graph[_REMOVED_NODES] = removed
+    delta.graph[_REMOVED_EDGES] = [[u, v] for u, v, *_ in removed_edges]
+
+    if removed:
+        text_store.delete_nodes(conn, gm.graph_id, removed)
+    text_store.put_many(conn, gm.graph_id, _text_items(delta))
+    payload = graph_codec.encode(delta, with_text=False)
+    conn.execute(
+        "INSERT INTO graph_deltas (graph_id, seq, payload) VALUES (?, ?, ?)",
+        (gm.graph_id, _bump_version(conn, gm.graph_id), payload),
+    )
+    evict(gm.graph_id)
+    logger.info(
+        f"[graph-store] delta {gm.graph_id}: {len(payload)} bytes in "
+        f"{int((time.monotonic() - start) * 1000)}ms"
+    )
+
+
+def tombstone(graph_id: Optional[str]) -> None:
+    """Hide a graph immediately; :func:`reclaim` deletes its rows later."""
+    if not graph_id:
+        return
+    with sqlite_conn() as conn:
+        tombstone_many(conn, [graph_id])
+
+
+def tombstone_many(conn: sqlite3.Connection, graph_ids: Iterable[str]) -> None:
+    """Tombstone several graphs inside the caller's transaction."""
+    graph_ids = [graph_id for graph_id in graph_ids if graph_id]
+    if not graph_ids:
+        return
+    with _cache_lock:
+        for graph_id in graph_ids:
+            _cache.pop(graph_id, None)
+    created_at = datetime.now(timezone.utc).isoformat()
+    conn.executemany(
+        "INSERT OR IGNORE INTO graph_tombstones (graph_id, created_at) "
+        "VALUES (?, ?)",
+        ((graph_id, created_at) for graph_id in graph_ids),
+    )
+
+
+def _is_tombstoned(conn: sqlite3.Connection, graph_id: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM graph_tombstones WHERE graph_id = ?", (graph_id,)
+    ).fetchone() is not None
+
+
+def _reclaim_one(graph_id: str, batch_rows: int, deadline: float) -> bool:
+    """Delete one tombstoned graph; return False if the deadline hit first."""
+    pause = max(config.GRAPH_RECLAIM_PAUSE_MS, 0) / 1000
+    while True:
+        with sqlite_conn() as conn:
+            removed = text_store.delete_batch(conn, graph_id, batch_rows)
+        if removed < batch_rows:
+            break
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(pause)
+
+    # The version row stays: it marks the id as reclaimed for writers.
+    with sqlite_conn() as conn:
+        conn.execute("DELETE FROM graph_deltas WHERE graph_id = ?", (graph_id,))
+        conn.execute("DELETE FROM graph_blobs WHERE graph_id = ?", (graph_id,))
+        layout_store.delete(conn, graph_id)
+    rollback_graph(graph_id)
+    with sqlite_conn() as conn:
+        conn.execute(
+            "DELETE FROM graph_tombstones WHERE graph_id = ?", (graph_id,)
+        )
+    return True
+
+
+def reclaim(budget_seconds: float) -> int:
+    """Delete tombstoned graphs within a time budget; return the count."""
+    deadline = time.monotonic() + budget_seconds
+    batch_rows = max(config.GRAPH_RECLAIM_BATCH_ROWS, 1)
+    with sqlite_conn() as conn:
+        graph_ids = [
+            row[0]
+            for row in conn.execute(
+                "SELECT graph_id FROM graph_tombstones ORDER BY created_at"
+            )
+        ]
+
+    done = 0
+    for graph_id in graph_ids:
+        if time.monotonic() >= deadline:
+            break
+        start = time.monotonic()
+        if not _reclaim_one(graph_id, batch_rows, deadline):
+            break
+        done += 1
+        logger.info(
+            f"[graph-store] reclaimed {graph_id} in "
+            f"{int((time.monotonic() - start) * 1000)}ms"
+        )
+    return done
+
+
+def compact(graph_id: str) -> bool:
+    """Fold the deltas of one graph into its base; return whether it did.
+
+    Runs as one write transaction, so no delta can be appended (or the
+    base replaced) between reading the graph and trimming its deltas.
+    """
+    with sqlite_conn() as conn:
+        _begin_write(conn)
+        row = conn.execute(
+            "SELECT payload FROM graph_blobs WHERE graph_id = ?", (graph_id,)
+        ).fetchone()
+        if row is None or _is_tombstoned(conn, graph_id):
+            return False
+        gm = GraphModel.create(graph_id, True)
+        graph_codec.decode_into(row[0], gm.graph)
+        last = _apply_deltas(conn, gm)
+        if not last:
+            return False
+        _write_base(conn, gm)
+        conn.execute(
+            "DELETE FROM graph_deltas WHERE graph_id = ? AND seq <= ?",
+            (graph_id, last),
+        )
+    evict(graph_id)
+    return True
+
+
+def compact_pending(limit: int) -> int:
+    """Compact up to ``limit`` graphs that have deltas; return the count."""
+    with sqlite_conn() as conn:
+        graph_ids = [
+            row[0]
+            for row in conn.execute(
+                """
+                SELECT graph_id FROM graph_deltas
+                WHERE graph_id NOT IN (SELECT graph_id FROM graph_tombstones)
+                GROUP BY graph_id
+                HAVING COUNT(*) >= ?
+                ORDER BY MIN(seq)
+                LIMIT ?
+                """,
+                (max(config.GRAPH_COMPACT_MIN_DELTAS, 1), limit),
+            )
+        ]
+
+    done = 0
+    for graph_id in graph_ids:
+        if compact(graph_id):
+            done += 1
+    return done
+
+
+# -------------------------------------------------------------------- reads
+def load(
+    conn: sqlite3.Connection, graph_id: str, *, with_text: bool = False
+) -> GraphModel:
+    """Load a graph from its base blob and deltas.
+
+    Node ``text`` attributes are only present with ``with_text=True``.
+    Raises :class:`KeyError` when the graph does not exist, is tombstoned or
+    has not been migrated to symbol ids yet (see :func:`migrate_legacy`).
+    """
+    _begin_read(conn)
+    if _is_tombstoned(conn, graph_id):
+        raise KeyError(graph_id)
+    row = conn.execute(
+        "SELECT payload FROM graph_blobs WHERE graph_id = ?", (graph_id,)
+    ).fetchone()
+    if row is None:
+        raise KeyError(graph_id)
+
+    gm = GraphModel.create(graph_id, True)
+    graph_codec.decode_into(row[0], gm.graph)
+    if not gm.graph.graph.get(SYMBOL_IDS_ATTR):
+        logger.warning(
+            f"[graph-store] {graph_id} predates symbol ids; "
+            f"run `make migrate-graphs`"
+        )
+        raise KeyError(graph_id)
+    _apply_deltas(conn, gm)
+    if with_text:
+        _attach_texts(conn, gm)
+    return gm
+
+
+def version(conn: sqlite3.Connection, graph_id: str) -> int:
+    """Return the write counter of ``graph_id`` (0 if never written here)."""
+    row = conn.execute(
+        "SELECT version FROM graph_versions WHERE graph_id = ?", (graph_id,)
+    ).fetchone()
+    return row[0] if row is not None else 0
+
+
+def live_version(conn: sqlite3.Connection, graph_id: str) -> int:
+    """Return :func:`version` of a stored graph.
+
+    Raises :class:`KeyError` when the graph is tombstoned, reclaimed or was
+    never stored, so no validator of it can match.
+    """
+    current = _live_version(conn, graph_id)
+    if current is None:
+        raise KeyError(graph_id)
+    return current
+
+
+def _apply_deltas(conn: sqlite3.Connection, gm: GraphModel) -> int:
+    """Replay stored deltas onto ``gm`` in order; return the last seq."""
+    last = 0
+    graph = gm.graph
+    for seq, payload in conn.execute(
+        "SELECT seq, payload FROM graph_deltas WHERE graph_id = ? ORDER BY seq",
+        (gm.graph_id,),
+    ):
+        delta = graph_codec.decode_into(payload, graph.__class__())
+        graph.remove_edges_from(delta.graph.get(_REMOVED_EDGES, ()))
+        graph.remove_nodes_from(delta.graph.get(_REMOVED_NODES, ()))
+        graph.add_nodes_from(delta.nodes(data=True))
+        if delta.is_multigraph():
+            graph.add_edges_from(delta.edges(keys=True, data=True))
+        else:
+            graph.add_edges_from(delta.edges(data=True))
+        last = seq
+    return last
+
+
+def _attach_texts(conn: sqlite3.Connection, gm: GraphModel) -> None:
+    """Copy stored texts back onto the nodes of ``gm``."""
+    nodes = gm.graph.nodes
+    for node, text in text_store.fetch_graph(conn, gm.graph_id).items():
+        if node in nodes:
+            nodes[node]["text"] = text
+
+
+def _live_version(conn: sqlite3.Connection, graph_id: str) -> Optional[int]:
+    """Return the version of a stored, untombstoned graph, else ``None``."""
+    row = conn.execute(
+        """
+        SELECT COALESCE(v.version, 0)
+        FROM graph_blobs b
+        LEFT JOIN graph_versions v ON v.graph_id = b.graph_id
+        WHERE b.graph_id = ?
+          AND NOT EXISTS (
+              SELECT 1 FROM graph_tombstones t WHERE t.graph_id = b.graph_id
+          )
+        """,
+        (graph_id,),
+    ).fetchone()
+    return row[0] if row is not None else None
+
+
+def get(graph_id: str) -> GraphModel:
+    """Return a cached graph for read-only use, loading it on a miss.
+
+    Raises :class:`KeyError` when the graph does not exist or is tombstoned.
+    """
+    with sqlite_conn() as conn:
+        _begin_read(conn)
+        current = _live_version(conn, graph_id)
+        if current is None:
+            evict(graph_id)
+            raise KeyError(graph_id)
+
+        with _cache_lock:
+            entry = _cache.get(graph_id)
+            if entry is not None and entry[0] == current:
+                _cache.move_to_end(graph_id)
+                return entry[1]
+
+        gm = load(conn, graph_id)
+
+    with _cache_lock:
+        _cache[graph_id] = (current, gm)
+        _cache.move_to_end(graph_id)
+        while len(_cache) > max(config.GRAPH_CACHE_MAX_GRAPHS, 0):
+            _cache.popitem(last=False)
+    return gm
+
+
+def fetch_texts(keys: Iterable[Tuple[str, Any]]) -> Dict[Tuple[str, Any], str]:
+    """Return node texts for ``(graph_id, node_id)`` keys in one read."""
+    with sqlite_conn() as conn:
+        return text_store.fetch(conn, keys)
+
+
+def evict(graph_id: str) -> None:
+    """Drop ``graph_id`` from the process-local cache."""
+    with _cache_lock:
+        _cache.pop(graph_id, None)
+
+
+# ------------------------------------------------------------ maintenance
+def mark_symbol_refs(after: str, deadline: float) -> Optional[str]:
+    """Mark the symbol ids used by stored graphs, in graph id order.
+
+    Starts after graph id ``after`` and stops at ``deadline``; returns the
+    last graph id reached, or ``None`` once every graph is marked. Each
+    graph's base and deltas are read from one snapshot, so a compaction
+    running meanwhile cannot hide ids from the mark.
+    """
+    cursor = after
+    while time.monotonic() < deadline:
+        with sqlite_conn() as conn:
+            row = conn.execute(
+                "SELECT graph_id FROM graph_blobs WHERE graph_id > ? "
+                "ORDER BY graph_id LIMIT 1",
+                (cursor,),
+            ).fetchone()
+            if row is None:
+                return None
+            cursor = row[0]
+            _begin_read(conn)
+            payloads = conn.execute(
+                """
+                SELECT payload FROM graph_blobs WHERE graph_id = ?
+                UNION ALL
+                SELECT payload FROM graph_deltas WHERE graph_id = ?
+                """,
+                (cursor, cursor),
+            ).fetchall()
+            for (payload,) in payloads:
+                mark_symbols(conn, graph_codec.int_keys(payload))
+    return cursor
+
+
+def _legacy_tables() -> List[str]:
+    """Return the tables ``GraphModel`` stores graphs in."""
+    probe = sqlite3.connect(":memory:")
+    try:
+        GraphModel.init_db(probe)
+        return [
+            name
+            for (name,) in probe.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+            if any(
+                column[1] == "graph_id"
+                for column in probe.execute(f'PRAGMA table_info("{name}")')
+            )
+        ]
+    finally:
+        probe.close()
+
+
+def legacy_graph_ids(conn: sqlite3.Connection) -> List[str]:
+    """Return ids of live graphs not yet keyed by symbol id."""
+    found = {
+        graph_id
+        for graph_id, payload in conn.execute(
+            "SELECT graph_id, payload FROM graph_blobs"
+        )
+        if not graph_codec.graph_attrs(payload).get(SYMBOL_IDS_ATTR)
+    }
+    for table in _legacy_tables():
+        found.update(
+            row[0]
+            for row in conn.execute(
+                f'SELECT DISTINCT graph_id FROM "{table}" WHERE graph_id NOT IN '
+                f"(SELECT graph_id FROM graph_blobs)"
+            )
+        )
+    tombstoned = {
+        row[0] for row in conn.execute("SELECT graph_id FROM graph_tombstones")
+    }
+    return sorted(found - tombstoned)
+
+
+def migrate(conn: sqlite3.Connection, graph_id: str) -> bool:
+    """Re-key one legacy graph's symbol nodes to ids and store it as a blob.
+
+    Returns False when there was nothing to migrate.
+    """
+    _begin_write(conn)
+    if _is_tombstoned(conn, graph_id):
+        return False
+    row = conn.execute(
+        "SELECT payload FROM graph_blobs WHERE graph_id = ?", (graph_id,)
+    ).fetchone()
+
+    if row is not None:
+        gm = GraphModel.create(graph_id, True)
+        graph_codec.decode_into(row[0], gm.graph)
+        if gm.graph.graph.get(SYMBOL_IDS_ATTR):
+            return False
+        _apply_deltas(conn, gm)
+        _attach_texts(conn, gm)
+    else:
+        gm = GraphModel.load(conn, graph_id, True)
+        if gm is None:
+            return False
+
+    symbol_table.convert_graph(gm.graph)
+    text_store.delete(conn, graph_id)
+    save(conn, gm)
+    return True
+
+
+def migrate_legacy() -> int:
+    """Migrate every legacy graph, one transaction each; return the count."""
+    with sqlite_conn() as conn:
+        graph_ids = legacy_graph_ids(conn)
+
+    done = 0
+    for number, graph_id in enumerate(graph_ids, start=1):
+        with sqlite_conn() as conn:
+            migrated = migrate(conn, graph_id)
+        if migrated:
+            done += 1
+        logger.info(
+            f"[graph-store] {'migrated' if migrated else 'skipped'} "
+            f"{graph_id} ({number}/{len(graph_ids)})"
+        )
+    return done
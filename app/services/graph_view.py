@@ -0,0 +1,319 @@
+"""Bounded, paged slices of stored graphs for the graph viewer.
+
+The viewer does not receive a large graph whole. :func:`summary` returns the
+file-index tree plus the highest-degree nodes; :func:`ego`, :func:`neighbors`,
+:func:`nodes_by_type` and :func:`search` return further slices on demand.
+Every call is capped by node and edge limits, and list calls page with an
+opaque cursor (``next_cursor`` is ``None`` on the last page).
+
+Slices are cut from the text-free graphs served by :func:`graph_store.get`,
+with a per-graph :class:`_ViewIndex` (type buckets, degree order, display
+labels, a trigram index for :func:`search`,
+:mod:`~app.services.graph_layout` positions) built on first use and
+kept for as long as that cached graph object is current. Every node carries
+its precomputed ``x``/``y``, so the page never has to lay anything out.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import networkx as nx
+from talkingdb.models.graph.graph import GraphModel
+
+from app.core import config
+from app.services import graph_layout, graph_store
+from app.services.symbol_table import symbol_table
+
+
+@dataclass
+class _ViewIndex:
+    by_type: Dict[str, List[Any]]
+    by_degree: List[Any]
+    labels: Dict[Any, str]
+    # "<label>\0<id>", lower-cased, per node; trigrams maps every trigram to
+    # the positions of the keys containing it, in ascending order.
+    search_keys: List[str]
+    search_nodes: List[Any]
+    trigrams: Dict[str, List[int]]
+    edge_types: Dict[str, int]
+    layout: graph_layout.Layout
+
+
+_indexes: "OrderedDict[str, Tuple[GraphModel, _ViewIndex]]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+# ----------------------------------------------------------------- helpers
+def node_kind(data: Dict[str, Any]) -> str:
+    """Return the viewer's type bucket for a node (``index`` wins)."""
+    return str(data.get("index") or data.get("type") or "unknown")
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _build_index(graph: nx.Graph, layout: graph_layout.Layout) -> _ViewIndex:
+    by_degree = sorted(graph.nodes, key=graph.degree, reverse=True)
+    by_type: Dict[str, List[Any]] = {}
+    for node in by_degree:
+        by_type.setdefault(node_kind(graph.nodes[node]), []).append(node)
+
+    labels = {
+        node: str(data.get("label") or node)
+        for node, data in graph.nodes(data=True)
+        if not isinstance(node, int)
+    }
+    labels.update(
+        symbol_table.resolve_many(
+            node for node in graph.nodes if isinstance(node, int)
+        )
+    )
+
+    search_nodes = list(labels)
+    search_keys = [
+        f"{labels[node].lower()}\0{str(node).lower()}" for node in search_nodes
+    ]
+    trigrams: Dict[str, List[int]] = {}
+    for position, key in enumerate(search_keys):
+        for gram in _trigrams(key):
+            trigrams.setdefault(gram, []).append(position)
+
+    edge_types: Dict[str, int] = {}
+    for _, _, kind in graph.edges(data="type", default="unknown"):
+        edge_types[kind] = edge_types.get(kind, 0) + 1
+
+    return _ViewIndex(
+        by_type=by_type,
+        by_degree=by_degree,
+        labels=labels,
+        search_keys=search_keys,
+        search_nodes=search_nodes,
+        trigrams=trigrams,
+        edge_types=edge_types,
+        layout=layout,
+    )
+
+
+def _view(graph_id: str) -> Tuple[nx.Graph, _ViewIndex]:
+    """Return the cached graph and its view index; KeyError if missing."""
+    gm = graph_store.get(graph_id)
+    with _indexes_lock:
+        entry = _indexes.get(graph_id)
+        if entry is not None and entry[0] is gm:
+            _indexes.move_to_end(graph_id)
+            return gm.graph, entry[1]
+
+    index = _build_index(gm.graph, graph_layout.get(graph_id, gm))
+    with _indexes_lock:
+        _indexes[graph_id] = (gm, index)
+        _indexes.move_to_end(graph_id)
+        while len(_indexes) > max(config.GRAPH_CACHE_MAX_GRAPHS, 0):
+            _indexes.popitem(last=False)
+    return gm.graph, index
+
+
+def node_key(graph_id: str, raw: str) -> Any:
+    """Map a node id from a URL to the graph's key (symbol ids are ints)."""
+    graph, _ = _view(graph_id)
+    if raw in graph:
+        return raw
+    if raw.lstrip("-").isdigit() and int(raw) in graph:
+        return int(raw)
+    raise KeyError(raw)
+
+
+def _offset(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    if not cursor.isdigit():
+        raise ValueError(f"invalid cursor: {cursor!r}")
+    return int(cursor)
+
+
+def _page(items: Iterable[Any], cursor: Optional[str], limit: int):
+    """Return ``(items, next_cursor)`` for one page of ``items``."""
+    start = _offset(cursor)
+    chunk = list(islice(items, start, start + limit + 1))
+    more = len(chunk) > limit
+    return chunk[:limit], str(start + limit) if more else None
+
+
+def _node_json(
+    graph: nx.Graph, index: _ViewIndex, node: Any
+) -> Dict[str, Any]:
+    data = {k: v for k, v in graph.nodes[node].items() if k != "text"}
+    data["id"] = node
+    data["label"] = index.labels.get(node, str(node))
+    data["degree"] = graph.degree(node)
+    data.update(graph_layout.node_attrs(index.layout, node))
+    return data
+
+
+def _edges_among(
+    graph: nx.Graph, nodes: Set[Any], limit: int
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Return edges with both ends in ``nodes``, capped at ``limit``."""
+    edges: List[Dict[str, Any]] = []
+    for u, v, data in graph.edges(nodes, data=True):
+        if v not in nodes:
+            continue
+        if len(edges) >= limit:
+            return edges, True
+        edges.append({**data, "source": u, "target": v})
+    return edges, False
+
+
+def _incident_edges(
+    graph: nx.Graph, node: Any
+) -> Iterable[Tuple[Any, Any, Dict[str, Any]]]:
+    if graph.is_directed():
+        return chain(
+            graph.out_edges(node, data=True), graph.in_edges(node, data=True)
+        )
+    return graph.edges(node, data=True)
+
+
+def _slice(
+    graph: nx.Graph,
+    index: _ViewIndex,
+    nodes: List[Any],
+    edge_limit: int,
+    **extra: Any,
+) -> Dict[str, Any]:
+    edges, edges_truncated = _edges_among(graph, set(nodes), edge_limit)
+    return {
+        "nodes": [_node_json(graph, index, n) for n in nodes],
+        "links": edges,
+        "edges_truncated": edges_truncated,
+        **extra,
+    }
+
+
+# ------------------------------------------------------------------- views
+def summary(graph_id: str, node_limit: int, edge_limit: int) -> Dict[str, Any]:
+    """Return the file-index tree plus top-degree nodes, and type counts."""
+    graph, index = _view(graph_id)
+
+    chosen: Dict[Any, None] = {}
+    tree = [n for n, data in graph.nodes(data=True) if data.get("index")]
+    for node in tree[:node_limit]:
+        chosen[node] = None
+    for node in index.by_degree:
+        if len(chosen) >= node_limit:
+            break
+        chosen.setdefault(node, None)
+
+    return _slice(
+        graph,
+        index,
+        list(chosen),
+        edge_limit,
+        graph_id=graph_id,
+        layout=True,
+        total_nodes=graph.number_of_nodes(),
+        total_edges=graph.number_of_edges(),
+        types={kind: len(nodes) for kind, nodes in index.by_type.items()},
+        edge_types=dict(index.edge_types),
+    )
+
+
+def ego(
+    graph_id: str, node: Any, radius: int, node_limit: int, edge_limit: int
+) -> Dict[str, Any]:
+    """Return nodes within ``radius`` hops of ``node``, nearest first."""
+    graph, index = _view(graph_id)
+
+    seen: Dict[Any, None] = {node: None}
+    frontier = [node]
+    truncated = False
+    for _ in range(max(radius, 0)):
+        nxt = []
+        for current in frontier:
+            for other in nx.all_neighbors(graph, current):
+                if other in seen:
+                    continue
+                if len(seen) >= node_limit:
+                    truncated = True
+                    break
+                seen[other] = None
+                nxt.append(other)
+            if truncated:
+                break
+        if truncated or not nxt:
+            break
+        frontier = nxt
+
+    return _slice(
+        graph, index, list(seen), edge_limit, center=node, truncated=truncated
+    )
+
+
+def neighbors(
+    graph_id: str, node: Any, cursor: Optional[str], limit: int
+) -> Dict[str, Any]:
+    """Return one page of ``node``'s neighbors and the edges to them."""
+    graph, index = _view(graph_id)
+    page, next_cursor = _page(
+        dict.fromkeys(nx.all_neighbors(graph, node)), cursor, limit
+    )
+    members = set(page)
+    edges = [
+        {**data, "source": u, "target": v}
+        for u, v, data in _incident_edges(graph, node)
+        if (v if u == node else u) in members
+    ]
+    return {
+        "center": node,
+        "nodes": [_node_json(graph, index, n) for n in page],
+        "links": edges,
+        "next_cursor": next_cursor,
+    }
+
+
+def nodes_by_type(
+    graph_id: str, kind: str, cursor: Optional[str], limit: int
+) -> Dict[str, Any]:
+    """Return one page of nodes of one viewer type, highest degree first."""
+    graph, index = _view(graph_id)
+    bucket = index.by_type.get(kind, [])
+    page, next_cursor = _page(bucket, cursor, limit)
+    return {
+        "type": kind,
+        "total": len(bucket),
+        "nodes": [_node_json(graph, index, n) for n in page],
+        "next_cursor": next_cursor,
+    }
+
+
+def search(
+    graph_id: str, query: str, cursor: Optional[str], limit: int
+) -> Dict[str, Any]:
+    """Return one page of nodes whose label or id contains ``query``.
+
+    Queries of three or more characters only check the keys holding the
+    query's rarest trigram. Shorter ones scan the keys, stopping as soon as
+    the page is full.
+    """
+    graph, index = _view(graph_id)
+    needle = query.strip().lower()
+    positions: Iterable[int] = ()
+    if len(needle) >= 3:
+        postings = [index.trigrams.get(gram) for gram in _trigrams(needle)]
+        if all(postings):
+            positions = min(postings, key=len)
+    elif needle:
+        positions = range(len(index.search_keys))
+    matches = (
+        index.search_nodes[position] for position in positions
+        if needle in index.search_keys[position]
+    )
+    page, next_cursor = _page(matches, cursor, limit)
+    return {
+        "query": query,
+        "nodes": [_node_json(graph, index, n) for n in page],
+        "next_cursor": next_cursor,
+    }
@@ -22,15 +22,38 @@ from talkingdb.models.document.indexes.index import (
 from talkingdb.models.graph.graph import GraphModel
 from app.services.package_text_tokenizer import TextTokenizer
 from app.services.package_symbol_generator import SymbolGenerator
-from talkingdb.clients.sqlite import sqlite_conn
+from app.core import config
+from app.core.sqlite_pool import sqlite_conn
+from app.services import graph_store
+from app.services.lexicon import lexicon
+from app.services.token_cache import token_cache
+from app.services.symbol_table import (
+    SYMBOL_IDS_ATTR,
+    is_symbol_node,
+    symbol_table,
+)
 from talkingdb.logger.console import logger
 
 
+# Attribute dicts shared by every symbol node and ``contains`` edge; networkx
+# copies them into the graph, so one dict per type is enough.
+_CONTAINS = {"type": "contains"}
+_SYMBOL_ATTRS: Dict[str, Dict[str, str]] = {}
+
+
+def _symbol_attrs(symbol_type: str) -> Dict[str, str]:
+    attrs = _SYMBOL_ATTRS.get(symbol_type)
+    if attrs is None:
+        attrs = _SYMBOL_ATTRS.setdefault(symbol_type, {"type": symbol_type})
+    return attrs
+
+
 class IndexerService:
     def __init__(self, max_workers: int | None = None):
         self.gm = GraphModel.create(GraphModel.make_id(uuid4().hex), True)
-        self.tokenizer = TextTokenizer()
-        self.symbol_generator = SymbolGenerator()
+        self.gm.graph.graph[SYMBOL_IDS_ATTR] = True
+        self.tokenizer = TextTokenizer(learn=True, cache=True)
+        self.symbol_generator = SymbolGenerator(config.SYMBOL_NGRAM_ORDERS)
         self.max_workers = max_workers or (os.cpu_count() * 2)
 
     def graph_file_index(self, file_index: FileIndexModel) -> GraphModel:
@@ -59,7 +82,7 @@ class IndexerService:
             walk(top_node, file_index.id)
 
         with sqlite_conn() as conn:
-            self.gm.save(conn)
+            graph_store.save(conn, self.gm)
 
         return self.gm
 
@@ -82,7 +105,9 @@ class IndexerService:
             )
 
             header_tokens = self.tokenizer.tokenize(header_text, False)
-            header_symbols = self.symbol_generator.generate(header_tokens)
+            header_symbols = list(
+                self.symbol_generator.iter_symbols(header_tokens)
+            )
             key_id = self.symbol_generator.max_gram(header_tokens)
 
             header_cache[col_idx] = {
@@ -139,10 +164,9 @@ class IndexerService:
 
             edges.append((node_id, header_text, {"type": "part_of"}))
 
-            for symbol_type, symbol_list in header_symbols.items():
-                for symbol in symbol_list:
-                    nodes.append((symbol, {"type": symbol_type}))
-                    edges.append((header_text, symbol, {"type": "contains"}))
+            for symbol_type, symbol in header_symbols:
+                nodes.append((symbol, _symbol_attrs(symbol_type)))
+                edges.append((header_text, symbol, _CONTAINS))
 
             # CELL
             cell_text = cell.to_text()
@@ -150,12 +174,12 @@ class IndexerService:
                 continue
 
             cell_tokens = self.tokenizer.tokenize(cell_text)
-            cell_symbols = self.symbol_generator.generate(cell_tokens)
 
-            for symbol_type, symbol_list in cell_symbols.items():
-                for symbol in symbol_list:
-                    nodes.append((symbol, {"type": symbol_type}))
-                    edges.append((header_text, symbol, {"type": "contains"}))
+            for symbol_type, symbol in self.symbol_generator.iter_symbols(
+                cell_tokens
+            ):
+                nodes.append((symbol, _symbol_attrs(symbol_type)))
+                edges.append((header_text, symbol, _CONTAINS))
 
             # KEY VALUE
             val_tokens = self.tokenizer.tokenize(cell_text, False)
@@ -185,7 +209,6 @@ class IndexerService:
             text = element.to_text()
 
             tokens = self.tokenizer.tokenize(text)
-            symbols = self.symbol_generator.generate(tokens)
 
             heading_path = document._get_heading_path(element)
 
@@ -206,10 +229,11 @@ class IndexerService:
                 )
             )
 
-            for symbol_type, symbol_list in symbols.items():
-                for symbol in symbol_list:
-                    nodes.append((symbol, {"type": symbol_type}))
-                    edges.append((node_id, symbol, {"type": "contains"}))
+            for symbol_type, symbol in self.symbol_generator.iter_symbols(
+                tokens
+            ):
+                nodes.append((symbol, _symbol_attrs(symbol_type)))
+                edges.append((node_id, symbol, _CONTAINS))
 
             for line in text.splitlines():
                 line = line.strip()
@@ -384,6 +408,14 @@ class IndexerService:
 
         insert_start = time.time()
 
+        # Symbol nodes are keyed by their global id, not their string.
+        ids = symbol_table.intern_many(
+            node for node, data in all_nodes if is_symbol_node(data)
+        )
+        all_nodes = [(ids.get(node, node), data) for node, data in all_nodes]
+        all_edges = [
+            (ids.get(u, u), ids.get(v, v), data) for u, v, data in all_edges
+        ]
         self.gm.graph.add_nodes_from(all_nodes)
         self.gm.graph.add_edges_from(all_edges)
 
@@ -392,8 +424,14 @@ class IndexerService:
             f"{round(time.time() - insert_start, 2)}s"
         )
 
+        lexicon.flush()
+        token_cache.flush()
+
+        # The file-index graph is already stored; append only what changed.
         with sqlite_conn() as conn:
-            self.gm.save(conn)
+            graph_store.save_delta(
+                conn, self.gm, nodes=all_nodes, edges=all_edges
+            )
 
         total_time = round(time.time() - start_time, 2)
         logger.info(f"Indexing completed in {total_time}s")
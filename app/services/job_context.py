@@ -8,7 +8,8 @@ work. Each call does three things:
   2. Checks elapsed wall-clock - raises :class:`JobTimeout` past
      ``MAX_JOB_DURATION_SECONDS``.
   3. Writes a best-effort progress + heartbeat row (rate-limited to
-     ``HEARTBEAT_MIN_GAP_SECONDS`` so we don't hammer SQLite).
+     ``HEARTBEAT_MIN_GAP_SECONDS`` so we don't hammer SQLite) and publishes
+     the new status to :mod:`app.services.job_events` watchers.
 
 Progress writes are deliberately best-effort: a dropped checkpoint due to
 write contention or a guarded UPDATE (state already terminal) never affects
@@ -20,12 +21,13 @@ import time
 from dataclasses import dataclass, field
 from typing import Any, Dict, Optional
 
-from talkingdb.clients.sqlite import sqlite_conn
 from talkingdb.logger.console import logger
 from talkingdb.helpers.job import store as job_store
 from talkingdb.models.job.stage import JobStage
 
 from app.core import config
+from app.core.sqlite_pool import sqlite_conn
+from app.services import job_events
 
 
 class JobControl(Exception):
@@ -74,6 +76,14 @@ class JobContext:
             logger.warning(
                 f"[job {self.job_id}] progress write dropped: {exc}"
             )
+            return
+        job_events.publish_progress(
+            self.job_id,
+            stage=kwargs.get("stage"),
+            done_units=kwargs.get("done_units"),
+            total_units=kwargs.get("total_units"),
+            status_message=kwargs.get("status_message"),
+        )
 
     # -------------------------------------------------- public checkpoint API
     def set_stage(
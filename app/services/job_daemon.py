@@ -1,7 +1,7 @@
 """Lifecycle daemon for ingestion jobs.
 
 One background thread (started from the FastAPI lifespan) ticks every
-``DAEMON_INTERVAL_SECONDS`` and performs four idempotent passes:
+``DAEMON_INTERVAL_SECONDS`` and performs eight idempotent passes:
 
   1. Orphan sweep   - jobs whose worker died (no heartbeat past
                       ``STALE_THRESHOLD_SECONDS``) are finalized as
@@ -12,10 +12,30 @@ One background thread (started from the FastAPI lifespan) ticks every
                       fire (e.g. wedged inside the parser).
   3. Retention      - terminal jobs older than their per-state retention
                       window are hard-deleted (and any leftover temp file
-                      is unlinked).
+                      is unlinked) in ``RETENTION_BATCH_SIZE`` chunks, one
+                      transaction each, within ``RETENTION_BUDGET_SECONDS``.
+                      The partial result graphs of failed and cancelled
+                      jobs are tombstoned for pass 6; a completed job's
+                      graph is the indexed document and outlives its row.
+                      Expired rows are read one batch at a time in job id
+                      order, resuming after the last id reached.
   4. Temp-file GC   - spooled files that no row references are unlinked,
                       with a generous freshness grace so an in-flight submit
-                      is never targeted.
+                      is never targeted. The scan walks the spool in name
+                      order within ``TEMP_GC_BUDGET_SECONDS`` and resumes
+                      after the last name it reached.
+  5. Graph compaction - graph delta logs are folded into their base blob,
+                      ``GRAPH_COMPACT_BATCH`` graphs per tick.
+  6. Graph reclaim    - graphs tombstoned by failed / cancelled jobs are
+                      deleted in paced batches within
+                      ``GRAPH_RECLAIM_BUDGET_SECONDS``.
+  7. Symbol GC      - once graphs were reclaimed, and at most every
+                      ``SYMBOL_GC_INTERVAL_SECONDS``, symbols no stored
+                      graph uses are deleted. Marking the ids in use reads
+                      every graph within ``SYMBOL_GC_BUDGET_SECONDS`` per
+                      tick and resumes after the last graph id it reached.
+  8. Vacuum         - up to ``SQLITE_INCREMENTAL_VACUUM_PAGES`` free pages
+                      are returned to the filesystem.
 
 Every transition goes through :func:`jobs.finalize_externally`, which routes
 into the same state-guarded ``_finalize`` the worker uses, so the daemon and
@@ -23,10 +43,13 @@ a finishing worker can never both succeed on the same job.
 """
 
 import os
+import sqlite3
+import stat
 import threading
+import time
 from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
 
-from talkingdb.clients.sqlite import sqlite_conn
 from talkingdb.helpers import spool
 from talkingdb.logger.console import logger
 from talkingdb.helpers.job import store as job_store
@@ -34,7 +57,8 @@ from talkingdb.models.job.error import JobErrorCode
 from talkingdb.models.job.state import JobState
 
 from app.core import config
-from app.services import jobs
+from app.core.sqlite_pool import incremental_vacuum, sqlite_conn
+from app.services import graph_store, job_groups, jobs, symbol_table
 
 
 _TEMP_FILE_GRACE_SECONDS = 10 * 60
@@ -43,6 +67,19 @@ _TEMP_FILE_GRACE_SECONDS = 10 * 60
 _stop = threading.Event()
 _thread: threading.Thread | None = None
 
+# The last expired job id the retention pass reached, and the last spool
+# entry name the temp-file scan reached. Both carry work over between ticks.
+_retention_cursor = ""
+_gc_cursor = ""
+
+# Symbol GC: graphs reclaimed since the last sweep, when that sweep ended
+# (monotonic), when the running mark started (wall clock, None if no mark is
+# running) and the last graph id it reached.
+_reclaimed_since_sweep = 0
+_symbols_swept_at: Optional[float] = None
+_symbol_mark_started: Optional[float] = None
+_symbol_cursor = ""
+
 
 # ----------------------------------------------------------------- helpers
 def _now_utc() -> datetime:
@@ -103,63 +140,176 @@ def _sweep_timeouts(now: datetime) -> None:
         )
 
 
-def _purge_retention(now: datetime) -> None:
-    """Delete terminal job rows that are past their retention window."""
-    completed_before = _iso(
-        now - timedelta(seconds=config.RETENTION_COMPLETED_SECONDS)
-    )
+def _select_expired_page(
+    conn: sqlite3.Connection,
+    cutoffs: Tuple[Tuple[str, str], ...],
+    after: str,
+    limit: int,
+) -> List[Tuple[str, str, Optional[str], Optional[str]]]:
+    """Return up to ``limit`` expired jobs with an id after ``after``.
+
+    ``cutoffs`` pairs each terminal state with the completion time before
+    which its jobs expire. Rows are ``(job_id, state, temp_path,
+    result_graph_id)`` in id order, so the caller pages with the last id.
+    """
+    expired = " OR ".join("(state = ? AND completed_at < ?)" for _ in cutoffs)
+    return conn.execute(
+        f"""
+        SELECT job_id, state, temp_path, result_graph_id
+        FROM jobs
+        WHERE ({expired}) AND job_id > ?
+        ORDER BY job_id
+        LIMIT ?
+        """,
+        [value for cutoff in cutoffs for value in cutoff] + [after, limit],
+    ).fetchall()
 
-    failed_before = _iso(
-        now - timedelta(seconds=config.RETENTION_FAILED_SECONDS)
-    )
 
-    cancelled_before = _iso(
-        now - timedelta(seconds=config.RETENTION_CANCELLED_SECONDS)
+def _purge_retention(now: datetime) -> None:
+    """Delete terminal job rows that are past their retention window."""
+    global _retention_cursor
+
+    deadline = time.monotonic() + config.RETENTION_BUDGET_SECONDS
+    cutoffs = tuple(
+        (state.value, _iso(now - timedelta(seconds=seconds)))
+        for state, seconds in (
+            (JobState.COMPLETED, config.RETENTION_COMPLETED_SECONDS),
+            (JobState.FAILED, config.RETENTION_FAILED_SECONDS),
+            (JobState.CANCELLED, config.RETENTION_CANCELLED_SECONDS),
+        )
     )
 
-    with sqlite_conn() as conn:
-        expired = job_store.select_retention_expired(
-            conn,
-            completed_before_iso=completed_before,
-            failed_before_iso=failed_before,
-            cancelled_before_iso=cancelled_before,
-        )
+    batch_size = max(config.RETENTION_BATCH_SIZE, 1)
+    purged = 0
+    while not _stop.is_set() and time.monotonic() < deadline:
+        with sqlite_conn() as conn:
+            chunk = _select_expired_page(
+                conn, cutoffs, _retention_cursor, batch_size
+            )
+        if not chunk:
+            _retention_cursor = ""
+            break
+        _retention_cursor = chunk[-1][0]
 
-    for job in expired:
-        spool.discard(job.temp_path)
+        for _, _, temp_path, _ in chunk:
+            spool.discard(temp_path)
 
         with sqlite_conn() as conn:
-            job_store.delete(conn, job.job_id)
+            for job_id, _, _, _ in chunk:
+                job_store.delete(conn, job_id)
+            job_groups.forget_jobs(conn, (job_id for job_id, _, _, _ in chunk))
+            graph_store.tombstone_many(
+                conn,
+                (
+                    graph_id
+                    for _, state, _, graph_id in chunk
+                    if state != JobState.COMPLETED.value
+                ),
+            )
+        purged += len(chunk)
+
+    if purged:
+        logger.info(f"[daemon] retention purged {purged} jobs")
 
 
 def _gc_orphan_temp_files(now: datetime) -> None:
     """Delete unreferenced temp files."""
+    global _gc_cursor
+
     if not os.path.isdir(spool.SPOOL_DIR):
         return
 
+    deadline = time.monotonic() + config.TEMP_GC_BUDGET_SECONDS
+
     with sqlite_conn() as conn:
         referenced = job_store.select_referenced_temp_paths(conn)
 
-    grace = now - timedelta(seconds=_TEMP_FILE_GRACE_SECONDS)
+    grace = (now - timedelta(seconds=_TEMP_FILE_GRACE_SECONDS)).timestamp()
 
-    for entry in os.scandir(spool.SPOOL_DIR):
-        if not entry.is_file():
-            continue
+    names = sorted(
+        name for name in os.listdir(spool.SPOOL_DIR) if name > _gc_cursor
+    )
+    for name in names:
+        if time.monotonic() >= deadline or _stop.is_set():
+            return
+        _gc_cursor = name
 
-        if entry.path in referenced:
+        path = os.path.join(spool.SPOOL_DIR, name)
+        if path in referenced:
             continue
 
         try:
-            mtime = datetime.fromtimestamp(
-                entry.stat().st_mtime, tz=timezone.utc
-            )
+            st = os.stat(path)
         except FileNotFoundError:
             continue
 
-        if mtime > grace:
+        if not stat.S_ISREG(st.st_mode) or st.st_mtime > grace:
             continue
 
-        spool.discard(entry.path)
+        spool.discard(path)
+
+    # Full pass done; start from the top next tick.
+    _gc_cursor = ""
+
+
+def _compact_graphs() -> None:
+    """Fold pending graph deltas into their base snapshots."""
+    done = graph_store.compact_pending(config.GRAPH_COMPACT_BATCH)
+    if done:
+        logger.info(f"[daemon] compacted {done} graphs")
+
+
+def _reclaim_graphs() -> None:
+    """Delete the rows of tombstoned graphs."""
+    global _reclaimed_since_sweep
+
+    done = graph_store.reclaim(config.GRAPH_RECLAIM_BUDGET_SECONDS)
+    if done:
+        _reclaimed_since_sweep += done
+        logger.info(f"[daemon] reclaimed {done} graphs")
+
+
+def _collect_symbols() -> None:
+    """Delete symbols that no stored graph references any more."""
+    global _reclaimed_since_sweep, _symbols_swept_at
+    global _symbol_mark_started, _symbol_cursor
+
+    if config.SYMBOL_GC_INTERVAL_SECONDS <= 0:
+        return
+
+    with sqlite_conn() as conn:
+        if _symbol_mark_started is None or not symbol_table.is_marking(conn):
+            due = (
+                _symbols_swept_at is None
+                or time.monotonic() - _symbols_swept_at
+                >= config.SYMBOL_GC_INTERVAL_SECONDS
+            )
+            if not (_reclaimed_since_sweep and due):
+                _symbol_mark_started = None
+                return
+            symbol_table.begin_mark(conn)
+            _symbol_mark_started = time.time()
+            _symbol_cursor = ""
+
+    deadline = time.monotonic() + config.SYMBOL_GC_BUDGET_SECONDS
+    cursor = graph_store.mark_symbol_refs(_symbol_cursor, deadline)
+    if cursor is not None:
+        _symbol_cursor = cursor
+        return
+
+    removed = symbol_table.sweep(
+        _symbol_mark_started, max(config.GRAPH_RECLAIM_BATCH_ROWS, 1)
+    )
+    _symbol_mark_started = None
+    _reclaimed_since_sweep = 0
+    _symbols_swept_at = time.monotonic()
+    logger.info(f"[daemon] symbol GC removed {removed} symbols")
+
+
+def _vacuum() -> None:
+    """Give free database pages back to the filesystem."""
+    if config.SQLITE_INCREMENTAL_VACUUM_PAGES > 0:
+        incremental_vacuum(config.SQLITE_INCREMENTAL_VACUUM_PAGES)
 
 
 def tick() -> None:
@@ -170,6 +320,10 @@ def tick() -> None:
     _sweep_timeouts(now)
     _purge_retention(now)
     _gc_orphan_temp_files(now)
+    _compact_graphs()
+    _reclaim_graphs()
+    _collect_symbols()
+    _vacuum()
 
 
 # ------------------------------------------------------------------- loop
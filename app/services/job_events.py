@@ -0,0 +1,316 @@
+"""Process-local job status notifications.
+
+Every write this process makes to a job row (``JobContext`` stage changes and
+heartbeats, the ONGOING transition, ``_finalize``, ``cancel_job``) is followed
+by :func:`publish_job` with the row just written; progress writes, which
+change only the stage, percent and message, go through
+:func:`publish_progress` and reuse the payload already held instead of reading
+the row back. Each watched or locally running job has one :class:`_Channel`
+holding the latest status payload and its ETag; SSE streams and long-polls
+await the channel instead of reading SQLite, and any number of watchers of
+one job share it.
+
+Jobs this process is not running never publish here. For those, the first
+watcher whose wait runs out refreshes the channel from SQLite, at most once
+per ``JOB_EVENTS_POLL_SECONDS`` per job, and the result fans out to every
+watcher.
+
+The same channels double as a write-through status cache for plain
+``GET /v1/jobs/{job_id}`` (:func:`cached`). A job this process runs is served
+from memory while its last publish is younger than
+``JOB_STATUS_CACHE_MAX_AGE_SECONDS``; heartbeats keep that true for any
+healthy job, and the bound covers writes made elsewhere, such as a cancel
+request handled by another process. Terminal payloads never change, so they
+are kept (up to ``JOB_STATUS_CACHE_MAX_ENTRIES`` jobs) and served to anyone,
+and a later non-terminal publish can never replace them. Anything else falls
+back to SQLite.
+
+An ETag is a digest of the payload it was sent with (:func:`etag`), so a
+token is valid in every worker process and outlives the channel it came from:
+a watcher whose token matches the current status waits, any other token
+yields the current status at once.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from talkingdb.helpers.job import store as job_store
+from talkingdb.models.job.job import JobModel
+from talkingdb.models.job.stage import JobStage
+
+from app.core import config
+from app.core.sqlite_pool import sqlite_conn
+from app.model.jobs import JobStatusResponse
+
+
+TERMINAL_STATES = frozenset({"COMPLETED", "FAILED", "CANCELLED"})
+
+
+@dataclass
+class _Channel:
+    tag: Optional[str] = None
+    payload: Optional[Dict[str, Any]] = None
+    polled_at: float = 0.0
+    updated_at: float = 0.0
+    watchers: int = 0
+    waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = field(
+        default_factory=list
+    )
+
+
+_lock = threading.Lock()
+_channels: Dict[str, _Channel] = {}
+_owned: Set[str] = set()
+
+# job_id -> (etag, payload) of terminal jobs, most recently used last.
+_terminal: "OrderedDict[str, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+
+
+# ----------------------------------------------------------------- helpers
+def is_terminal(payload: Dict[str, Any]) -> bool:
+    """Return whether a status payload describes a terminal state."""
+    return payload.get("state") in TERMINAL_STATES
+
+
+def etag(payload: Dict[str, Any]) -> str:
+    """Return the opaque token clients echo back for ``payload``."""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.blake2b(body.encode(), digest_size=12).hexdigest() + '"'
+
+
+def parse_etag(value: Optional[str]) -> Optional[str]:
+    """Return a client's ``If-None-Match`` / ``Last-Event-ID`` as a token."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    return value or None
+
+
+def status_payload(job: JobModel) -> Dict[str, Any]:
+    """Return the public status payload of ``job`` as plain JSON types."""
+    return JobStatusResponse(**job.to_status_payload()).model_dump(mode="json")
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def _channel(job_id: str) -> _Channel:
+    """Return the channel of ``job_id``, creating it; lock held."""
+    channel = _channels.get(job_id)
+    if channel is None:
+        channel = _Channel()
+        done = _terminal.get(job_id)
+        if done is not None:
+            channel.tag, channel.payload = done
+        _channels[job_id] = channel
+    return channel
+
+
+def _remember_terminal(job_id: str, tag: str, payload: Dict[str, Any]) -> None:
+    """Keep a terminal status in the bounded LRU; lock held."""
+    _terminal[job_id] = (tag, payload)
+    _terminal.move_to_end(job_id)
+    while len(_terminal) > max(config.JOB_STATUS_CACHE_MAX_ENTRIES, 0):
+        _terminal.popitem(last=False)
+
+
+def _discard_if_idle(job_id: str, channel: _Channel) -> None:
+    """Drop a channel nobody needs any more; lock held."""
+    if channel.watchers == 0 and job_id not in _owned:
+        if _channels.get(job_id) is channel:
+            del _channels[job_id]
+
+
+# --------------------------------------------------------------- ownership
+def claim(job_id: str) -> None:
+    """Mark ``job_id`` as run by this process, so it publishes here."""
+    with _lock:
+        _owned.add(job_id)
+        _channel(job_id)
+
+
+def release(job_id: str) -> None:
+    """Forget ownership of ``job_id`` once it is terminal."""
+    with _lock:
+        _owned.discard(job_id)
+        channel = _channels.get(job_id)
+        if channel is not None:
+            _discard_if_idle(job_id, channel)
+
+
+# -------------------------------------------------------------- publishing
+def _record(job_id: str, payload: Dict[str, Any]) -> List[Any]:
+    """Store ``payload`` as the status of ``job_id``; lock held.
+
+    Returns the waiters to wake. Terminal payloads are final: later
+    non-terminal ones (a heartbeat that raced the terminal write) are ignored.
+    """
+    channel = _channels.get(job_id)
+    if channel is None:
+        if is_terminal(payload) and job_id not in _terminal:
+            _remember_terminal(job_id, etag(payload), payload)
+        return []
+    channel.updated_at = time.monotonic()
+    current = channel.payload
+    if current is not None and (is_terminal(current) or current == payload):
+        return []
+    channel.tag = etag(payload)
+    channel.payload = payload
+    if is_terminal(payload):
+        _remember_terminal(job_id, channel.tag, payload)
+    waiters, channel.waiters = channel.waiters, []
+    return waiters
+
+
+def _notify(waiters: List[Any]) -> None:
+    for loop, future in waiters:
+        try:
+            loop.call_soon_threadsafe(_wake, future)
+        except RuntimeError:
+            # The watcher's loop is closed; nobody is waiting any more.
+            pass
+
+
+def publish(job_id: str, payload: Dict[str, Any]) -> None:
+    """Record a new status for ``job_id`` and wake its watchers."""
+    with _lock:
+        waiters = _record(job_id, payload)
+    _notify(waiters)
+
+
+def publish_progress(
+    job_id: str,
+    *,
+    stage: Optional[JobStage] = None,
+    done_units: Optional[int] = None,
+    total_units: Optional[int] = None,
+    status_message: Optional[str] = None,
+) -> None:
+    """Publish a progress write of a job this process runs.
+
+    The new status is the latest payload held for ``job_id`` with the
+    written fields applied, so a heartbeat costs no read. Does nothing when
+    no payload is held (the job is not owned here) or it is terminal. A
+    cancel request handled by another process shows up once the job's next
+    checkpoint sees it.
+    """
+    with _lock:
+        channel = _channels.get(job_id)
+        current = channel.payload if channel is not None else None
+        if current is None or is_terminal(current):
+            return
+        payload = dict(current)
+        if stage is not None:
+            payload["stage"] = stage.value
+        if status_message is not None:
+            payload["status_message"] = status_message
+        if done_units is not None and total_units:
+            payload["progress"] = min(done_units * 100 // total_units, 100)
+        waiters = _record(job_id, payload)
+    _notify(waiters)
+
+
+def publish_job(job: Optional[JobModel]) -> None:
+    """Publish the status of a job row just written or read."""
+    if job is not None:
+        publish(job.job_id, status_payload(job))
+
+
+def refresh(job_id: str) -> bool:
+    """Publish the persisted status of ``job_id``; False if it is unknown."""
+    with sqlite_conn() as conn:
+        job = job_store.get(conn, job_id)
+    if job is None:
+        return False
+    publish_job(job)
+    return True
+
+
+# ------------------------------------------------------------------- cache
+def cached(job_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Return ``(etag, payload)`` if memory is authoritative, else None."""
+    now = time.monotonic()
+    with _lock:
+        done = _terminal.get(job_id)
+        if done is not None:
+            _terminal.move_to_end(job_id)
+            return done
+        channel = _channels.get(job_id)
+        if (
+            channel is not None
+            and channel.payload is not None
+            and job_id in _owned
+            and now - channel.updated_at <= config.JOB_STATUS_CACHE_MAX_AGE_SECONDS
+        ):
+            return channel.tag, channel.payload
+    return None
+
+
+# ---------------------------------------------------------------- watching
+async def wait(
+    job_id: str, known: Optional[str], timeout: float
+) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Return ``(etag, payload)`` once the status differs from ``known``.
+
+    ``known`` is the ETag the watcher last saw (``None`` for none). Returns
+    ``None`` if nothing changed within ``timeout`` seconds. Raises
+    :class:`KeyError` if the job does not exist.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max(timeout, 0)
+
+    with _lock:
+        channel = _channel(job_id)
+        channel.watchers += 1
+    try:
+        while True:
+            with _lock:
+                if channel.payload is not None and channel.tag != known:
+                    return channel.tag, channel.payload
+                owned = job_id in _owned
+                now = time.monotonic()
+                poll = channel.payload is None or (
+                    not owned
+                    and now - channel.polled_at >= config.JOB_EVENTS_POLL_SECONDS
+                )
+                if poll:
+                    channel.polled_at = now
+                else:
+                    future = loop.create_future()
+                    channel.waiters.append((loop, future))
+
+            if poll:
+                if not await run_in_threadpool(refresh, job_id):
+                    raise KeyError(job_id)
+                continue
+
+            remaining = deadline - loop.time()
+            if not owned:
+                remaining = min(remaining, config.JOB_EVENTS_POLL_SECONDS)
+            if remaining > 0:
+                try:
+                    await asyncio.wait_for(future, remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            with _lock:
+                if (loop, future) in channel.waiters:
+                    channel.waiters.remove((loop, future))
+                changed = channel.payload is not None and channel.tag != known
+            if not changed and loop.time() >= deadline:
+                return None
+    finally:
+        with _lock:
+            channel.watchers -= 1
+            _discard_if_idle(job_id, channel)
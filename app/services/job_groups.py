@@ -0,0 +1,84 @@
+"""Job groups: the jobs created by one batch submission.
+
+A group is a row in ``job_groups`` plus one ``job_group_members`` row per job,
+in submission order. Job rows themselves are owned by the job store and are
+untouched; a group only records which jobs belong together so clients can
+follow a whole batch through ``GET /v1/job-groups/{group_id}``.
+"""
+
+import sqlite3
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Create the group tables."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_groups (
+            group_id   TEXT PRIMARY KEY,
+            tenant     TEXT NOT NULL,
+            job_count  INTEGER NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_group_members (
+            group_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            job_id   TEXT NOT NULL,
+            PRIMARY KEY (group_id, position)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_job_group_members_job "
+        "ON job_group_members (job_id)"
+    )
+
+
+def insert(
+    conn: sqlite3.Connection, group_id: str, tenant: str, job_ids: List[str]
+) -> None:
+    """Record a group and its jobs inside the caller's transaction."""
+    conn.execute(
+        "INSERT INTO job_groups (group_id, tenant, job_count, created_at) "
+        "VALUES (?, ?, ?, ?)",
+        (group_id, tenant, len(job_ids), datetime.now(timezone.utc).isoformat()),
+    )
+    conn.executemany(
+        "INSERT INTO job_group_members (group_id, position, job_id) "
+        "VALUES (?, ?, ?)",
+        ((group_id, position, job_id) for position, job_id in enumerate(job_ids)),
+    )
+
+
+def job_ids(conn: sqlite3.Connection, group_id: str) -> Optional[List[str]]:
+    """Return the group's job ids in order, or None for an unknown group."""
+    row = conn.execute(
+        "SELECT 1 FROM job_groups WHERE group_id = ?", (group_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    return [
+        r[0]
+        for r in conn.execute(
+            "SELECT job_id FROM job_group_members WHERE group_id = ? "
+            "ORDER BY position",
+            (group_id,),
+        )
+    ]
+
+
+def forget_jobs(conn: sqlite3.Connection, job_ids: Iterable[str]) -> None:
+    """Drop purged jobs from their groups, and groups left empty."""
+    conn.executemany(
+        "DELETE FROM job_group_members WHERE job_id = ?",
+        ((job_id,) for job_id in job_ids),
+    )
+    conn.execute(
+        "DELETE FROM job_groups WHERE group_id NOT IN "
+        "(SELECT group_id FROM job_group_members)"
+    )
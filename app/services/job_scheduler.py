@@ -0,0 +1,233 @@
+"""Cost-aware ordering of admitted ingestion jobs.
+
+Admitted jobs are not run in arrival order. Every job gets an estimated cost
+(seconds of worker time) from its size, its file type and the per-type
+throughput observed on recently completed jobs. The scheduler then picks the
+next job to run with three rules, in priority order:
+
+  1. Aging        - a job that has waited past ``SCHED_MAX_WAIT_SECONDS`` runs
+                    next (oldest first), so large jobs can never starve.
+  2. Fast lane    - jobs estimated below ``SCHED_FAST_LANE_SECONDS`` run
+                    before everything else.
+  3. Fair queuing - within a lane, jobs are ordered by a weighted fair
+                    queuing finish tag per tenant (API key), so one tenant's
+                    batch cannot monopolise the pool. Waiting time is credited
+                    against the tag (``SCHED_AGING_SECONDS_PER_MINUTE``).
+
+Jobs submitted together as a batch share a group. At most the group's limit
+of them run at once; while a group is at its limit its other jobs are simply
+not eligible. A dispatch that finds nothing eligible is deferred, and
+:meth:`JobScheduler.finish` hands it back when a group member completes.
+
+The pending set is bounded by ``QUEUE_CAPACITY``, so selection is a linear
+scan rather than a heap - effective priorities change as jobs age.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import config
+
+
+# Weight given to the newest observation when updating per-type throughput.
+_THROUGHPUT_EWMA_ALPHA = 0.2
+
+
+@dataclass
+class ScheduledJob:
+    """One admitted job waiting for a worker."""
+
+    job_id: str
+    tenant: str
+    ext: str
+    size_bytes: int
+    est_seconds: float
+    tag: float
+    payload: Tuple[Any, ...]
+    group: str = ""
+    enqueued_monotonic: float = field(default_factory=time.monotonic)
+
+    def waited_seconds(self, now: float) -> float:
+        """Return how long the job has been waiting."""
+        return now - self.enqueued_monotonic
+
+
+def file_ext(filename: Optional[str]) -> str:
+    """Return the lower-cased extension of ``filename`` without the dot."""
+    return os.path.splitext(filename or "")[1].lower().lstrip(".")
+
+
+class JobScheduler:
+    """Thread-safe pending-job set with shortest-job-first fair selection."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: List[ScheduledJob] = []
+        self._virtual_time = 0.0
+        self._tenant_finish: Dict[str, float] = {}
+        self._throughput: Dict[str, float] = {}
+        self._group_limit: Dict[str, int] = {}
+        self._group_running: Dict[str, int] = {}
+        self._deferred = 0
+
+    # ------------------------------------------------------------- estimates
+    def bytes_per_second(self, ext: str) -> float:
+        """Return the observed (or default) throughput for a file type."""
+        with self._lock:
+            observed = self._throughput.get(ext)
+        if observed is None:
+            return float(config.SCHED_DEFAULT_BYTES_PER_SECOND)
+        return observed
+
+    def estimate_seconds(self, ext: str, size_bytes: int) -> float:
+        """Estimate the worker time a job of this type and size needs.
+
+        Takes the scheduler lock (via :meth:`bytes_per_second`); do not call
+        it with the lock held.
+        """
+        throughput = max(self.bytes_per_second(ext), 1.0)
+        return config.SCHED_JOB_OVERHEAD_SECONDS + max(size_bytes, 0) / throughput
+
+    def record_throughput(self, ext: str, size_bytes: int, seconds: float) -> None:
+        """Fold a completed job's throughput into the per-type estimate."""
+        if size_bytes <= 0 or seconds <= 0:
+            return
+
+        observed = size_bytes / seconds
+        with self._lock:
+            previous = self._throughput.get(ext)
+            if previous is None:
+                self._throughput[ext] = observed
+            else:
+                self._throughput[ext] = (
+                    _THROUGHPUT_EWMA_ALPHA * observed
+                    + (1 - _THROUGHPUT_EWMA_ALPHA) * previous
+                )
+
+    # ------------------------------------------------------------- queueing
+    def push(
+        self,
+        *,
+        job_id: str,
+        tenant: str,
+        filename: Optional[str],
+        size_bytes: int,
+        payload: Tuple[Any, ...],
+        weight: float = 1.0,
+        group: str = "",
+        group_limit: int = 0,
+    ) -> ScheduledJob:
+        """Add an admitted job to the pending set.
+
+        Jobs sharing a non-empty ``group`` run at most ``group_limit`` at a
+        time (``JOB_GROUP_MAX_PARALLEL`` when 0).
+        """
+        ext = file_ext(filename)
+        est = self.estimate_seconds(ext, size_bytes)
+
+        with self._lock:
+            start = max(self._virtual_time, self._tenant_finish.get(tenant, 0.0))
+            tag = start + est / max(weight, 1e-6)
+            self._tenant_finish[tenant] = tag
+
+            job = ScheduledJob(
+                job_id=job_id,
+                tenant=tenant,
+                ext=ext,
+                size_bytes=size_bytes,
+                est_seconds=est,
+                tag=tag,
+                payload=payload,
+                group=group,
+            )
+            if group:
+                self._group_limit[group] = max(
+                    group_limit or config.JOB_GROUP_MAX_PARALLEL, 1
+                )
+            self._pending.append(job)
+            return job
+
+    def pop(self) -> Optional[ScheduledJob]:
+        """Remove and return the job that should run next, if any.
+
+        Returns ``None`` when nothing is eligible; if jobs are pending but
+        blocked by their group limit, the dispatch is deferred.
+        """
+        with self._lock:
+            eligible = [
+                j for j in self._pending
+                if not j.group
+                or self._group_running.get(j.group, 0) < self._group_limit[j.group]
+            ]
+            if not eligible:
+                if self._pending:
+                    self._deferred += 1
+                return None
+
+            job = self._select(time.monotonic(), eligible)
+            self._pending.remove(job)
+            self._virtual_time = max(self._virtual_time, job.tag)
+            if job.group:
+                self._group_running[job.group] = (
+                    self._group_running.get(job.group, 0) + 1
+                )
+            self._forget_idle_tenants()
+            return job
+
+    def finish(self, group: str) -> bool:
+        """Record that a popped job ended; True if a deferred dispatch is due."""
+        if not group:
+            return False
+
+        with self._lock:
+            running = self._group_running.get(group, 0) - 1
+            if running > 0:
+                self._group_running[group] = running
+            else:
+                self._group_running.pop(group, None)
+                if not any(j.group == group for j in self._pending):
+                    self._group_limit.pop(group, None)
+
+            if self._deferred > 0:
+                self._deferred -= 1
+                return True
+            return False
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    # ------------------------------------------------------------- internals
+    def _select(self, now: float, candidates: List[ScheduledJob]) -> ScheduledJob:
+        """Pick the next job among ``candidates``; the caller holds the lock."""
+        starving = [
+            j for j in candidates
+            if j.waited_seconds(now) >= config.SCHED_MAX_WAIT_SECONDS
+        ]
+        if starving:
+            return min(starving, key=lambda j: j.enqueued_monotonic)
+
+        fast = [
+            j for j in candidates
+            if j.est_seconds <= config.SCHED_FAST_LANE_SECONDS
+        ]
+        lane = fast or candidates
+
+        credit_per_second = config.SCHED_AGING_SECONDS_PER_MINUTE / 60.0
+        return min(
+            lane,
+            key=lambda j: (
+                j.tag - j.waited_seconds(now) * credit_per_second,
+                j.enqueued_monotonic,
+            ),
+        )
+
+    def _forget_idle_tenants(self) -> None:
+        """Drop finish tags of tenants with nothing pending and no credit."""
+        active = {j.tenant for j in self._pending}
+        for tenant, finish in list(self._tenant_finish.items()):
+            if tenant not in active and finish <= self._virtual_time:
+                del self._tenant_finish[tenant]
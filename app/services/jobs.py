@@ -1,19 +1,16 @@
 """Async document-ingestion runtime."""
 
-import asyncio
+import os
 import sqlite3
 import threading
 import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Optional, Tuple
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 
-from starlette.datastructures import UploadFile
-
-from talkingdb.clients.sqlite import sqlite_conn
 from talkingdb.helpers import spool
-from talkingdb.helpers.client import config as ce_config
-from talkingdb.helpers.graph import rollback_graph
 from talkingdb.logger.console import logger
 from talkingdb.models.document.document import DocumentModel
 from talkingdb.models.document.elements.primitive.table import TableModel
@@ -23,11 +20,15 @@ from talkingdb.models.job.error import JobErrorCode
 from talkingdb.models.job.stage import JobStage
 from talkingdb.models.job.state import JobState
 from talkingdb.models.metadata.metadata import Metadata
-from talkingdb_ce.client import CEClient
 
 from app.core import config
+from app.core.sqlite_pool import sqlite_conn
+from app.services import chunked_parse, element_stream, graph_store, job_events
 from app.services.job_context import JobCancelled, JobContext, JobTimeout
 from app.services.job_observability import emit_lifecycle
+from app.services.job_scheduler import JobScheduler, file_ext
+from app.services.parse_cache import parse_cache
+from app.services.parser_client import ParseTimeout, parser_client
 
 
 # ----------------------------------------------------------------- admission
@@ -35,12 +36,27 @@ class QueueFull(Exception):
     """Raised when the bounded admission queue is full."""
 
 
-_executor = ThreadPoolExecutor(
+# Parse is I/O-bound (a call to the CE service) and index is CPU-bound, so each
+# stage gets its own pool. A job moves from one to the other through a bounded
+# hand-off, letting job N+1 parse while job N indexes.
+_parse_executor = ThreadPoolExecutor(
+    max_workers=config.PARSE_WORKERS,
+    thread_name_prefix="tdb-parse",
+)
+_index_executor = ThreadPoolExecutor(
     max_workers=config.MAX_WORKERS,
     thread_name_prefix="tdb-job",
 )
+_index_handoff = threading.BoundedSemaphore(config.INDEX_QUEUE_DEPTH)
 _admission_lock = threading.Lock()
 _in_flight = 0
+_scheduler = JobScheduler()
+
+# group_id -> admitted batch jobs not yet handed to the scheduler, in
+# submission order (``enqueue_reserved`` keyword arguments). A batch holds
+# only as many admission slots as it may run at once; each member that ends
+# passes its slot to the next job here.
+_group_backlog: Dict[str, Deque[Dict[str, Any]]] = {}
 
 
 def _now_iso() -> str:
@@ -56,16 +72,73 @@ def acquire_slot() -> None:
         _in_flight += 1
 
 
+def acquire_slots(count: int) -> None:
+    """Reserve ``count`` admission slots, all or none."""
+    global _in_flight
+    with _admission_lock:
+        if _in_flight + count > config.QUEUE_CAPACITY:
+            raise QueueFull()
+        _in_flight += count
+
+
+def acquire_group_slots(count: int, max_parallel: int) -> int:
+    """Reserve the slots a batch of ``count`` jobs runs in, all or none.
+
+    A batch holds as many slots as it may run jobs at once -
+    ``JOB_GROUP_MAX_PARALLEL``, or ``max_parallel`` if lower and non-zero -
+    for its whole lifetime, however many jobs it has. Returns the number
+    reserved.
+    """
+    limit = config.JOB_GROUP_MAX_PARALLEL
+    if max_parallel:
+        limit = min(limit, max_parallel)
+    slots = max(min(count, limit), 1)
+    acquire_slots(slots)
+    return slots
+
+
 def release_slot() -> None:
     """Release a slot previously held by :func:`acquire_slot`.
 
     Idempotently safe to call on the same code path that raised after
     acquisition - we floor at zero.
     """
+    release_slots(1)
+
+
+def release_slots(count: int) -> None:
+    """Release ``count`` slots, flooring at zero."""
     global _in_flight
     with _admission_lock:
-        if _in_flight > 0:
-            _in_flight -= 1
+        _in_flight = max(_in_flight - max(count, 0), 0)
+
+
+def _release_job(group: str) -> None:
+    """Free a finished job's place in its group, then its admission slot.
+
+    A batch member with jobs still waiting in its group's backlog passes the
+    slot to the next of them instead of releasing it.
+    """
+    following = None
+    if group:
+        with _admission_lock:
+            backlog = _group_backlog.get(group)
+            if backlog:
+                following = backlog.popleft()
+                if not backlog:
+                    del _group_backlog[group]
+    if _scheduler.finish(group):
+        _parse_executor.submit(_run_next)
+    if following is None:
+        release_slot()
+        return
+    try:
+        enqueue_reserved(**following)
+    except RuntimeError as exc:
+        # The parse pool is shut down; the job stays QUEUED like any other
+        # pending job at shutdown.
+        logger.warning(f"[job {following['job_id']}] not dispatched: {exc}")
+        release_slot()
 
 
 def enqueue_reserved(
@@ -74,104 +147,187 @@ def enqueue_reserved(
     temp_path: str,
     filename: str,
     metadata_json: str,
+    tenant: str = "",
+    file_size_bytes: int = 0,
+    group: str = "",
+    group_limit: int = 0,
 ) -> None:
     """Submit work whose slot has already been reserved.
 
-    The wrapper guarantees the slot is released exactly once, regardless of
-    how the job ends.
+    The job joins the scheduler's pending set and one dispatch task is
+    submitted per job, so every parse task runs exactly one job - whichever
+    the scheduler ranks first when a parse worker frees up, not necessarily
+    this one. The slot is released exactly once, by whichever stage ends the
+    job. Jobs of one batch share ``group`` and run at most ``group_limit`` at
+    a time.
     """
-    _executor.submit(
-        _run_after_reservation, job_id, temp_path, filename, metadata_json
+    job_events.claim(job_id)
+    _scheduler.push(
+        job_id=job_id,
+        tenant=tenant,
+        filename=filename,
+        size_bytes=file_size_bytes,
+        payload=(job_id, temp_path, filename, metadata_json, group),
+        group=group,
+        group_limit=group_limit,
     )
+    _parse_executor.submit(_run_next)
 
 
-def _run_after_reservation(
-    job_id: str, temp_path: str, filename: str, metadata_json: str
-) -> None:
-    """Run a reserved job and always release its slot."""
-    try:
-        run_job(job_id, temp_path, filename, metadata_json)
-    finally:
-        release_slot()
+def enqueue_group(
+    *, group: str, slots: int, jobs: List[Dict[str, Any]]
+) -> List[str]:
+    """Submit a batch that holds ``slots`` reserved admission slots.
 
+    ``jobs`` are :func:`enqueue_reserved` keyword arguments in submission
+    order. The first ``slots`` jobs go to the scheduler now; the rest wait
+    in the group's backlog and are handed over one by one as members end.
 
-# ---------------------------------------------------------------------- run
-def run_job(
-    job_id: str, temp_path: str, filename: str, metadata_json: str
-) -> None:
-    """Execute one ingestion job to a terminal state."""
-    if not _transition_to_ongoing(job_id):
-        spool.discard(temp_path)
-        return
-
-    ctx = JobContext(job_id=job_id)
-    graph_id: Optional[str] = None
-    result_summary = None
+    The batch's slots are owned here from the call on. If submitting fails
+    part-way, jobs already submitted keep running with their slots, the
+    slots of the others are released and the jobs never handed over are
+    finalized as ``FAILED``. Returns their ids, empty when all went through.
+    """
+    for job in jobs:
+        job.update(group=group, group_limit=slots)
+    if len(jobs) > slots:
+        with _admission_lock:
+            _group_backlog[group] = deque(jobs[slots:])
 
+    submitted = 0
     try:
-        ctx.set_stage(JobStage.PARSING, status_message="Parsing document")
-        parse_result = _parse(temp_path, filename, metadata_json)
+        for job in jobs[:slots]:
+            enqueue_reserved(**job)
+            submitted += 1
+        return []
+    except Exception as exc:
+        with _admission_lock:
+            backlog = _group_backlog.pop(group, None) or deque()
+        # Members that already ended may have handed some backlog jobs over.
+        left = jobs[submitted:slots] + list(backlog)
+        release_slots(min(slots, len(jobs)) - submitted)
+        logger.warning(
+            f"[group {group}] {len(left)} of {len(jobs)} jobs not dispatched: {exc}"
+        )
+        for job in left:
+            finalize_externally(
+                job["job_id"],
+                JobState.FAILED,
+                graph_id=None,
+                temp_path=job["temp_path"],
+                error_code=JobErrorCode.INTERNAL_ERROR,
+                error_message=f"Job could not be dispatched: {exc}",
+            )
+        return [job["job_id"] for job in left]
 
-        ctx.checkpoint(status_message="Parsed; preparing to index")
 
-        ctx.set_stage(
-            JobStage.ELEMENT_EXTRACTION,
-            status_message="Reading document structure",
-        )
-        from app.services.indexer import IndexerService
+def _run_next() -> None:
+    """Start the highest-priority pending job."""
+    scheduled = _scheduler.pop()
+    if scheduled is None:
+        return
+    _run_parse_stage(*scheduled.payload)
 
-        indexer = IndexerService()
-        graph_id = indexer.gm.graph_id
 
-        with sqlite_conn() as conn:
-            job_store.set_result_graph_id(conn, job_id, graph_id)
+# ---------------------------------------------------------------------- run
+@dataclass
+class _PipelineJob:
+    """State carried by one job from the parse stage to the index stage."""
+
+    job_id: str
+    temp_path: str
+    filename: str
+    metadata_json: str
+    ctx: JobContext
+    size_bytes: int
+    group: str = ""
+    graph_id: Optional[str] = None
+    parse_result: Optional[dict] = None
 
-        ctx.set_stage(
-            JobStage.TREE_GENERATION,
-            status_message="Building document tree",
-        )
-        indexer.graph_file_index(FileIndexModel(**parse_result["file_index"]))
 
-        ctx.set_stage(JobStage.INDEXING, status_message="Indexing document elements")
-        document = DocumentModel.from_dict(parse_result["document"])
+def _run_parse_stage(
+    job_id: str,
+    temp_path: str,
+    filename: str,
+    metadata_json: str,
+    group: str = "",
+) -> None:
+    """Parse one job and hand it to the index stage.
 
-        def _on_progress(done: int, total: int) -> None:
-            """Forward progress updates through the job context."""
-            ctx.checkpoint(
-                done_units=done,
-                total_units=total,
-                status_message=f"Indexing elements ({done}/{total})",
-            )
+    Releases the admission slot itself unless the job was handed off.
+    """
+    handed_off = False
+    try:
+        if not _transition_to_ongoing(job_id):
+            spool.discard(temp_path)
+            job_events.refresh(job_id)
+            job_events.release(job_id)
+            return
+
+        job = _PipelineJob(
+            job_id=job_id,
+            temp_path=temp_path,
+            filename=filename,
+            metadata_json=metadata_json,
+            ctx=JobContext(job_id=job_id),
+            size_bytes=_file_size(temp_path),
+            group=group,
+        )
+        if _run_stage(job, _parse_stage):
+            try:
+                _index_executor.submit(_run_index_stage, job)
+            except BaseException as exc:
+                # Nothing will run the index stage (e.g. the pool is shut
+                # down), so give back its hand-off slot and end the job here.
+                _index_handoff.release()
+                error_code, error_message = _classify(exc)
+                _finalize(
+                    job.job_id,
+                    JobState.FAILED,
+                    graph_id=job.graph_id,
+                    temp_path=job.temp_path,
+                    error_code=error_code,
+                    error_message=error_message,
+                    status_message="Upload failed",
+                )
+                raise
+            handed_off = True
+    finally:
+        if not handed_off:
+            _release_job(group)
 
-        indexer.index_document(document, progress=_on_progress)
 
-        ctx.set_stage(JobStage.PERSISTING, status_message="Saving graph")
+def _run_index_stage(job: _PipelineJob) -> None:
+    """Index a parsed job to a terminal state and release its slot."""
+    _index_handoff.release()
+    try:
+        _run_stage(job, _index_stage)
+    finally:
+        _release_job(job.group)
 
-        result_summary = _build_result_summary(document, ctx)
 
-        _finalize(
-            job_id,
-            JobState.COMPLETED,
-            graph_id=graph_id,
-            temp_path=temp_path,
-            result_summary=result_summary,
-            status_message="Document indexed",
-        )
+def _run_stage(job: _PipelineJob, stage: Callable[[_PipelineJob], None]) -> bool:
+    """Run one pipeline stage, finalizing the job if it raises.
 
+    Returns ``True`` when the stage completed and the job is still live.
+    """
+    try:
+        stage(job)
+        return True
     except JobCancelled:
         _finalize(
-            job_id,
+            job.job_id,
             JobState.CANCELLED,
-            graph_id=graph_id,
-            temp_path=temp_path,
+            graph_id=job.graph_id,
+            temp_path=job.temp_path,
             status_message="Upload cancelled, cleaned up",
         )
     except JobTimeout:
         _finalize(
-            job_id,
+            job.job_id,
             JobState.FAILED,
-            graph_id=graph_id,
-            temp_path=temp_path,
+            graph_id=job.graph_id,
+            temp_path=job.temp_path,
             error_code=JobErrorCode.TIMEOUT,
             error_message=(
                 f"exceeded MAX_JOB_DURATION_SECONDS="
@@ -182,32 +338,147 @@ def run_job(
     except BaseException as exc:
         error_code, error_message = _classify(exc)
         logger.exception(
-            f"[job {job_id}] failed: {error_code.value}: {error_message}"
+            f"[job {job.job_id}] failed: {error_code.value}: {error_message}"
         )
         _finalize(
-            job_id,
+            job.job_id,
             JobState.FAILED,
-            graph_id=graph_id,
-            temp_path=temp_path,
+            graph_id=job.graph_id,
+            temp_path=job.temp_path,
             error_code=error_code,
             error_message=error_message,
             status_message="Upload failed",
         )
+    return False
+
+
+def _parse_stage(job: _PipelineJob) -> None:
+    """Parse the spooled file and wait for room in the index stage."""
+    ctx = job.ctx
+    ctx.set_stage(JobStage.PARSING, status_message="Parsing document")
+    job.parse_result = _parse(
+        job.temp_path, job.filename, job.metadata_json, ctx
+    )
+
+    ctx.checkpoint(status_message="Parsed; preparing to index")
+
+    # Bounded hand-off: a parsed job holds its result in memory until an
+    # index worker picks it up, so cap how many may wait. Keep checking for
+    # cancel / timeout while blocked.
+    while not _index_handoff.acquire(timeout=config.HEARTBEAT_MIN_GAP_SECONDS):
+        ctx.checkpoint(status_message="Parsed; waiting for an indexing worker")
+
+
+def _index_stage(job: _PipelineJob) -> None:
+    """Build, index and persist the graph, then complete the job."""
+    ctx = job.ctx
+    parse_result = job.parse_result
+    job.parse_result = None
+
+    ctx.set_stage(
+        JobStage.ELEMENT_EXTRACTION,
+        status_message="Reading document structure",
+    )
+    from app.services.indexer import IndexerService
+
+    indexer = IndexerService()
+    job.graph_id = indexer.gm.graph_id
+
+    with sqlite_conn() as conn:
+        job_store.set_result_graph_id(conn, job.job_id, job.graph_id)
+
+    document = DocumentModel.from_dict(parse_result["document"])
+
+    ctx.set_stage(
+        JobStage.TREE_GENERATION,
+        status_message="Building document tree",
+    )
+    # Streamed elements come without an outline; derive it from the document.
+    file_index = parse_result.get("file_index")
+    indexer.graph_file_index(
+        FileIndexModel(**file_index) if file_index else document.build_index()
+    )
+
+    ctx.set_stage(JobStage.INDEXING, status_message="Indexing document elements")
+
+    def _on_progress(done: int, total: int) -> None:
+        """Forward progress updates through the job context."""
+        ctx.checkpoint(
+            done_units=done,
+            total_units=total,
+            status_message=f"Indexing elements ({done}/{total})",
+        )
+
+    indexer.index_document(document, progress=_on_progress)
+
+    ctx.set_stage(JobStage.PERSISTING, status_message="Saving graph")
+
+    result_summary = _build_result_summary(document, ctx)
+    _scheduler.record_throughput(
+        file_ext(job.filename), job.size_bytes, ctx.elapsed_seconds()
+    )
+
+    _finalize(
+        job.job_id,
+        JobState.COMPLETED,
+        graph_id=job.graph_id,
+        temp_path=job.temp_path,
+        result_summary=result_summary,
+        status_message="Document indexed",
+    )
 
 
 # ------------------------------------------------------------- pipeline steps
 def _transition_to_ongoing(job_id: str) -> bool:
     with sqlite_conn() as conn:
-        return job_store.mark_ongoing(conn, job_id, _now_iso())
+        if not job_store.mark_ongoing(conn, job_id, _now_iso()):
+            return False
+        job = job_store.get(conn, job_id)
+    job_events.publish_job(job)
+    return True
+
+
+def _file_size(temp_path: str) -> int:
+    """Return the spooled file's size, or 0 if it cannot be read."""
+    try:
+        return os.path.getsize(temp_path)
+    except OSError:
+        return 0
+
 
+def _parse(
+    temp_path: str, filename: str, metadata_json: str, ctx: JobContext
+) -> dict:
+    """Parse a spooled document through the shared CE parser client.
+
+    Results are served from / stored in the parse cache when it is enabled.
+    Large PDFs are parsed as concurrent page-range chunks when
+    ``PARSE_SPLIT_PAGES`` is enabled. A spooled element stream is already
+    parsed and is only read back.
+    """
+    if file_ext(filename) == element_stream.FILE_EXT:
+        return element_stream.load(temp_path, ctx)
+
+    cache_key: Optional[str] = None
+    if parse_cache.enabled:
+        cache_key = parse_cache.key_for(temp_path, metadata_json)
+        cached = parse_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-def _parse(temp_path: str, filename: str, metadata_json: str) -> dict:
-    """Parse a spooled document using CEClient."""
     metadata = Metadata.ensure_metadata(Metadata.from_json(metadata_json))
-    client = CEClient(ce_config)
-    with open(temp_path, "rb") as fh:
-        upload = UploadFile(filename=filename, file=fh)
-        return asyncio.run(client.parse_file(file=upload, metadata=metadata))
+    result = None
+    page_count = chunked_parse.split_page_count(filename, temp_path)
+    if page_count:
+        result = chunked_parse.parse_in_chunks(
+            temp_path, filename, metadata, page_count, ctx
+        )
+    if result is None:
+        result = parser_client.parse(temp_path, filename, metadata, ctx=ctx)
+
+    if cache_key is not None:
+        parse_cache.put(cache_key, result)
+    return result
 
 
 def _build_result_summary(document: DocumentModel, ctx: JobContext) -> dict:
@@ -230,6 +501,8 @@ def _classify(exc: BaseException) -> Tuple[JobErrorCode, str]:
     name = type(exc).__name__
     detail = f"{name}: {exc}" if str(exc) else name
 
+    if isinstance(exc, ParseTimeout):
+        return JobErrorCode.PARSE_ERROR, detail
     if isinstance(exc, ValueError):
         return JobErrorCode.VALIDATION_ERROR, detail
     if isinstance(exc, sqlite3.OperationalError):
@@ -257,8 +530,9 @@ def _finalize(
     """Run cleanup and apply the terminal job transition."""
     rollback_ms: Optional[int] = None
     if terminal_state != JobState.COMPLETED:
+        # Tombstone only; the daemon reclaims the rows off the worker.
         rollback_start = time.monotonic()
-        rollback_graph(graph_id)
+        graph_store.tombstone(graph_id)
         rollback_ms = int((time.monotonic() - rollback_start) * 1000)
 
     spool.discard(temp_path)
@@ -279,11 +553,15 @@ def _finalize(
             if terminal_job is not None:
                 emit_lifecycle(terminal_job, rollback_ms=rollback_ms)
 
-    if not won:
+    if won:
+        job_events.publish_job(terminal_job)
+    else:
         logger.info(
             f"[job {job_id}] finalize lost the race; "
             f"current row already terminal"
         )
+        job_events.refresh(job_id)
+    job_events.release(job_id)
 
 
 def finalize_externally(
@@ -0,0 +1,70 @@
+"""Stored viewer layouts, one row per graph.
+
+Each row holds the node positions :mod:`app.services.graph_layout` computed
+for one version of a graph (see :func:`graph_store.version`). A row whose
+version is older than the graph's is stale and is simply recomputed and
+overwritten; rows are deleted when the graph itself is reclaimed.
+
+The payload is zlib-compressed JSON: a list of ``[node, x, y, parent]``
+entries, so string and integer node keys round-trip unchanged.
+"""
+
+import json
+import sqlite3
+import zlib
+from datetime import datetime, timezone
+from typing import Any, List, Optional, Tuple
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Create the layout table."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS graph_layouts (
+            graph_id   TEXT PRIMARY KEY,
+            version    INTEGER NOT NULL,
+            payload    BLOB NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+def get(
+    conn: sqlite3.Connection, graph_id: str
+) -> Optional[Tuple[int, List[List[Any]]]]:
+    """Return ``(version, entries)`` of the stored layout, or None."""
+    row = conn.execute(
+        "SELECT version, payload FROM graph_layouts WHERE graph_id = ?",
+        (graph_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    return row[0], json.loads(zlib.decompress(row[1]))
+
+
+def put(
+    conn: sqlite3.Connection,
+    graph_id: str,
+    version: int,
+    entries: List[List[Any]],
+) -> None:
+    """Store the layout of one graph version, replacing any older one."""
+    payload = zlib.compress(json.dumps(entries, separators=(",", ":")).encode())
+    conn.execute(
+        """
+        INSERT INTO graph_layouts (graph_id, version, payload, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(graph_id) DO UPDATE SET
+            version = excluded.version,
+            payload = excluded.payload,
+            updated_at = excluded.updated_at
+        WHERE excluded.version >= graph_layouts.version
+        """,
+        (graph_id, version, payload, datetime.now(timezone.utc).isoformat()),
+    )
+
+
+def delete(conn: sqlite3.Connection, graph_id: str) -> None:
+    """Delete the stored layout of one graph."""
+    conn.execute("DELETE FROM graph_layouts WHERE graph_id = ?", (graph_id,))
@@ -0,0 +1,209 @@
+"""Lexicon of lowercase surface forms seen at index time, for fast tokenizing.
+
+:class:`TextTokenizer` runs the full spaCy pipeline (tagger, lemmatizer,
+attribute ruler) on every text. That is what indexing needs, but a query only
+needs each token's lemma and whether it is an adjective (the ``COMPOUND``
+Matcher rule). While indexing, the tokenizer calls :meth:`Lexicon.observe`
+on every parsed doc and :meth:`Lexicon.flush` stores, per form, the lemma and
+adjective flag spaCy assigned. A form that was ever given two different
+analyses is marked ambiguous and never served.
+
+Entries are keyed by the pipeline that produced them as well as the form:
+the tokenizer passes its :func:`~app.services.package_text_tokenizer.pipeline_id`
+(model name and version, profile, spaCy version, Matcher rules), so a new
+model, profile or spaCy release starts an empty lexicon that fills up again
+as documents are indexed, instead of serving or being marked ambiguous by
+the old analyses. Rows of pipelines no longer in use are left in place.
+
+The query-time fast path (``TextTokenizer(fast=True)``) still segments the
+text with spaCy's own rule-based tokenizer and takes ``is_alpha`` /
+``is_stop`` from the lexemes (both are context-free), then looks every token
+up here; if any token is unknown or ambiguous it falls back to the full
+pipeline. Lookups go through a bounded in-process cache, so a query of known
+words costs no model inference and one primary-key read: a flush that turns
+a stored form ambiguous bumps the ``lexicon`` generation
+(:mod:`app.services.generations`), and every process drops its cache when
+it sees the counter move.
+"""
+
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core import config
+from app.core.sqlite_pool import sqlite_conn
+from app.services import generations
+
+
+# Stay under SQLite's host-parameter limit.
+_BATCH = 900
+
+_ADJ = 1
+_AMBIGUOUS = 2
+
+_GENERATION = "lexicon"
+
+# form -> (lemma, is_adj)
+Entry = Tuple[str, bool]
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Create the lexicon table."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(lexicon)")}
+    if columns and "pipeline" not in columns:
+        # Rows from before entries were keyed by pipeline: which model
+        # produced them is unknown, so they are relearned.
+        conn.execute("DROP TABLE lexicon")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS lexicon (
+            pipeline TEXT NOT NULL,
+            form     TEXT NOT NULL,
+            lemma    TEXT NOT NULL,
+            flags    INTEGER NOT NULL,
+            PRIMARY KEY (pipeline, form)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+class Lexicon:
+    """Observed token analyses, pending writes and a lookup cache."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # (pipeline, form) -> (lemma, flags), not yet written
+        self._pending: Dict[Tuple[str, str], Tuple[str, int]] = {}
+        # (pipeline, form) -> entry, or None when stored but ambiguous
+        self._cache: Dict[Tuple[str, str], Optional[Entry]] = {}
+        self._generation = generations.Generation(_GENERATION)
+        # Bumped whenever the cache is dropped for a generation change, so
+        # rows read before the change are not cached after it.
+        self._cleared = 0
+
+    # --------------------------------------------------------------- writing
+    @staticmethod
+    def _merge(old: Tuple[str, int], lemma: str, flags: int) -> Tuple[str, int]:
+        if old[0] != lemma or (old[1] & _ADJ) != (flags & _ADJ):
+            return old[0], old[1] | _AMBIGUOUS
+        return old
+
+    def observe(self, pipeline: str, doc) -> None:
+        """Record the analysis of every token of a doc ``pipeline`` processed."""
+        seen = [
+            (
+                (pipeline, token.text),
+                token.lemma_,
+                _ADJ if token.pos_ == "ADJ" else 0,
+            )
+            for token in doc
+        ]
+        with self._lock:
+            for form, lemma, flags in seen:
+                old = self._pending.get(form)
+                self._pending[form] = (
+                    (lemma, flags) if old is None
+                    else self._merge(old, lemma, flags)
+                )
+
+    def flush(self) -> None:
+        """Write pending observations, marking conflicting forms ambiguous."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        by_pipeline: Dict[str, List[str]] = {}
+        for pipeline, form in pending:
+            by_pipeline.setdefault(pipeline, []).append(form)
+        with sqlite_conn() as conn:
+            usable = {
+                pipeline: [
+                    form
+                    for form, entry in self._select(conn, pipeline, forms).items()
+                    if entry is not None
+                ]
+                for pipeline, forms in by_pipeline.items()
+            }
+            conn.executemany(
+                """
+                INSERT INTO lexicon (pipeline, form, lemma, flags)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(pipeline, form) DO UPDATE SET flags = CASE
+                    WHEN lexicon.lemma = excluded.lemma
+                     AND (lexicon.flags & ?) = (excluded.flags & ?)
+                    THEN lexicon.flags | excluded.flags
+                    ELSE lexicon.flags | ?
+                END
+                """,
+                (
+                    (pipeline, form, lemma, flags, _ADJ, _ADJ, _AMBIGUOUS)
+                    for (pipeline, form), (lemma, flags) in pending.items()
+                ),
+            )
+            if any(
+                None in self._select(conn, pipeline, forms).values()
+                for pipeline, forms in usable.items()
+            ):
+                # Other processes may have cached the forms just made
+                # ambiguous.
+                generations.bump(conn, _GENERATION)
+        with self._lock:
+            # Cached entries of these forms may now be ambiguous.
+            for key in pending:
+                self._cache.pop(key, None)
+
+    # --------------------------------------------------------------- reading
+    @staticmethod
+    def _select(
+        conn: sqlite3.Connection, pipeline: str, forms: List[str]
+    ) -> Dict[str, Optional[Entry]]:
+        found: Dict[str, Optional[Entry]] = {}
+        for start in range(0, len(forms), _BATCH):
+            batch = forms[start:start + _BATCH]
+            marks = ", ".join(["?"] * len(batch))
+            for form, lemma, flags in conn.execute(
+                f"SELECT form, lemma, flags FROM lexicon "
+                f"WHERE pipeline = ? AND form IN ({marks})",
+                [pipeline, *batch],
+            ):
+                found[form] = (
+                    None if flags & _AMBIGUOUS else (lemma, bool(flags & _ADJ))
+                )
+        return found
+
+    def lookup(
+        self, pipeline: str, forms: Iterable[str]
+    ) -> Optional[Dict[str, Entry]]:
+        """Return ``pipeline``'s entry of every form, or None if any is unusable."""
+        wanted = list(dict.fromkeys(forms))
+        with sqlite_conn() as conn:
+            stale = self._generation.changed(conn)
+            with self._lock:
+                if stale:
+                    self._cache.clear()
+                    self._cleared += 1
+                cleared = self._cleared
+                found = {
+                    f: self._cache[pipeline, f]
+                    for f in wanted
+                    if (pipeline, f) in self._cache
+                }
+            missing = [f for f in wanted if f not in found]
+            fetched = self._select(conn, pipeline, missing) if missing else {}
+        if missing:
+            if len(fetched) < len(missing):
+                return None
+            with self._lock:
+                if len(self._cache) + len(fetched) > config.LEXICON_CACHE_MAX_ENTRIES:
+                    self._cache.clear()
+                if cleared == self._cleared:
+                    self._cache.update(
+                        ((pipeline, f), entry) for f, entry in fetched.items()
+                    )
+            found.update(fetched)
+        if any(entry is None for entry in found.values()):
+            return None
+        return found
+
+
+lexicon = Lexicon()
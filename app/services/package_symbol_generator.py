@@ -1,30 +1,90 @@
 # package_symbol_generator/symbol_generator.py
 
-from typing import List, Dict
+from hashlib import blake2b
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+_NAMES = {1: "unigram", 2: "bigram", 3: "trigram"}
+
+_MASK = (1 << 64) - 1
+_PRIME = 1099511628211
+
+
+def gram_type(n: int) -> str:
+    """Return the symbol type of ``n``-grams (``unigram`` ... ``4gram``)."""
+    return _NAMES.get(n, f"{n}gram")
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(
+        blake2b(token.encode("utf-8", "surrogatepass"), digest_size=8).digest(),
+        "little",
+    )
 
 
 class SymbolGenerator:
     """
     Generates symbolic units from tokens.
+
+    ``orders`` are the n-gram sizes produced, smallest first by default
+    (unigrams, bigrams, trigrams).
     """
 
+    def __init__(self, orders: Sequence[int] = (1, 2, 3)):
+        self.orders = tuple(n for n in orders if n > 0)
+
+    def iter_symbols(
+        self,
+        tokens: List[str],
+        orders: Optional[Iterable[int]] = None,
+    ) -> Iterator[Tuple[str, str]]:
+        """Yield ``(gram_type, symbol)`` lazily, one order after another."""
+        for n in self.orders if orders is None else orders:
+            name = gram_type(n)
+            if n == 1:
+                for token in tokens:
+                    yield name, token
+                continue
+            for i in range(len(tokens) - n + 1):
+                yield name, "_".join(tokens[i:i + n])
+
+    def iter_hashes(
+        self,
+        tokens: List[str],
+        orders: Optional[Iterable[int]] = None,
+    ) -> Iterator[Tuple[str, int]]:
+        """Yield ``(gram_type, hash)`` without building n-gram strings.
+
+        Hashes are 64-bit and stable across processes; equal n-grams always
+        hash alike, so they serve membership tests and ids (collisions are
+        possible but rare).
+        """
+        seen: Dict[str, int] = {}
+        token_hashes = []
+        for token in tokens:
+            h = seen.get(token)
+            if h is None:
+                h = seen[token] = _token_hash(token)
+            token_hashes.append(h)
+
+        for n in self.orders if orders is None else orders:
+            name = gram_type(n)
+            for i in range(len(token_hashes) - n + 1):
+                h = n
+                for j in range(i, i + n):
+                    h = ((h * _PRIME) ^ token_hashes[j]) & _MASK
+                yield name, h
+
     def generate(self, tokens: List[str]) -> Dict[str, List[str]]:
-        unigrams = tokens
-        bigrams = [
-            f"{tokens[i]}_{tokens[i+1]}" for i in range(len(tokens) - 1)]
-        trigrams = [
-            f"{tokens[i]}_{tokens[i+1]}_{tokens[i+2]}"
-            for i in range(len(tokens) - 2)
-        ]
-
-        return {
-            "unigram": unigrams,
-            "bigram": bigrams,
-            "trigram": trigrams,
+        symbols: Dict[str, List[str]] = {
+            gram_type(n): [] for n in self.orders
         }
+        for symbol_type, symbol in self.iter_symbols(tokens):
+            symbols[symbol_type].append(symbol)
+        return symbols
 
     def grams(self) -> List[str]:
-        return ["unigram", "bigram", "trigram"]
+        return [gram_type(n) for n in self.orders]
 
     def max_gram(self, tokens: List[str]):
         return "_".join(tokens)
@@ -1,77 +1,319 @@
+import hashlib
 import threading
+from contextlib import contextmanager
 import spacy
-from typing import List
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Tuple
+from spacy.language import Language
 from spacy.matcher import Matcher
+from spacy.vectors import Vectors
 
+from app.core import config
+from app.services.lexicon import lexicon
+from app.services.token_cache import token_cache
 
-class TextTokenizer:
-    def __init__(self, model: str = "en_core_web_md"):
-        self.model = model
-        self._local = threading.local()
-
-    def _get_nlp(self):
-        if not hasattr(self._local, "nlp"):
-            nlp = spacy.load(
-                self.model,
-                disable=["ner", "parser"]
-            )
-            matcher = Matcher(nlp.vocab)
-
-            matcher.add(
-                "COMPOUND",
-                [[
-                    {"LEMMA": {"IN": [
-                        "investigational",
-                        "experimental",
-                        "study",
-                        "test"
-                    ]}},
-                    {"POS": "ADJ", "OP": "*"},
-                    {"LEMMA": {"IN": [
-                        "drug",
-                        "compound",
-                        "substance"
-                    ]}},
-                ]]
-            )
-
-            matcher.add(
-                "SPONSOR",
-                [[
-                    {"LEMMA": {"IN": ["sponsor", "company"]}}
-                ]]
-            )
-
-            self._local.nlp = nlp
-            self._local.matcher = matcher
-
-        return self._local.nlp, self._local.matcher
 
-    def tokenize(self, text: str, strict: bool = True) -> List[str]:
-        nlp, matcher = self._get_nlp()
+DEFAULT_MODEL = "en_core_web_md"
+
+# Pipeline profiles (``NLP_PROFILE``). tokenize() reads lemma_, is_alpha,
+# is_stop and the POS/LEMMA attributes of its Matcher rules, which need
+# tok2vec, tagger, attribute_ruler and lemmatizer. "full" loads every
+# component and only disables the parser and NER; "lean" does not load them
+# at all, and drops the vector table unless a kept component reads static
+# vectors (the md/lg tok2vec does). "lean" is meant to give the same tokens;
+# `make check-tokenizer` and tests/test_tokenizer_reference.py compare it with
+# bench_tokenizer_reference.jsonl, the output of the tokenizer before profiles
+# existed on bench_tokenizer_corpus.txt (`make tokenizer-reference`).
+PROFILES: Dict[str, Dict[str, List[str]]] = {
+    "full": {"disable": ["ner", "parser"]},
+    "lean": {"exclude": ["ner", "parser", "senter"]},
+}
+
+# Matcher rules, also applied directly by the lexicon fast path.
+_COMPOUND_FIRST = ("investigational", "experimental", "study", "test")
+_COMPOUND_LAST = ("drug", "compound", "substance")
+_SPONSOR = ("sponsor", "company")
+
+# Part of every token cache key, so changed rules never serve stale tokens.
+_RULES_DIGEST = hashlib.sha1(
+    repr((_COMPOUND_FIRST, _COMPOUND_LAST, _SPONSOR)).encode()
+).hexdigest()[:8]
+
+# nlp() is not safe to call concurrently on one pipeline: every new string
+# is written to the Vocab, its StringStore and the tokenizer's cache. So each
+# pipeline is used by one thread at a time, checked out of a per-process pool
+# of at most NLP_MAX_PIPELINES per model and profile. Pooled pipelines live as
+# long as the process, so short-lived threads (the indexer starts a thread
+# pool per document) never load the model again. Each is a full spacy.load;
+# only the vector table (rows and key map), which tokenizing never writes, is
+# shared: every pipeline of a process points at the one loaded first, and its
+# own copy is freed.
+_pools: Dict[Tuple[str, str], "_PipelinePool"] = {}
+_pools_lock = threading.Lock()
+_vectors: Dict[Tuple[str, str], Tuple[Any, Dict[int, int]]] = {}
+_vectors_lock = threading.Lock()
+
+
+def _reads_static_vectors(config_section) -> bool:
+    """Return whether a (nested) pipeline config embeds static vectors."""
+    if isinstance(config_section, dict):
+        if config_section.get("include_static_vectors"):
+            return True
+        if str(config_section.get("@architectures", "")).startswith(
+            "spacy.StaticVectors"
+        ):
+            return True
+        return any(_reads_static_vectors(v) for v in config_section.values())
+    if isinstance(config_section, (list, tuple)):
+        return any(_reads_static_vectors(v) for v in config_section)
+    return False
+
+
+def _load(model: str, profile: str) -> Language:
+    if profile not in PROFILES:
+        raise ValueError(
+            f"unknown NLP profile {profile!r}; expected one of {sorted(PROFILES)}"
+        )
+    nlp = spacy.load(model, **PROFILES[profile])
+    if profile == "lean":
+        components = nlp.config.get("components", {})
+        if not any(
+            _reads_static_vectors(components.get(name, {}))
+            for name in nlp.pipe_names
+        ):
+            nlp.vocab.reset_vectors(width=0)
+    return nlp
+
+
+def _share_vectors(key: Tuple[str, str], vectors: Any) -> None:
+    """Point ``vectors`` at the process' shared table for ``key``."""
+    if not isinstance(vectors, Vectors):
+        return
+    with _vectors_lock:
+        data, key2row = _vectors.setdefault(key, (vectors.data, vectors.key2row))
+    if data is not vectors.data and data.shape == vectors.data.shape:
+        vectors.data = data
+        vectors.key2row = key2row
+
+
+def _build(model: str, profile: str) -> Tuple[Language, Matcher]:
+    nlp = _load(model, profile)
+    _share_vectors((model, profile), nlp.vocab.vectors)
+    matcher = Matcher(nlp.vocab)
+
+    matcher.add(
+        "COMPOUND",
+        [[
+            {"LEMMA": {"IN": list(_COMPOUND_FIRST)}},
+            {"POS": "ADJ", "OP": "*"},
+            {"LEMMA": {"IN": list(_COMPOUND_LAST)}},
+        ]]
+    )
+
+    matcher.add(
+        "SPONSOR",
+        [[
+            {"LEMMA": {"IN": list(_SPONSOR)}}
+        ]]
+    )
+
+    return nlp, matcher
+
+
+class _PipelinePool:
+    """Loaded pipelines of one model and profile, each used by one thread."""
+
+    def __init__(self, model: str, profile: str):
+        self.key = (model, profile)
+        self.idle: List[Tuple[Language, Matcher]] = []
+        self.loaded = 0
+        self.cond = threading.Condition()
+        self.meta_version: Optional[str] = None
+
+    @contextmanager
+    def checkout(self) -> Iterator[Tuple[Language, Matcher]]:
+        with self.cond:
+            while not self.idle and self.loaded >= max(config.NLP_MAX_PIPELINES, 1):
+                self.cond.wait()
+            pipeline = self.idle.pop() if self.idle else None
+            if pipeline is None:
+                self.loaded += 1
+
+        if pipeline is None:
+            try:
+                pipeline = _build(*self.key)
+            except BaseException:
+                with self.cond:
+                    self.loaded -= 1
+                    self.cond.notify()
+                raise
+            self.meta_version = pipeline[0].meta.get("version", "?")
+
+        try:
+            yield pipeline
+        finally:
+            with self.cond:
+                self.idle.append(pipeline)
+                self.cond.notify()
+
 
-        doc = nlp(text.lower())
-        matches = matcher(doc)
+def _pool(model: str, profile: Optional[str]) -> _PipelinePool:
+    key = (model, profile or config.NLP_PROFILE)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = _PipelinePool(*key)
+        return pool
 
-        consumed = set()
-        tokens: List[str] = []
 
-        matches = sorted(matches, key=lambda m: m[2] - m[1], reverse=True)
+def use_pipeline(
+    model: str = DEFAULT_MODEL, profile: Optional[str] = None
+) -> ContextManager[Tuple[Language, Matcher]]:
+    """Check out an ``(nlp, matcher)`` of ``model`` for this thread's sole use.
 
-        for match_id, start, end in matches:
-            if any(i in consumed for i in range(start, end)):
-                continue
+    Loads one if none is idle and fewer than ``NLP_MAX_PIPELINES`` exist,
+    otherwise waits for one. ``profile`` defaults to ``NLP_PROFILE``. Do not
+    nest checkouts of the same model and profile in one thread.
+    """
+    return _pool(model, profile).checkout()
 
-            for i in range(start, end):
-                consumed.add(i)
 
-            label = nlp.vocab.strings[match_id]
-            tokens.append(label.lower())
+def pipeline_id(model: str = DEFAULT_MODEL, profile: Optional[str] = None) -> str:
+    """Return a string identifying the tokens a pipeline produces.
 
-        for i, token in enumerate(doc):
-            if i in consumed:
-                continue
-            if (not strict or token.is_alpha) and not token.is_stop:
-                tokens.append(token.lemma_)
+    Keys the token cache and the lexicon, so results of another model,
+    version, profile or rule set are never reused.
+    """
+    pool = _pool(model, profile)
+    if pool.meta_version is None:
+        with pool.checkout():
+            pass
+    return (
+        f"{model}=={pool.meta_version}/{pool.key[1]}"
+        f"/spacy=={spacy.__version__}/{_RULES_DIGEST}"
+    )
 
+
+def _rule_matches(lemmas: List[str], adjs: List[bool]) -> List[Tuple[str, int, int]]:
+    """Return the Matcher rules' ``(label, start, end)`` matches, all of them."""
+    found = []
+    for start, lemma in enumerate(lemmas):
+        if lemma in _SPONSOR:
+            found.append(("SPONSOR", start, start + 1))
+        if lemma not in _COMPOUND_FIRST:
+            continue
+        for end in range(start + 1, len(lemmas)):
+            if lemmas[end] in _COMPOUND_LAST:
+                found.append(("COMPOUND", start, end + 1))
+            if not adjs[end]:
+                break
+    # The Matcher reports matches as they complete, i.e. by end position.
+    return sorted(found, key=lambda m: (m[2], m[1]))
+
+
+def _assemble(
+    matches: List[Tuple[str, int, int]],
+    words: List[Tuple[str, bool, bool]],
+    strict: bool,
+) -> List[str]:
+    """Build tokens from rule matches and ``(lemma, is_alpha, is_stop)``."""
+    consumed = set()
+    tokens: List[str] = []
+
+    matches = sorted(matches, key=lambda m: m[2] - m[1], reverse=True)
+
+    for label, start, end in matches:
+        if any(i in consumed for i in range(start, end)):
+            continue
+
+        for i in range(start, end):
+            consumed.add(i)
+
+        tokens.append(label.lower())
+
+    for i, (lemma, is_alpha, is_stop) in enumerate(words):
+        if i in consumed:
+            continue
+        if (not strict or is_alpha) and not is_stop:
+            tokens.append(lemma)
+
+    return tokens
+
+
+class TextTokenizer:
+    """spaCy tokenizer producing lemma tokens plus ``compound``/``sponsor``.
+
+    ``learn=True`` records every analysis in the :mod:`lexicon` and
+    ``cache=True`` reuses results through the :mod:`token_cache` (the indexer
+    does both). ``fast=True`` first tries the lexicon, which gives the same
+    tokens as the full pipeline without running it, and falls back to the
+    pipeline when a token is unknown (the query path does this).
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        fast: bool = False,
+        learn: bool = False,
+        profile: Optional[str] = None,
+        cache: bool = False,
+    ):
+        self.model = model
+        self.fast = fast
+        self.learn = learn
+        self.profile = profile
+        self.cache = cache
+        self._pipeline_id: Optional[str] = None
+
+    def _get_pipeline_id(self) -> str:
+        if self._pipeline_id is None:
+            self._pipeline_id = pipeline_id(self.model, self.profile)
+        return self._pipeline_id
+
+    def _tokenize_fast(self, text: str, strict: bool) -> Optional[List[str]]:
+        key = self._get_pipeline_id()
+        with use_pipeline(self.model, self.profile) as (nlp, _):
+            # Segmentation and lexeme flags need no model inference.
+            doc = nlp.make_doc(text.lower())
+            entries = lexicon.lookup(key, (token.text for token in doc))
+            if entries is None:
+                return None
+
+            lemmas = [entries[token.text][0] for token in doc]
+            adjs = [entries[token.text][1] for token in doc]
+            words = [
+                (lemma, token.is_alpha, token.is_stop)
+                for lemma, token in zip(lemmas, doc)
+            ]
+        return _assemble(_rule_matches(lemmas, adjs), words, strict)
+
+    def tokenize(self, text: str, strict: bool = True) -> List[str]:
+        if self.fast:
+            tokens = self._tokenize_fast(text, strict)
+            if tokens is not None:
+                return tokens
+
+        if not self.cache:
+            return self._tokenize(text, strict)
+
+        key = token_cache.key_for(self._get_pipeline_id(), text, strict)
+        tokens = token_cache.get(key)
+        if tokens is None:
+            tokens = self._tokenize(text, strict)
+            token_cache.put(key, tokens)
         return tokens
+
+    def _tokenize(self, text: str, strict: bool) -> List[str]:
+        key = self._get_pipeline_id() if self.learn else None
+        with use_pipeline(self.model, self.profile) as (nlp, matcher):
+            doc = nlp(text.lower())
+            if key is not None:
+                lexicon.observe(key, doc)
+
+            matches = [
+                (nlp.vocab.strings[match_id], start, end)
+                for match_id, start, end in matcher(doc)
+            ]
+            words = [
+                (token.lemma_, token.is_alpha, token.is_stop) for token in doc
+            ]
+        return _assemble(matches, words, strict)
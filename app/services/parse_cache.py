@@ -0,0 +1,217 @@
+"""On-disk cache of CE ``parse_result`` payloads.
+
+Re-indexing the same bytes (a tokenizer change, a retried FAILED job) does not
+need another round trip to the parser. Entries are keyed by the SHA-256 of
+the file contents plus the parser version and the request metadata, and are
+stored as zlib-compressed JSON under ``PARSE_CACHE_DIR``.
+
+The cache is bounded by ``PARSE_CACHE_MAX_BYTES``. A hit touches the entry's
+mtime, and when a write pushes the total over the bound the least recently
+used entries are evicted. Hit / miss counters are logged as a structured
+``parse_cache.stats`` record every ``PARSE_CACHE_STATS_EVERY`` lookups.
+
+Cache failures are never fatal: any read or write error is logged and treated
+as a miss.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zlib
+from importlib import metadata as importlib_metadata
+from typing import Dict, Optional
+
+from talkingdb.logger.console import logger
+
+from app.core import config
+
+
+_FORMAT_VERSION = 1
+_SUFFIX = ".json.z"
+
+
+def _parser_version() -> str:
+    """Return the installed CE client version, or an explicit override."""
+    if config.PARSE_CACHE_PARSER_VERSION:
+        return config.PARSE_CACHE_PARSER_VERSION
+
+    for dist in importlib_metadata.packages_distributions().get("talkingdb_ce", []):
+        try:
+            return f"{dist}=={importlib_metadata.version(dist)}"
+        except importlib_metadata.PackageNotFoundError:
+            continue
+    return "unknown"
+
+
+class ParseCache:
+    """Size-bounded, content-addressed store of parse results."""
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.parser_version = _parser_version()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._size_bytes: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    # ------------------------------------------------------------------ keys
+    def key_for(self, temp_path: str, metadata_json: str) -> str:
+        """Return the cache key for a spooled file and its request metadata."""
+        digest = hashlib.sha256()
+        with open(temp_path, "rb") as fh:
+            for block in iter(lambda: fh.read(1024 * 1024), b""):
+                digest.update(block)
+
+        try:
+            metadata_key = json.dumps(json.loads(metadata_json), sort_keys=True)
+        except ValueError:
+            metadata_key = metadata_json
+
+        key = hashlib.sha256()
+        key.update(f"v{_FORMAT_VERSION}\0{self.parser_version}\0".encode())
+        key.update(digest.digest())
+        key.update(metadata_key.encode())
+        return key.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + _SUFFIX)
+
+    # ------------------------------------------------------------- get / put
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached payload for ``key``, or ``None`` on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                payload = json.loads(zlib.decompress(fh.read()))
+            os.utime(path)
+        except FileNotFoundError:
+            payload = None
+        except Exception as exc:
+            logger.warning(f"[parse-cache] unreadable entry {key}: {exc}")
+            size = self._size_of(path)
+            if self._remove(path):
+                with self._lock:
+                    if self._size_bytes is not None:
+                        self._size_bytes -= size
+            payload = None
+
+        self._record(hit=payload is not None)
+        return payload
+
+    def put(self, key: str, payload: dict) -> None:
+        """Store ``payload`` under ``key`` and evict down to the size bound."""
+        path = self._path(key)
+        try:
+            blob = zlib.compress(
+                json.dumps(payload, separators=(",", ":")).encode(), 6
+            )
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(blob)
+            replaced = self._size_of(path)
+            os.replace(tmp, path)
+        except Exception as exc:
+            logger.warning(f"[parse-cache] write failed for {key}: {exc}")
+            return
+
+        with self._lock:
+            if self._size_bytes is not None:
+                self._size_bytes += len(blob) - replaced
+            over = self._current_size() > self.max_bytes
+
+        if over:
+            self._evict()
+
+    # -------------------------------------------------------------- eviction
+    def _entries(self):
+        """Yield ``(mtime, size, path)`` for every cache entry."""
+        if not os.path.isdir(self.directory):
+            return
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(_SUFFIX):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield st.st_mtime, st.st_size, entry.path
+
+    def _current_size(self) -> int:
+        """Return the cached total size; the caller holds the lock."""
+        if self._size_bytes is None:
+            self._size_bytes = sum(size for _, size, _ in self._entries())
+        return self._size_bytes
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until under 90% of the bound."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * 0.9)
+            evicted = 0
+
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                if self._remove(path):
+                    total -= size
+                    evicted += 1
+
+            self._size_bytes = total
+
+        logger.info(f"[parse-cache] evicted {evicted} entries, {total} bytes kept")
+
+    @staticmethod
+    def _size_of(path: str) -> int:
+        """Return the size of the entry at ``path``, 0 if there is none."""
+        try:
+            return os.stat(path).st_size
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.unlink(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    # --------------------------------------------------------------- metrics
+    def _record(self, *, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+            lookups = self._hits + self._misses
+            emit = lookups % max(config.PARSE_CACHE_STATS_EVERY, 1) == 0
+
+        if emit:
+            logger.info(json.dumps({"event": "parse_cache.stats", **self.stats()}))
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit / miss counters and the hit rate since startup."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "size_bytes": self._size_bytes,
+            }
+
+
+parse_cache = ParseCache(config.PARSE_CACHE_DIR, config.PARSE_CACHE_MAX_BYTES)
@@ -0,0 +1,275 @@
+"""Long-lived CE parser clients shared by all parse workers.
+
+``PARSE_MAX_CONCURRENCY`` parse lanes live for the whole process. Each lane
+is a thread running its own persistent event loop with one :class:`CEClient`
+built on it, so jobs reuse the lane's client and connections instead of
+paying for a fresh event loop, client and TLS handshake each time.
+
+Worker threads submit parse requests to a separate control loop, which hands
+each request to an idle lane, bounds it by ``PARSE_REQUEST_TIMEOUT_SECONDS``
+and cancels it on request. The control loop only ever awaits the lanes, so a
+``parse_file`` that does blocking I/O inside its coroutine stalls its own
+lane, not the other parses, and the timeout still fires on time. A lane whose
+request timed out while blocked stays busy until the call returns; no new
+request is handed to it meanwhile.
+
+Callers block on the result while still running ``ctx.checkpoint()`` at the
+heartbeat cadence, so cancel and timeout signals reach an in-flight parse:
+the request is cancelled and the control-flow exception propagates as usual.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future, wait
+from typing import Any, Callable, List, Optional
+
+from starlette.datastructures import UploadFile
+
+from talkingdb.helpers.client import config as ce_config
+from talkingdb.logger.console import logger
+from talkingdb.models.metadata.metadata import Metadata
+from talkingdb_ce.client import CEClient
+
+from app.core import config
+from app.services.job_context import JobContext, JobControl
+
+
+class ParseTimeout(Exception):
+    """Raised when one CE parse request exceeds its timeout."""
+
+
+def _default_client() -> CEClient:
+    return CEClient(ce_config)
+
+
+class _Lane:
+    """One parse lane: a thread running a persistent loop and its client."""
+
+    def __init__(self, name: str, client_factory: Callable[[], Any]):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name=name, daemon=True
+        )
+        self.thread.start()
+        self.client = asyncio.run_coroutine_threadsafe(
+            self._build(client_factory), self.loop
+        ).result()
+
+    @staticmethod
+    async def _build(client_factory: Callable[[], Any]) -> Any:
+        return client_factory()
+
+    def submit(
+        self, upload: UploadFile, metadata: Metadata, on_done: Callable[[], None]
+    ) -> Future:
+        """Run one parse on this lane and return its future.
+
+        The lane closes ``upload`` and calls ``on_done`` once the call has
+        really finished, however the returned future was settled; cancelling
+        the future cancels the call as soon as the lane's loop gets to it.
+        """
+        result: Future = Future()
+
+        def finish(task: Optional[asyncio.Task]) -> None:
+            upload.file.close()
+            on_done()
+            if result.done():
+                return
+            if task is None or task.cancelled():
+                result.cancel()
+            elif task.exception() is not None:
+                result.set_exception(task.exception())
+            else:
+                result.set_result(task.result())
+
+        def run() -> None:
+            if result.cancelled():
+                finish(None)
+                return
+            try:
+                task = self.loop.create_task(
+                    self.client.parse_file(file=upload, metadata=metadata)
+                )
+            except BaseException as exc:
+                result.set_exception(exc)
+                finish(None)
+                return
+            task.add_done_callback(finish)
+            result.add_done_callback(
+                lambda f: f.cancelled() and self.loop.call_soon_threadsafe(task.cancel)
+            )
+
+        self.loop.call_soon_threadsafe(run)
+        return result
+
+    async def _close(self) -> None:
+        client, self.client = self.client, None
+        closer = getattr(client, "aclose", None) or getattr(client, "close", None)
+        if closer is not None:
+            result = closer()
+            if asyncio.iscoroutine(result):
+                await result
+
+    def stop(self) -> None:
+        """Close the client and stop the loop, leaving a blocked lane behind."""
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), self.loop).result(
+                timeout=5
+            )
+        except Exception:
+            logger.exception(f"[parser] {self.thread.name} close failed")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        if self.thread.is_alive():
+            logger.warning(f"[parser] {self.thread.name} still busy at shutdown")
+        else:
+            self.loop.close()
+
+
+class ParserClient:
+    """Submit CE parse requests from worker threads to the parse lanes.
+
+    ``client_factory`` builds one client per lane, on that lane's loop; pass
+    one pointing at a local stand-in server to exercise the lanes in tests.
+    """
+
+    def __init__(self, client_factory: Callable[[], Any] = _default_client):
+        self._client_factory = client_factory
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lanes: List[_Lane] = []
+        self._idle: Optional[asyncio.Queue] = None
+
+    # -------------------------------------------------------------- lifecycle
+    def start(self) -> None:
+        """Start the control loop and the parse lanes. Idempotent."""
+        with self._lock:
+            if self._loop is not None:
+                return
+
+            lanes = [
+                _Lane(f"tdb-ce-lane-{i}", self._client_factory)
+                for i in range(max(config.PARSE_MAX_CONCURRENCY, 1))
+            ]
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="tdb-ce-loop", daemon=True
+            )
+            thread.start()
+
+            asyncio.run_coroutine_threadsafe(self._open(lanes), loop).result()
+            self._loop = loop
+            self._thread = thread
+            self._lanes = lanes
+            logger.info(f"[parser] client started with {len(lanes)} lanes")
+
+    def stop(self) -> None:
+        """Stop the control loop, then close every lane's client and loop."""
+        with self._lock:
+            loop, thread, lanes = self._loop, self._thread, self._lanes
+            if loop is None:
+                return
+            self._loop = None
+            self._thread = None
+            self._lanes = []
+
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout=5)
+        loop.close()
+        for lane in lanes:
+            lane.stop()
+        logger.info("[parser] client stopped")
+
+    async def _open(self, lanes: List[_Lane]) -> None:
+        """Create the idle-lane queue on the control loop thread."""
+        self._idle = asyncio.Queue()
+        for lane in lanes:
+            self._idle.put_nowait(lane)
+
+    # ------------------------------------------------------------------ parse
+    def parse(
+        self,
+        temp_path: str,
+        filename: str,
+        metadata: Metadata,
+        ctx: Optional[JobContext] = None,
+    ) -> dict:
+        """Parse a spooled file, blocking the calling thread until done."""
+        upload = UploadFile(filename=filename, file=open(temp_path, "rb"))
+        try:
+            future = self.submit(upload, metadata)
+        except BaseException:
+            upload.file.close()
+            raise
+        return self.wait(future, ctx)
+
+    def submit(self, upload: UploadFile, metadata: Metadata) -> Future:
+        """Schedule one parse request and return its future.
+
+        The request owns ``upload`` from here on: its file is closed when
+        the request finishes, fails or is cancelled, never while a lane may
+        still be reading it.
+        """
+        self.start()
+        with self._lock:
+            loop = self._loop
+        if loop is None:
+            raise RuntimeError("parser client is stopped")
+        coro = self._parse(upload, metadata)
+        try:
+            return asyncio.run_coroutine_threadsafe(coro, loop)
+        except BaseException:
+            coro.close()
+            raise
+
+    def wait(self, future: Future, ctx: Optional[JobContext] = None) -> Any:
+        """Wait for ``future``, checkpointing ``ctx`` while it runs.
+
+        A cancel or timeout signal raised by the checkpoint cancels the
+        request before propagating.
+        """
+        while True:
+            done, _ = wait([future], timeout=config.HEARTBEAT_MIN_GAP_SECONDS)
+            if done:
+                return future.result()
+            if ctx is None:
+                continue
+            try:
+                ctx.checkpoint()
+            except JobControl:
+                future.cancel()
+                raise
+
+    async def _parse(self, upload: UploadFile, metadata: Metadata) -> dict:
+        try:
+            lane = await self._idle.get()
+        except BaseException:
+            upload.file.close()
+            raise
+
+        # The lane goes back to the idle queue only once its call has really
+        # returned, not when the control side gives up on it.
+        loop = asyncio.get_running_loop()
+        request = lane.submit(upload, metadata, lambda: self._release(loop, lane))
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(request),
+                timeout=config.PARSE_REQUEST_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            raise ParseTimeout(
+                f"CE parse exceeded PARSE_REQUEST_TIMEOUT_SECONDS="
+                f"{config.PARSE_REQUEST_TIMEOUT_SECONDS}"
+            ) from None
+
+    def _release(self, loop: asyncio.AbstractEventLoop, lane: _Lane) -> None:
+        """Return ``lane`` to the idle queue from the lane's thread."""
+        try:
+            loop.call_soon_threadsafe(self._idle.put_nowait, lane)
+        except RuntimeError:
+            pass  # control loop already closed by stop()
+
+
+parser_client = ParserClient()
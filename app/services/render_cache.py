@@ -0,0 +1,200 @@
+"""Rendered graph viewer responses, cached per graph version.
+
+The viewer page (``GET /index/html``) and the JSON slices behind it are pure
+functions of one graph version (:func:`graph_store.version`) and the request
+parameters. Each is rendered once, compressed once (gzip, plus brotli when
+the ``brotli`` package is installed) and kept in a per-process LRU bounded
+by ``VIEWER_RENDER_CACHE_MAX_BYTES``.
+
+Every response carries a strong ``ETag`` built from the graph id, its
+version, the request key and a digest of the renderer (the source of the
+modules producing the bodies and their config), so any worker process
+derives the same tag without rendering. A request whose ``If-None-Match``
+names the current tag is answered with 304 after a single indexed read.
+
+Writes bump the version, which never starts over, and
+:func:`graph_store.live_version` fails for a tombstoned, reclaimed or unknown
+graph, so a changed or rolled-back graph never matches a cached entry or an
+``If-None-Match`` (``*`` included); stale entries of that graph are dropped
+on the next lookup.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from app.core import config
+from app.core.sqlite_pool import sqlite_conn
+from app.services import graph_html, graph_layout, graph_store, graph_view
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+
+# Modules whose code shapes a cached body: the viewer page, the JSON slices
+# and the node positions in both.
+_RENDERER_MODULES = (graph_html, graph_view, graph_layout)
+
+# Bodies smaller than this are not worth compressing.
+_COMPRESS_MIN_BYTES = 1024
+
+_ENCODING_SUFFIX = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+
+def _renderer_digest() -> str:
+    """Digest of everything besides the graph that shapes a rendering."""
+    h = hashlib.sha1()
+    for module in _RENDERER_MODULES:
+        h.update(Path(module.__file__).read_bytes())
+    for name in sorted(vars(config)):
+        if name.startswith(("VIEWER_", "GRAPH_LAYOUT_")):
+            h.update(f"{name}={getattr(config, name)}".encode())
+    return h.hexdigest()[:10]
+
+
+_RENDERER = _renderer_digest()
+
+
+@dataclass
+class Rendered:
+    tag: str
+    media_type: str
+    bodies: Dict[str, bytes]
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[Tuple[str, str], Rendered]" = OrderedDict()
+_bytes = 0
+
+
+# ------------------------------------------------------------------- tags
+def tag(graph_id: str, version: int, key: str) -> str:
+    """Return the base entity tag (unquoted, identity encoding)."""
+    digest = hashlib.sha1(key.encode()).hexdigest()[:10]
+    return f"{graph_id}.{version}.{_RENDERER}.{digest}"
+
+
+def etag(base: str, encoding: str) -> str:
+    """Return the quoted strong ETag of one encoding of ``base``."""
+    return f'"{base}{_ENCODING_SUFFIX[encoding]}"'
+
+
+def matches(if_none_match: Optional[str], base: str) -> Optional[str]:
+    """Return the tag in ``If-None-Match`` naming ``base``, if any.
+
+    ``If-None-Match`` uses weak comparison, so any encoding of ``base``
+    counts.
+    """
+    if not if_none_match:
+        return None
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        opaque = candidate[2:] if candidate.startswith("W/") else candidate
+        opaque = opaque.strip('"')
+        for suffix in _ENCODING_SUFFIX.values():
+            if suffix and opaque.endswith(suffix):
+                opaque = opaque[: -len(suffix)]
+                break
+        if opaque == base or candidate == "*":
+            return candidate
+    return None
+
+
+def negotiate(accept_encoding: Optional[str], rendered: Rendered) -> str:
+    """Pick the best stored encoding the client accepts."""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    for encoding in ("br", "gzip"):
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if encoding in rendered.bodies and q > 0:
+            return encoding
+    return "identity"
+
+
+# ------------------------------------------------------------------ cache
+def version(graph_id: str) -> int:
+    """Return the current version of a visible graph; KeyError otherwise."""
+    with sqlite_conn() as conn:
+        return graph_store.live_version(conn, graph_id)
+
+
+def _compress(body: bytes) -> Dict[str, bytes]:
+    bodies = {"identity": body}
+    if len(body) < _COMPRESS_MIN_BYTES:
+        return bodies
+    bodies["gzip"] = gzip.compress(body, compresslevel=6, mtime=0)
+    if brotli is not None:
+        bodies["br"] = brotli.compress(body, quality=5)
+    return bodies
+
+
+def _drop_graph(graph_id: str) -> None:
+    """Forget every entry of ``graph_id``; lock held."""
+    global _bytes
+    for key in [key for key in _entries if key[0] == graph_id]:
+        _bytes -= _entries.pop(key).size
+
+
+def evict(graph_id: str) -> None:
+    """Drop all cached renderings of ``graph_id``."""
+    with _lock:
+        _drop_graph(graph_id)
+
+
+def get(
+    graph_id: str,
+    version: int,
+    key: str,
+    render: Callable[[], Tuple[bytes, str]],
+) -> Rendered:
+    """Return the rendering of ``key`` for this graph version.
+
+    ``render`` returns ``(body, media_type)`` and only runs on a miss.
+    """
+    global _bytes
+    base = tag(graph_id, version, key)
+    with _lock:
+        hit = _entries.get((graph_id, key))
+        if hit is not None and hit.tag == base:
+            _entries.move_to_end((graph_id, key))
+            return hit
+        if hit is not None:
+            # The graph changed; every rendering of it is stale.
+            _drop_graph(graph_id)
+
+    body, media_type = render()
+    rendered = Rendered(base, media_type, _compress(body))
+
+    budget = max(config.VIEWER_RENDER_CACHE_MAX_BYTES, 0)
+    if rendered.size > budget:
+        return rendered
+    with _lock:
+        old = _entries.pop((graph_id, key), None)
+        if old is not None:
+            _bytes -= old.size
+        _entries[(graph_id, key)] = rendered
+        _bytes += rendered.size
+        while _bytes > budget and _entries:
+            _, dropped = _entries.popitem(last=False)
+            _bytes -= dropped.size
+    return rendered
@@ -0,0 +1,303 @@
+"""Process-shared dictionary of symbol strings to stable integer ids.
+
+Symbols (lemmas and ``a_b_c`` n-grams from :class:`SymbolGenerator`, plus
+key/value ids from ``max_gram``) are stored once in the ``symbols`` table and
+referenced everywhere else by integer id: as graph node keys, in stored
+graph blobs and in the graph cache. Ids are assigned by SQLite
+(``INTEGER PRIMARY KEY`` + ``UNIQUE`` symbol), so every worker process agrees
+on them.
+
+The indexer calls :meth:`SymbolTable.intern_many` (assigning ids to new
+symbols); the query path calls :meth:`SymbolTable.lookup_many`, which never
+writes - a query symbol without an id cannot be in any graph. Both go through
+a bounded in-process cache.
+
+Symbols no graph references any more (their graphs were reclaimed) are
+garbage-collected by the job daemon: :func:`begin_mark` / :func:`mark`
+record the ids every stored graph uses and :func:`sweep` deletes the rest.
+Each row's ``used_at`` is refreshed by :meth:`SymbolTable.intern_many` at
+most every ``_TOUCH_SECONDS`` per process, and the sweep spares symbols used
+since the mark started (less a job's maximum duration), so ids handed to an
+indexing job are not collected before its graph is saved. A cached id whose
+row was collected is noticed when it is next touched and interned again.
+The row with the highest id is never deleted, so SQLite never reuses an id,
+and every sweep bumps the ``symbols`` generation so other processes drop
+their symbol-to-id cache.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List
+
+import networkx as nx
+
+from app.core import config
+from app.core.sqlite_pool import sqlite_conn
+from app.services import generations
+from app.services.package_symbol_generator import gram_type
+
+
+# Stay under SQLite's host-parameter limit.
+_BATCH = 900
+
+# Graph attribute marking a graph whose symbol nodes are keyed by id.
+SYMBOL_IDS_ATTR = "symbol_ids"
+
+# How stale a symbol's ``used_at`` may get before interning refreshes it.
+_TOUCH_SECONDS = 3600
+
+_GENERATION = "symbols"
+
+# Graphs indexed before SYMBOL_NGRAM_ORDERS changed keep their old levels.
+_SYMBOL_TYPES = frozenset(
+    gram_type(n) for n in (1, 2, 3, *config.SYMBOL_NGRAM_ORDERS)
+)
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Create the symbol table."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS symbols (
+            id      INTEGER PRIMARY KEY,
+            symbol  TEXT NOT NULL UNIQUE,
+            used_at INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(symbols)")}
+    if "used_at" not in columns:
+        conn.execute(
+            "ALTER TABLE symbols ADD COLUMN used_at INTEGER NOT NULL DEFAULT 0"
+        )
+
+
+def is_symbol_node(data: dict) -> bool:
+    """Return whether node attributes describe a symbol-space node."""
+    return (
+        data.get("type") in _SYMBOL_TYPES
+        or bool(data.get("is_key"))
+        or bool(data.get("is_val"))
+    )
+
+
+class SymbolTable:
+    """Cached access to the ``symbols`` table."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._symbols: Dict[int, str] = {}
+        # id -> when this process last refreshed its used_at
+        self._touched: Dict[int, float] = {}
+        self._generation = generations.Generation(_GENERATION)
+
+    # ----------------------------------------------------------------- cache
+    def _remember(self, pairs: Dict[str, int], touched_at: float = 0.0) -> None:
+        with self._lock:
+            if len(self._ids) + len(pairs) > config.SYMBOL_CACHE_MAX_ENTRIES:
+                self._clear()
+            self._ids.update(pairs)
+            self._symbols.update((i, s) for s, i in pairs.items())
+            if touched_at:
+                self._touched.update((i, touched_at) for i in pairs.values())
+
+    def _clear(self) -> None:
+        """Drop every cached pair; lock held."""
+        self._ids.clear()
+        self._symbols.clear()
+        self._touched.clear()
+
+    def _cached(
+        self, conn: sqlite3.Connection, symbols: Iterable[str]
+    ) -> Dict[str, int]:
+        if self._generation.changed(conn):
+            with self._lock:
+                self._clear()
+        with self._lock:
+            return {s: self._ids[s] for s in symbols if s in self._ids}
+
+    # ---------------------------------------------------------------- lookup
+    @staticmethod
+    def _select(conn: sqlite3.Connection, symbols: List[str]) -> Dict[str, int]:
+        found: Dict[str, int] = {}
+        for start in range(0, len(symbols), _BATCH):
+            batch = symbols[start:start + _BATCH]
+            marks = ", ".join(["?"] * len(batch))
+            for row in conn.execute(
+                f"SELECT id, symbol FROM symbols WHERE symbol IN ({marks})",
+                batch,
+            ):
+                found[row[1]] = row[0]
+        return found
+
+    def lookup_many(self, symbols: Iterable[str]) -> Dict[str, int]:
+        """Return ids of already-known symbols; unknown ones are absent."""
+        wanted = list(dict.fromkeys(symbols))
+        with sqlite_conn() as conn:
+            found = self._cached(conn, wanted)
+            missing = [s for s in wanted if s not in found]
+            if missing:
+                fetched = self._select(conn, missing)
+                self._remember(fetched)
+                found.update(fetched)
+        return found
+
+    def _touch(
+        self, conn: sqlite3.Connection, found: Dict[str, int], now: float
+    ) -> List[str]:
+        """Refresh ``used_at`` of stale cached ids; return collected symbols."""
+        with self._lock:
+            stale = [
+                (s, i) for s, i in found.items()
+                if now - self._touched.get(i, 0.0) >= _TOUCH_SECONDS
+            ]
+        gone: List[str] = []
+        for start in range(0, len(stale), _BATCH):
+            batch = stale[start:start + _BATCH]
+            marks = ", ".join(["?"] * len(batch))
+            ids = [i for _, i in batch]
+            conn.execute(
+                f"UPDATE symbols SET used_at = ? WHERE id IN ({marks})",
+                [int(now), *ids],
+            )
+            alive = {
+                row[0]
+                for row in conn.execute(
+                    f"SELECT id FROM symbols WHERE id IN ({marks})", ids
+                )
+            }
+            gone.extend(s for s, i in batch if i not in alive)
+
+        with self._lock:
+            self._touched.update((i, now) for _, i in stale)
+            for symbol in gone:
+                self._symbols.pop(self._ids.pop(symbol, None), None)
+        return gone
+
+    def intern_many(self, symbols: Iterable[str]) -> Dict[str, int]:
+        """Return ids for ``symbols``, assigning ids to new ones."""
+        wanted = list(dict.fromkeys(symbols))
+        now = time.time()
+        with sqlite_conn() as conn:
+            found = self._cached(conn, wanted)
+            for symbol in self._touch(conn, found, now):
+                del found[symbol]
+            missing = [s for s in wanted if s not in found]
+            if missing:
+                conn.executemany(
+                    """
+                    INSERT INTO symbols (symbol, used_at) VALUES (?, ?)
+                    ON CONFLICT(symbol) DO UPDATE SET used_at = excluded.used_at
+                    """,
+                    ((s, int(now)) for s in missing),
+                )
+                fetched = self._select(conn, missing)
+                self._remember(fetched, now)
+                found.update(fetched)
+        return found
+
+    def resolve_many(self, ids: Iterable[int]) -> Dict[int, str]:
+        """Return symbol strings for ids; unknown ids are absent."""
+        wanted = list(dict.fromkeys(ids))
+        with self._lock:
+            found = {i: self._symbols[i] for i in wanted if i in self._symbols}
+        missing = [i for i in wanted if i not in found]
+        if not missing:
+            return found
+
+        with sqlite_conn() as conn:
+            for start in range(0, len(missing), _BATCH):
+                batch = missing[start:start + _BATCH]
+                marks = ", ".join(["?"] * len(batch))
+                for row in conn.execute(
+                    f"SELECT id, symbol FROM symbols WHERE id IN ({marks})",
+                    batch,
+                ):
+                    found[row[0]] = row[1]
+        return found
+
+    # ---------------------------------------------------------------- graphs
+    def convert_graph(self, graph: nx.Graph) -> None:
+        """Re-key string symbol nodes of ``graph`` to ids, in place.
+
+        Used to migrate graphs written before symbols had ids.
+        """
+        names = [
+            node for node, data in graph.nodes(data=True)
+            if isinstance(node, str) and is_symbol_node(data)
+        ]
+        nx.relabel_nodes(graph, self.intern_many(names), copy=False)
+        graph.graph[SYMBOL_IDS_ATTR] = True
+
+    def attach_labels(self, graph: nx.Graph) -> None:
+        """Set each id-keyed node's ``label`` to its symbol string."""
+        ids = [node for node in graph.nodes if isinstance(node, int)]
+        for node, symbol in self.resolve_many(ids).items():
+            graph.nodes[node].setdefault("label", symbol)
+
+
+symbol_table = SymbolTable()
+
+
+# ------------------------------------------------------------ garbage collection
+def begin_mark(conn: sqlite3.Connection) -> None:
+    """Start a new mark: forget the ids recorded by the previous one."""
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS symbol_refs (id INTEGER PRIMARY KEY)"
+    )
+    conn.execute("DELETE FROM temp.symbol_refs")
+
+
+def is_marking(conn: sqlite3.Connection) -> bool:
+    """Return whether this connection still holds the current mark.
+
+    The mark lives in a temporary table, so it is lost when the pooled
+    connection is replaced.
+    """
+    return conn.execute(
+        "SELECT 1 FROM sqlite_temp_master WHERE name = 'symbol_refs'"
+    ).fetchone() is not None
+
+
+def mark(conn: sqlite3.Connection, ids: Iterable[int]) -> None:
+    """Record ``ids`` as referenced by a stored graph."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO temp.symbol_refs (id) VALUES (?)",
+        ((i,) for i in ids),
+    )
+
+
+def sweep(marked_at: float, batch_rows: int) -> int:
+    """Delete the symbols a mark started at ``marked_at`` did not record.
+
+    Symbols used since a job could have interned them before the mark are
+    kept. Runs ``batch_rows`` deletions per transaction on the connection
+    that holds the mark, drops the mark and returns the number removed.
+    """
+    unused_before = marked_at - config.MAX_JOB_DURATION_SECONDS - _TOUCH_SECONDS
+    removed = 0
+    while True:
+        with sqlite_conn() as conn:
+            deleted = conn.execute(
+                """
+                DELETE FROM symbols WHERE id IN (
+                    SELECT id FROM symbols
+                    WHERE used_at < ?
+                      AND id NOT IN (SELECT id FROM temp.symbol_refs)
+                      AND id < (SELECT MAX(id) FROM symbols)
+                    LIMIT ?
+                )
+                """,
+                (int(unused_before), batch_rows),
+            ).rowcount
+            if deleted:
+                generations.bump(conn, _GENERATION)
+        removed += deleted
+        if deleted < batch_rows:
+            break
+
+    with sqlite_conn() as conn:
+        conn.execute("DROP TABLE IF EXISTS temp.symbol_refs")
+    return removed
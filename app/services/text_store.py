@@ -0,0 +1,120 @@
+"""Element text kept outside the in-memory graph.
+
+Paragraph text, table HTML and key/value texts are written to the
+``graph_texts`` table keyed by ``(graph_id, node_id)`` instead of living as
+node attributes, so cached graphs hold only topology and types. Readers fetch
+text for the handful of nodes they actually return with one batched query.
+
+Values longer than ``_COMPRESS_MIN_BYTES`` are zlib-compressed; a one-byte
+prefix records which encoding a row uses. ``node_id`` has no declared type so
+string and integer node keys round-trip unchanged.
+"""
+
+import sqlite3
+import zlib
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+_COMPRESS_MIN_BYTES = 64
+_RAW = b"r"
+_ZLIB = b"z"
+
+# SQLite's default limit on host parameters is 32766; two per pair.
+_FETCH_BATCH = 4096
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Create the text table."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS graph_texts (
+            graph_id TEXT NOT NULL,
+            node_id  NOT NULL,
+            text     BLOB NOT NULL,
+            PRIMARY KEY (graph_id, node_id)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _pack(text: str) -> bytes:
+    raw = text.encode()
+    if len(raw) < _COMPRESS_MIN_BYTES:
+        return _RAW + raw
+    return _ZLIB + zlib.compress(raw, 6)
+
+
+def _unpack(blob: bytes) -> str:
+    blob = bytes(blob)
+    if blob[:1] == _ZLIB:
+        return zlib.decompress(blob[1:]).decode()
+    return blob[1:].decode()
+
+
+def put_many(
+    conn: sqlite3.Connection, graph_id: str, items: Iterable[Tuple[Any, str]]
+) -> int:
+    """Upsert ``(node_id, text)`` pairs for one graph; return the row count."""
+    rows = [(graph_id, node_id, _pack(text)) for node_id, text in items]
+    conn.executemany(
+        "INSERT OR REPLACE INTO graph_texts (graph_id, node_id, text) "
+        "VALUES (?, ?, ?)",
+        rows,
+    )
+    return len(rows)
+
+
+def fetch(
+    conn: sqlite3.Connection, keys: Iterable[Tuple[str, Any]]
+) -> Dict[Tuple[str, Any], str]:
+    """Return texts for ``(graph_id, node_id)`` keys; missing keys are absent."""
+    keys = list(dict.fromkeys(keys))
+    found: Dict[Tuple[str, Any], str] = {}
+
+    for start in range(0, len(keys), _FETCH_BATCH):
+        batch = keys[start:start + _FETCH_BATCH]
+        values = ", ".join(["(?, ?)"] * len(batch))
+        params: List[Any] = [part for key in batch for part in key]
+        for row in conn.execute(
+            "SELECT graph_id, node_id, text FROM graph_texts "
+            f"WHERE (graph_id, node_id) IN (VALUES {values})",
+            params,
+        ):
+            found[(row[0], row[1])] = _unpack(row[2])
+
+    return found
+
+
+def fetch_graph(conn: sqlite3.Connection, graph_id: str) -> Dict[Any, str]:
+    """Return every stored text of one graph, keyed by node id."""
+    return {
+        row[0]: _unpack(row[1])
+        for row in conn.execute(
+            "SELECT node_id, text FROM graph_texts WHERE graph_id = ?",
+            (graph_id,),
+        )
+    }
+
+
+def delete_nodes(
+    conn: sqlite3.Connection, graph_id: str, node_ids: Iterable[Any]
+) -> None:
+    """Remove the texts of some nodes of one graph."""
+    conn.executemany(
+        "DELETE FROM graph_texts WHERE graph_id = ? AND node_id = ?",
+        ((graph_id, node_id) for node_id in node_ids),
+    )
+
+
+def delete_batch(conn: sqlite3.Connection, graph_id: str, limit: int) -> int:
+    """Remove up to ``limit`` texts of one graph; return how many went."""
+    return conn.execute(
+        "DELETE FROM graph_texts WHERE graph_id = ? AND node_id IN ("
+        "SELECT node_id FROM graph_texts WHERE graph_id = ? LIMIT ?)",
+        (graph_id, graph_id, limit),
+    ).rowcount
+
+
+def delete(conn: sqlite3.Connection, graph_id: str) -> None:
+    """Remove all texts of one graph."""
+    conn.execute("DELETE FROM graph_texts WHERE graph_id = ?", (graph_id,))
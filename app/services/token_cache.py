@@ -0,0 +1,305 @@
+"""Cache of :meth:`TextTokenizer.tokenize` results shared across documents.
+
+Boilerplate (inclusion criteria, standard table headers, sponsor statements)
+recurs across thousands of documents, and every occurrence used to go through
+the full spaCy pipeline again. Results are now kept at two levels:
+
+  * an in-process LRU of ``TOKEN_MEMO_MAX_ENTRIES`` texts, and
+  * the ``token_cache`` table in the shared SQLite database, so every
+    ingestion worker process reuses what any of them tokenized.
+
+Entries are keyed by a digest of the text, the ``strict`` flag and the
+pipeline's identity (model name and version, profile, spaCy version and the
+tokenizer's rules), so a model upgrade never serves stale tokens. Writes and
+hit bookkeeping are buffered and written in batches by :meth:`flush` (the
+indexer calls it once per document).
+
+The table is bounded by ``TOKEN_CACHE_MAX_BYTES`` of token payload. Its
+total is kept in ``token_cache_size`` by the same transactions that insert
+and delete rows, so every worker sees what the others added. Eviction is by
+rank: the time of last use plus ``TOKEN_CACHE_HIT_CREDIT_SECONDS`` per
+recorded hit (capped), so entries that recur across many documents outlive
+recent one-offs. It deletes the lowest-ranked rows ``_EVICT_BATCH`` at a
+time, one short transaction each, without holding the cache's lock.
+``TOKEN_CACHE_MAX_BYTES=0`` keeps only the in-process memo.
+
+Cache failures are never fatal: any read or write error is logged and treated
+as a miss.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from talkingdb.logger.console import logger
+
+from app.core import config
+from app.core.sqlite_pool import sqlite_conn
+
+
+# Buffered writes that trigger a flush without waiting for the caller.
+_FLUSH_EVERY = 512
+
+# Hits beyond this no longer raise an entry's rank.
+_MAX_CREDITED_HITS = 16
+
+# Rows deleted per eviction transaction.
+_EVICT_BATCH = 500
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Create the token cache table."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS token_cache (
+            key    BLOB PRIMARY KEY,
+            tokens TEXT NOT NULL,
+            size   INTEGER NOT NULL,
+            hits   INTEGER NOT NULL DEFAULT 0,
+            rank   REAL NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_token_cache_rank ON token_cache (rank)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS token_cache_size (
+            id   INTEGER PRIMARY KEY CHECK (id = 0),
+            size INTEGER NOT NULL
+        )
+        """
+    )
+    # Tables created before the total was kept start from their contents.
+    conn.execute(
+        """
+        INSERT INTO token_cache_size (id, size)
+        SELECT 0, (SELECT COALESCE(SUM(size), 0) FROM token_cache)
+        WHERE NOT EXISTS (SELECT 1 FROM token_cache_size)
+        """
+    )
+
+
+def _add_size(conn: sqlite3.Connection, delta: int) -> int:
+    """Adjust the stored payload total inside the caller's transaction."""
+    conn.execute("UPDATE token_cache_size SET size = size + ?", (delta,))
+    row = conn.execute("SELECT size FROM token_cache_size").fetchone()
+    return row[0] if row is not None else 0
+
+
+def _rank(used_at: float, hits: int) -> float:
+    credit = max(config.TOKEN_CACHE_HIT_CREDIT_SECONDS, 0)
+    return used_at + credit * min(hits, _MAX_CREDITED_HITS)
+
+
+class TokenCache:
+    """Two-level, size-bounded store of tokenized texts."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._memo: "OrderedDict[bytes, Tuple[str, ...]]" = OrderedDict()
+        # key -> tokens, not yet written
+        self._pending: Dict[bytes, Tuple[str, ...]] = {}
+        # key -> hits since the last flush
+        self._touched: Dict[bytes, int] = {}
+        # Held by the one thread evicting; others skip eviction meanwhile.
+        self._evicting = threading.Lock()
+        self._memo_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    @property
+    def persistent(self) -> bool:
+        return config.TOKEN_CACHE_MAX_BYTES > 0
+
+    # ------------------------------------------------------------------ keys
+    @staticmethod
+    def key_for(namespace: str, text: str, strict: bool) -> bytes:
+        """Return the cache key of one ``tokenize(text, strict)`` call."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{namespace}\0{int(strict)}\0".encode())
+        digest.update(text.encode("utf-8", "surrogatepass"))
+        return digest.digest()
+
+    # ------------------------------------------------------------- get / put
+    def _memoize(self, key: bytes, tokens: Tuple[str, ...]) -> None:
+        """Remember ``tokens`` in-process; lock held."""
+        self._memo[key] = tokens
+        self._memo.move_to_end(key)
+        while len(self._memo) > max(config.TOKEN_MEMO_MAX_ENTRIES, 0):
+            self._memo.popitem(last=False)
+
+    def get(self, key: bytes) -> Optional[List[str]]:
+        """Return the cached tokens for ``key``, or ``None`` on a miss."""
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                tokens = self._memo[key]
+            else:
+                tokens = self._pending.get(key)
+            if tokens is not None:
+                self._memo_hits += 1
+                if self.persistent:
+                    self._touched[key] = self._touched.get(key, 0) + 1
+                return list(tokens)
+
+        if not self.persistent:
+            with self._lock:
+                self._misses += 1
+            return None
+
+        try:
+            with sqlite_conn() as conn:
+                row = conn.execute(
+                    "SELECT tokens FROM token_cache WHERE key = ?", (key,)
+                ).fetchone()
+            tokens = tuple(json.loads(row[0])) if row is not None else None
+        except Exception as exc:
+            logger.warning(f"[token-cache] read failed: {exc}")
+            tokens = None
+
+        with self._lock:
+            if tokens is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._memoize(key, tokens)
+            self._touched[key] = self._touched.get(key, 0) + 1
+            flush = len(self._touched) >= _FLUSH_EVERY
+        if flush:
+            self.flush()
+        return list(tokens)
+
+    def put(self, key: bytes, tokens: List[str]) -> None:
+        """Remember ``tokens`` for ``key``; written on the next flush."""
+        with self._lock:
+            self._memoize(key, tuple(tokens))
+            if not self.persistent:
+                return
+            self._pending[key] = tuple(tokens)
+            flush = len(self._pending) >= _FLUSH_EVERY
+        if flush:
+            self.flush()
+
+    # ---------------------------------------------------------------- writes
+    def flush(self) -> None:
+        """Write buffered entries and hits, then evict down to the bound."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            touched, self._touched = self._touched, {}
+        if not pending and not touched:
+            return
+
+        now = time.time()
+        try:
+            with sqlite_conn() as conn:
+                added = 0
+                for key, tokens in pending.items():
+                    payload = json.dumps(tokens, separators=(",", ":"))
+                    size = len(key) + len(payload)
+                    cursor = conn.execute(
+                        """
+                        INSERT OR IGNORE INTO token_cache (key, tokens, size, rank)
+                        VALUES (?, ?, ?, ?)
+                        """,
+                        (key, payload, size, _rank(now, 0)),
+                    )
+                    # Another worker may have written the same text first.
+                    if cursor.rowcount == 1:
+                        added += size
+                conn.executemany(
+                    """
+                    UPDATE token_cache
+                    SET hits = hits + ?,
+                        rank = ? + ? * MIN(hits + ?, ?)
+                    WHERE key = ?
+                    """,
+                    (
+                        (
+                            hits,
+                            now,
+                            max(config.TOKEN_CACHE_HIT_CREDIT_SECONDS, 0),
+                            hits,
+                            _MAX_CREDITED_HITS,
+                            key,
+                        )
+                        for key, hits in touched.items()
+                    ),
+                )
+                total = _add_size(conn, added)
+        except Exception as exc:
+            logger.warning(f"[token-cache] write failed: {exc}")
+            return
+
+        if total > config.TOKEN_CACHE_MAX_BYTES:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove the lowest-ranked entries until under 90% of the bound.
+
+        Runs in the flushing thread without the cache's lock, one batch of
+        at most ``_EVICT_BATCH`` rows per transaction; a thread that finds
+        another one evicting returns at once.
+        """
+        if not self._evicting.acquire(blocking=False):
+            return
+        target = int(config.TOKEN_CACHE_MAX_BYTES * 0.9)
+        entries = 0
+        total = 0
+        try:
+            while True:
+                with sqlite_conn() as conn:
+                    total = _add_size(conn, 0)
+                    if total <= target:
+                        break
+                    batch = conn.execute(
+                        "SELECT key, size FROM token_cache ORDER BY rank LIMIT ?",
+                        (_EVICT_BATCH,),
+                    ).fetchall()
+                    if not batch:
+                        break
+                    freed = 0
+                    for key, size in batch:
+                        if total - freed <= target:
+                            break
+                        cursor = conn.execute(
+                            "DELETE FROM token_cache WHERE key = ?", (key,)
+                        )
+                        # Rows another worker evicted first are not counted.
+                        if cursor.rowcount == 1:
+                            freed += size
+                            entries += 1
+                    total = _add_size(conn, -freed)
+        except Exception as exc:
+            logger.warning(f"[token-cache] eviction failed: {exc}")
+            return
+        finally:
+            self._evicting.release()
+
+        logger.info(
+            json.dumps(
+                {"event": "token_cache.evicted", "entries": entries,
+                 "size_bytes": total, **self.stats()}
+            )
+        )
+
+    # --------------------------------------------------------------- metrics
+    def stats(self) -> Dict[str, float]:
+        """Return hit / miss counters since startup."""
+        with self._lock:
+            lookups = self._memo_hits + self._disk_hits + self._misses
+            hits = self._memo_hits + self._disk_hits
+            return {
+                "memo_hits": self._memo_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+token_cache = TokenCache()
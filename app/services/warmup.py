@@ -0,0 +1,142 @@
+"""Process warmup: load the spaCy pipeline before the first request needs it.
+
+:func:`start` (called from the lifespan hook) loads a spaCy pipeline of
+:mod:`app.services.package_text_tokenizer` on a background thread and runs
+one tokenization through it, so the model files are read and the vector
+table is loaded before the first query after a deploy. ``GET /ready``
+reports :func:`status` and is 503 until warmup is done (for good, if the
+model failed to load).
+
+Warmup loads one pipeline. A process keeps up to ``NLP_MAX_PIPELINES``
+(see :func:`use_pipeline`), loading more only while that many threads
+tokenize at once. Each is a full ``spacy.load`` (weights, vocab, strings);
+only the vector table is shared between the pipelines of a process, so a
+process needs about one vector table plus ``NLP_MAX_PIPELINES`` times a
+pipeline without vectors.
+
+Uvicorn's ``--workers`` start each worker as a fresh interpreter, so every
+worker loads its own table. The Docker image instead runs gunicorn
+``--preload`` with ``NLP_PRELOAD_ON_IMPORT=1``: the master loads one
+pipeline at import time and freezes it out of the cyclic GC, and each forked
+worker inherits it as the first pipeline of its pool. Its pages are shared
+copy-on-write only until written: tokenizing adds strings to its vocab and
+caches, so a busy worker gradually copies the parts it touches, while the
+vector table, which is only read, stays shared. Pipelines a worker loads
+later are its own.
+
+Startup time (import to ready) and the process' resident memory are logged
+when warmup finishes and served by ``/ready``. They are measured after the
+warmup pipeline only, not after the pool has grown; ``pss_bytes`` (Linux
+only) counts shared pages once per sharer and, read again under load, shows
+what forking still saves.
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from talkingdb.logger.console import logger
+
+from app.core import config
+from app.services.package_text_tokenizer import TextTokenizer, use_pipeline
+
+
+_IMPORTED_AT = time.monotonic()
+
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_ready = threading.Event()
+_state: Dict[str, Any] = {"error": None}
+
+
+def memory_usage() -> Dict[str, int]:
+    """Return this process' resident (and proportional) memory in bytes."""
+    memory: Dict[str, int] = {}
+    try:
+        with open("/proc/self/smaps_rollup") as fh:
+            for line in fh:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    memory[f"{key.lower()}_bytes"] = int(value.split()[0]) * 1024
+    except OSError:
+        import resource
+
+        # ru_maxrss is the peak, in bytes on macOS and KiB elsewhere.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        memory["rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+    return memory
+
+
+def _load() -> None:
+    start = time.monotonic()
+    with use_pipeline():
+        pass
+    TextTokenizer().tokenize("warmup")
+    _state["warmup_seconds"] = round(time.monotonic() - start, 3)
+
+
+def _finish() -> None:
+    _state["startup_seconds"] = round(time.monotonic() - _IMPORTED_AT, 3)
+    _state.update(memory_usage())
+    if _state["error"] is None:
+        _ready.set()
+    logger.info(
+        f"[warmup] pid {os.getpid()} "
+        f"{'ready' if _ready.is_set() else 'not ready'} after "
+        f"{_state['startup_seconds']}s "
+        f"(model {_state.get('warmup_seconds', '-')}s), "
+        f"rss {_state.get('rss_bytes', 0) // 1024 ** 2}MB"
+        + (
+            f", pss {_state['pss_bytes'] // 1024 ** 2}MB"
+            if "pss_bytes" in _state
+            else ""
+        )
+    )
+
+
+def _run() -> None:
+    try:
+        if "warmup_seconds" not in _state:
+            _load()
+    except Exception as exc:
+        # Stay unready: every tokenization would fail the same way.
+        _state["error"] = f"{type(exc).__name__}: {exc}"
+        logger.exception("[warmup] failed to load the spaCy pipeline")
+    _finish()
+
+
+def preload() -> None:
+    """Load the pipeline now, before the process forks workers."""
+    with _lock:
+        if "warmup_seconds" in _state:
+            return
+        _load()
+    # Keep the loaded objects out of later collections so the GC does not
+    # write to (and un-share) their pages in forked workers.
+    gc.freeze()
+
+
+def start() -> None:
+    """Warm the process up on a background thread. Idempotent."""
+    global _thread
+
+    with _lock:
+        if _thread is not None:
+            return
+        if not config.NLP_PRELOAD:
+            _finish()
+            return
+        _thread = threading.Thread(target=_run, name="tdb-warmup", daemon=True)
+        _thread.start()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def status() -> Dict[str, Any]:
+    """Return readiness, startup timings and memory of this process."""
+    return {"ready": _ready.is_set(), "pid": os.getpid(), **_state}
@@ -1,15 +1,32 @@
 
 from talkingdb.models.graph.graph import GraphModel
 from talkingdb.helpers.job import store as job_store
-from talkingdb.clients.sqlite import sqlite_conn
+from app.core import config
+from app.core.sqlite_pool import incremental_vacuum, sqlite_conn
 
-from app.services import job_daemon
+from app.services import (
+    generations,
+    graph_store,
+    job_daemon,
+    job_groups,
+    lexicon,
+    symbol_table,
+    token_cache,
+)
 
 
 def init_database():
     with sqlite_conn() as conn:
         GraphModel.init_db(conn)
+        generations.init_db(conn)
+        symbol_table.init_db(conn)
+        lexicon.init_db(conn)
+        token_cache.init_db(conn)
+        graph_store.init_db(conn)
         job_store.init_db(conn)
+        job_groups.init_db(conn)
+    if config.SQLITE_INCREMENTAL_VACUUM_PAGES > 0:
+        incremental_vacuum(config.SQLITE_INCREMENTAL_VACUUM_PAGES)
     print("Database initialized.")
 
 
@@ -0,0 +1,241 @@
+"""Benchmark the tokenizer's spaCy pipeline profiles and check equivalence.
+
+Each profile runs in its own process, so load time and resident memory are
+measured from a clean interpreter. Every profile tokenizes the corpus (one
+text per line) in both modes the indexer uses (strict and non-strict); its
+tokens and generated symbols must equal those of the reference, which is
+the first profile given or a file written earlier with ``--write-reference``.
+
+Each profile also checks the query fast path on every line: the lexicon's
+re-implementation of the Matcher rules (``_rule_matches``) must find exactly
+what ``matcher(doc)`` finds, and tokens assembled from the doc's own lemmas
+and adjective flags must equal the pipeline's tokens.
+
+    python bench_tokenizer.py corpus.txt
+    python bench_tokenizer.py corpus.txt --profiles full --write-reference ref.jsonl
+    python bench_tokenizer.py corpus.txt --baseline old_tokenizer.py --write-reference ref.jsonl
+    python bench_tokenizer.py corpus.txt --profiles lean --reference ref.jsonl
+
+``--baseline`` takes a copy of an earlier ``package_text_tokenizer.py`` and
+writes the output of its ``TextTokenizer`` instead of a profile's, without
+timing it or checking it.
+
+``bench_tokenizer_corpus.txt`` is the reference corpus and
+``bench_tokenizer_reference.jsonl`` the output of the tokenizer as it was
+before the profiles existed (``make tokenizer-reference`` regenerates it
+from ``BASELINE``, a git revision). ``make check-tokenizer`` compares both
+profiles with it, as does ``tests/test_tokenizer_reference.py`` for "lean".
+
+Exits with status 1 when any profile differs from the reference or fails
+the fast-path check.
+"""
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+# ------------------------------------------------------------
+# Worker (runs in a fresh process per profile)
+# ------------------------------------------------------------
+
+def run_profile(profile, texts, repeat):
+    from app.services.package_symbol_generator import SymbolGenerator
+    from app.services.package_text_tokenizer import (
+        TextTokenizer,
+        _assemble,
+        _rule_matches,
+        use_pipeline,
+    )
+    from app.services.warmup import memory_usage
+
+    before = memory_usage()
+    start = time.perf_counter()
+    with use_pipeline(profile=profile) as (nlp, _):
+        load_seconds = time.perf_counter() - start
+        components = list(nlp.pipe_names)
+        vectors = int(nlp.vocab.vectors.shape[0])
+        words = sum(len(nlp.make_doc(text.lower())) for text in texts)
+
+    tokenizer = TextTokenizer(profile=profile)
+    tokenizer.tokenize("warmup")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        outputs = [
+            [tokenizer.tokenize(text), tokenizer.tokenize(text, False)]
+            for text in texts
+        ]
+    elapsed = time.perf_counter() - start
+
+    with use_pipeline(profile=profile) as (nlp, matcher):
+        fast_path = fast_path_mismatches(
+            nlp, matcher, texts, outputs, _rule_matches, _assemble,
+        )
+
+    generator = SymbolGenerator()
+    after = memory_usage()
+    return {
+        "profile": profile,
+        "components": components,
+        "vectors": vectors,
+        "load_seconds": load_seconds,
+        "us_per_token": elapsed * 1e6 / max(words * repeat * 2, 1),
+        "rss_mb": (after.get("rss_bytes", 0) - before.get("rss_bytes", 0)) / 2 ** 20,
+        "fast_path": fast_path,
+        "outputs": [
+            {
+                "tokens": pair,
+                "symbols": [generator.generate(tokens) for tokens in pair],
+            }
+            for pair in outputs
+        ],
+    }
+
+
+def run_baseline(path, texts):
+    """Return the outputs of the ``TextTokenizer`` defined in file ``path``."""
+    import importlib.util
+
+    from app.services.package_symbol_generator import SymbolGenerator
+
+    spec = importlib.util.spec_from_file_location("baseline_tokenizer", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    tokenizer = module.TextTokenizer()
+    generator = SymbolGenerator()
+    outputs = []
+    for text in texts:
+        pair = [tokenizer.tokenize(text), tokenizer.tokenize(text, False)]
+        outputs.append({
+            "tokens": pair,
+            "symbols": [generator.generate(tokens) for tokens in pair],
+        })
+    return outputs
+
+
+def fast_path_mismatches(nlp, matcher, texts, outputs, rule_matches, assemble):
+    """Return lines where the lexicon fast path would differ from the pipeline."""
+    problems = []
+    for number, (text, expected) in enumerate(zip(texts, outputs), start=1):
+        doc = nlp(text.lower())
+        want = sorted(
+            (nlp.vocab.strings[match_id], start, end)
+            for match_id, start, end in matcher(doc)
+        )
+        got = sorted(
+            rule_matches(
+                [token.lemma_ for token in doc],
+                [token.pos_ == "ADJ" for token in doc],
+            )
+        )
+        words = [(token.lemma_, token.is_alpha, token.is_stop) for token in doc]
+        fast = [assemble(got, words, True), assemble(got, words, False)]
+        if want != got:
+            problems.append(
+                f"  line {number}: rules {got} but Matcher {want}"
+            )
+        elif fast != expected:
+            problems.append(
+                f"  line {number}: fast path {fast[0]} but pipeline {expected[0]}"
+            )
+    return problems
+
+
+# ------------------------------------------------------------
+# Reporting
+# ------------------------------------------------------------
+
+def diff(expected, actual, texts, limit=5):
+    """Return up to ``limit`` lines describing where outputs differ."""
+    lines = []
+    if len(expected) != len(actual):
+        return [f"  corpus size differs: {len(expected)} vs {len(actual)}"]
+    for number, (want, got) in enumerate(zip(expected, actual), start=1):
+        if want != got:
+            lines.append(
+                f"  line {number}: {texts[number - 1][:60]!r}\n"
+                f"    expected {want['tokens']}\n"
+                f"    got      {got['tokens']}"
+            )
+            if len(lines) >= limit:
+                break
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", help="UTF-8 text file, one text per line ('-' for stdin)")
+    parser.add_argument("--profiles", default="full,lean")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--reference", help="JSONL reference output to compare against")
+    parser.add_argument("--write-reference", help="write the first profile's output here")
+    parser.add_argument(
+        "--baseline",
+        help="write this tokenizer module's output with --write-reference instead",
+    )
+    args = parser.parse_args()
+
+    source = sys.stdin if args.corpus == "-" else open(args.corpus, encoding="utf-8")
+    with source:
+        texts = [line.rstrip("\n") for line in source if line.strip()]
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    context = multiprocessing.get_context("spawn")
+
+    if args.baseline:
+        if not args.write_reference:
+            parser.error("--baseline needs --write-reference")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            outputs = pool.submit(run_baseline, args.baseline, texts).result()
+        with open(args.write_reference, "w", encoding="utf-8") as fh:
+            for output in outputs:
+                fh.write(json.dumps(output) + "\n")
+        print(f"{len(texts)} texts of {args.baseline} written to {args.write_reference}")
+        return
+
+    results = []
+    for profile in profiles:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.append(
+                pool.submit(run_profile, profile, texts, max(args.repeat, 1)).result()
+            )
+
+    if args.write_reference:
+        with open(args.write_reference, "w", encoding="utf-8") as fh:
+            for output in results[0]["outputs"]:
+                fh.write(json.dumps(output) + "\n")
+
+    if args.reference:
+        reference_name = Path(args.reference).name
+        with open(args.reference, encoding="utf-8") as fh:
+            reference = [json.loads(line) for line in fh if line.strip()]
+    else:
+        reference_name = results[0]["profile"]
+        reference = results[0]["outputs"]
+
+    print(f"{len(texts)} texts, reference: {reference_name}\n")
+    print(f"{'profile':<8} {'load s':>7} {'us/token':>9} {'rss MB':>8} {'vectors':>8}  equivalent  fast path  components")
+    failed = False
+    for result in results:
+        problems = diff(reference, result["outputs"], texts)
+        fast_path = result["fast_path"]
+        failed = failed or bool(problems) or bool(fast_path)
+        print(
+            f"{result['profile']:<8} {result['load_seconds']:>7.2f} "
+            f"{result['us_per_token']:>9.1f} {result['rss_mb']:>8.0f} "
+            f"{result['vectors']:>8}  {'yes' if not problems else 'NO':<10}  "
+            f"{'yes' if not fast_path else 'NO':<9}  "
+            f"{','.join(result['components'])}"
+        )
+        for line in problems + fast_path[:5]:
+            print(line)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Chunked PDF parsing against a fake page-aware parser.
+
+The fake parser numbers elements from ``e0`` and pages from 1 within each
+file it is given, like a real parse of a chunk. Stitching the chunks must
+give the same elements, pages, caption references and outline as one
+single-pass parse of the whole file.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("talkingdb")
+pypdf = pytest.importorskip("pypdf")
+
+from app.core import config  # noqa: E402
+from app.services import chunked_parse  # noqa: E402
+from app.services.chunked_parse import IndexType  # noqa: E402
+
+# One entry per page: ("h", level, text), ("p", text) or ("t", text), a
+# table captioned by the paragraph before it.
+BOOK = [
+    [("h", 1, "Intro"), ("p", "intro body")],
+    [("p", "intro more"), ("t", "intro table")],
+    [("h", 2, "Scope"), ("p", "scope body")],
+    [("p", "scope more")],
+    [("h", 1, "Method"), ("h", 2, "Data"), ("p", "data body")],
+    [("p", "data more"), ("t", "data table")],
+    [("p", "data note"), ("t", "data note table")],
+    [("h", 2, "Model"), ("p", "model body")],
+    [("h", 1, "Results")],
+    [("p", "results body"), ("t", "results table")],
+]
+PAGE_WIDTH = 200
+
+
+def _write_book(path):
+    writer = pypdf.PdfWriter()
+    for number in range(len(BOOK)):
+        # The page width tells the fake parser which book page it is.
+        writer.add_blank_page(width=PAGE_WIDTH + number, height=200)
+    with open(path, "wb") as fh:
+        writer.write(fh)
+
+
+def _fake_parse(fh, filename):
+    """Parse the book pages in ``fh`` as the CE parser would parse a file."""
+    pages = [
+        int(page.mediabox.width) - PAGE_WIDTH for page in pypdf.PdfReader(fh).pages
+    ]
+    elements, outline, open_headings = [], [], []
+    last_para = None
+    for page_no, book_page in enumerate(pages, start=1):
+        for block in BOOK[book_page]:
+            element_id = f"e{len(elements)}"
+            element = {"id": element_id, "page": page_no, "text": block[-1]}
+            if block[0] == "h":
+                level = block[1]
+                node = {"id": element_id, "label": block[2], "index": f"h{level}"}
+                while open_headings and open_headings[-1][0] >= level:
+                    open_headings.pop()
+            else:
+                index = IndexType.PARA if block[0] == "p" else IndexType.TABLE
+                node = {"id": element_id, "label": block[1], "index": index}
+                if block[0] == "t":
+                    element["caption_ref_id"] = last_para
+                else:
+                    last_para = element_id
+            node["child"] = []
+            parent = open_headings[-1][1]["child"] if open_headings else outline
+            parent.append(node)
+            if block[0] == "h":
+                open_headings.append((block[1], node))
+            elements.append(element)
+    return {
+        "document": {"id": "doc", "name": filename, "elements": elements},
+        "file_index": {"id": "doc-index", "filename": filename, "nodes": outline},
+    }
+
+
+class _FakeParserClient:
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(max_workers=4)
+        self.requests = 0
+
+    def submit(self, upload, metadata):
+        self.requests += 1
+
+        def run():
+            try:
+                return _fake_parse(upload.file, upload.filename)
+            finally:
+                upload.file.close()
+
+        return self.pool.submit(run)
+
+
+def _canonical(result):
+    """Replace ids by element text so the two parses can be compared."""
+    elements = result["document"]["elements"]
+    ids = [element["id"] for element in elements]
+    assert len(ids) == len(set(ids)), "element ids repeat across chunks"
+    text = {element["id"]: element["text"] for element in elements}
+
+    def outline(nodes):
+        return [
+            (text[node["id"]], node["label"], node["index"], outline(node["child"]))
+            for node in nodes
+        ]
+
+    return {
+        "document_id": result["document"]["id"],
+        "elements": [
+            (e["text"], e["page"], text.get(e.get("caption_ref_id")))
+            for e in elements
+        ],
+        "outline": outline(result["file_index"]["nodes"]),
+    }
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PARSE_SPLIT_PAGES", 3)
+    monkeypatch.setattr(config, "PARSE_SPLIT_MIN_PAGES", 4)
+    monkeypatch.setattr(chunked_parse.spool, "SPOOL_DIR", str(tmp_path))
+    path = tmp_path / "book.pdf"
+    _write_book(path)
+    return str(path)
+
+
+def test_chunked_parse_matches_single_pass(book, monkeypatch):
+    fake = _FakeParserClient()
+    monkeypatch.setattr(chunked_parse, "parser_client", fake)
+
+    page_count = chunked_parse.split_page_count("book.pdf", book)
+    assert page_count == len(BOOK)
+
+    stitched = chunked_parse.parse_in_chunks(book, "book.pdf", None, page_count)
+    with open(book, "rb") as fh:
+        single = _fake_parse(fh, "book.pdf")
+
+    assert fake.requests == 4
+    assert _canonical(stitched) == _canonical(single)
+
+
+def test_stitch_keeps_non_schema_fields():
+    first = {
+        "document": {
+            "id": "doc",
+            "elements": [{"id": "e0", "page": 1, "ref_id": "e0", "text": "a"}],
+        },
+        "file_index": {"id": "idx", "nodes": []},
+    }
+    second = {
+        "document": {
+            "id": "doc",
+            "elements": [{"id": "e0", "page": 1, "ref_id": "e0", "text": "b"}],
+        },
+        "file_index": {"id": "idx", "nodes": []},
+    }
+
+    stitched = chunked_parse.stitch_results([first, second], [0, 5])
+
+    assert stitched["document"]["id"] == "doc"
+    assert stitched["document"]["elements"] == [
+        {"id": "e0", "page": 1, "ref_id": "e0", "text": "a"},
+        {"id": "e0~1", "page": 6, "ref_id": "e0", "text": "b"},
+    ]
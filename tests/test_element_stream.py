@@ -0,0 +1,56 @@
+"""Spooling an element NDJSON body and reading it back as a parse result."""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+pytest.importorskip("talkingdb")
+
+from app.services import element_stream  # noqa: E402
+
+
+async def _chunks(body: bytes, size: int = 7):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def _spool(body: bytes, max_bytes: int = 1024 ** 2):
+    return asyncio.run(
+        element_stream.spool_body(_chunks(body), 1024, max_bytes)
+    )
+
+
+@pytest.fixture(autouse=True)
+def spool_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(element_stream.spool, "SPOOL_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _ndjson(*records):
+    return b"".join(json.dumps(r).encode() + b"\n" for r in records)
+
+
+def test_spool_and_load_round_trip():
+    body = _ndjson(
+        {"metadata": {"source": "test"}},
+        {"document": {"id": "doc", "elements": [{"id": "a"}]}},
+        {"document": {"id": "doc", "elements": [{"id": "b"}, {"id": "c"}]}},
+    )
+
+    temp_path, metadata, size, parts = _spool(body)
+
+    assert metadata == {"source": "test"}
+    assert (size, parts) == (len(body), 2)
+    result = element_stream.load(temp_path)
+    assert result["file_index"] is None
+    assert [e["id"] for e in result["document"]["elements"]] == ["a", "b", "c"]
+
+
+def test_rejected_body_leaves_no_spool(spool_dir):
+    with pytest.raises(element_stream.StreamFormatError):
+        _spool(_ndjson({"document": {}}, {"metadata": {}}))
+    with pytest.raises(element_stream.StreamTooLarge):
+        _spool(_ndjson({"document": {"elements": []}}), max_bytes=10)
+    assert os.listdir(spool_dir) == []
@@ -0,0 +1,74 @@
+"""Lexicon entries are kept apart per pipeline."""
+
+import sqlite3
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("talkingdb")
+
+from app.services import generations, lexicon as lexicon_module  # noqa: E402
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+
+    @contextmanager
+    def sqlite_conn():
+        yield conn
+        conn.commit()
+
+    monkeypatch.setattr(lexicon_module, "sqlite_conn", sqlite_conn)
+    generations.init_db(conn)
+    lexicon_module.init_db(conn)
+    return conn
+
+
+def _doc(*analyses):
+    return [
+        SimpleNamespace(text=text, lemma_=lemma, pos_=pos)
+        for text, lemma, pos in analyses
+    ]
+
+
+def test_entries_are_keyed_by_pipeline(conn):
+    lexicon = lexicon_module.Lexicon()
+    lexicon.observe("old", _doc(("drugs", "drug", "NOUN"), ("new", "new", "ADJ")))
+    lexicon.flush()
+
+    assert lexicon.lookup("old", ["drugs", "new"]) == {
+        "drugs": ("drug", False),
+        "new": ("new", True),
+    }
+    # Another model, version or profile starts from an empty lexicon.
+    assert lexicon.lookup("new", ["drugs"]) is None
+
+    # A different analysis under another pipeline is not a conflict.
+    lexicon.observe("new", _doc(("drugs", "drugs", "NOUN")))
+    lexicon.flush()
+    assert lexicon.lookup("new", ["drugs"]) == {"drugs": ("drugs", False)}
+    assert lexicon.lookup("old", ["drugs"]) == {"drugs": ("drug", False)}
+
+    # Within one pipeline it still is.
+    lexicon.observe("old", _doc(("drugs", "drugs", "NOUN")))
+    lexicon.flush()
+    assert lexicon.lookup("old", ["drugs"]) is None
+    assert lexicon.lookup("new", ["drugs"]) == {"drugs": ("drugs", False)}
+
+
+def test_unkeyed_table_is_replaced():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE lexicon (form TEXT PRIMARY KEY, lemma TEXT NOT NULL, "
+        "flags INTEGER NOT NULL)"
+    )
+    conn.execute("INSERT INTO lexicon VALUES ('drugs', 'drug', 0)")
+
+    lexicon_module.init_db(conn)
+    lexicon_module.init_db(conn)
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(lexicon)")]
+    assert columns == ["pipeline", "form", "lemma", "flags"]
+    assert conn.execute("SELECT COUNT(*) FROM lexicon").fetchone() == (0,)
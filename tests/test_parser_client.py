@@ -0,0 +1,137 @@
+"""ParserClient against a local stand-in CE server.
+
+The stand-in client does blocking HTTP inside its ``parse_file`` coroutine,
+the worst case for a shared event loop: parses must still overlap and the
+request timeout must still fire.
+"""
+
+import json
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("talkingdb_ce")
+
+from app.core import config  # noqa: E402
+from app.services import parser_client as pc  # noqa: E402
+
+DELAY = 0.5
+
+
+class _StandInCE(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(float(self.headers.get("X-Delay", DELAY)))
+        payload = json.dumps({"document": {"name": body.decode()}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StandInCE)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/parse"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class _BlockingClient:
+    def __init__(self, url):
+        self.url = url
+
+    async def parse_file(self, file, metadata):
+        request = urllib.request.Request(
+            self.url,
+            data=file.file.read(),
+            headers={"X-Delay": str(metadata or DELAY)},
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    monkeypatch.setattr(config, "PARSE_MAX_CONCURRENCY", 4)
+    monkeypatch.setattr(config, "PARSE_REQUEST_TIMEOUT_SECONDS", 2)
+    monkeypatch.setattr(config, "HEARTBEAT_MIN_GAP_SECONDS", 0.05)
+    parser = pc.ParserClient(client_factory=lambda: _BlockingClient(server))
+    parser.start()
+    yield parser
+    parser.stop()
+
+
+def _spool(tmp_path, name):
+    path = tmp_path / name
+    path.write_text(name)
+    return str(path)
+
+
+def test_blocking_parses_run_in_parallel(client, tmp_path):
+    paths = [_spool(tmp_path, f"doc{i}") for i in range(4)]
+    results = [None] * len(paths)
+
+    def run(i):
+        results[i] = client.parse(paths[i], f"doc{i}", None)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(paths))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    assert [r["document"]["name"] for r in results] == [
+        f"doc{i}" for i in range(4)
+    ]
+    assert elapsed < 2 * DELAY
+
+
+def test_timeout_fires_while_lane_is_blocked(client, tmp_path):
+    started = time.monotonic()
+    with pytest.raises(pc.ParseTimeout):
+        client.parse(_spool(tmp_path, "slow"), "slow", 3)
+    assert time.monotonic() - started < 2.5
+
+    # The other lanes keep serving while the timed-out one is still blocked.
+    result = client.parse(_spool(tmp_path, "next"), "next", None)
+    assert result["document"]["name"] == "next"
+
+
+def test_concurrency_is_capped(client, tmp_path, monkeypatch):
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+    inner = _BlockingClient.parse_file
+
+    async def counting(self, file, metadata):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        try:
+            return await inner(self, file, metadata)
+        finally:
+            with lock:
+                active -= 1
+
+    monkeypatch.setattr(_BlockingClient, "parse_file", counting)
+    paths = [_spool(tmp_path, f"cap{i}") for i in range(8)]
+    futures = [
+        client.submit(pc.UploadFile(filename="f", file=open(p, "rb")), 0.1)
+        for p in paths
+    ]
+    for future in futures:
+        client.wait(future)
+    assert peak == config.PARSE_MAX_CONCURRENCY
@@ -0,0 +1,46 @@
+"""The "lean" profile tokenizes the bench corpus as the original tokenizer did."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+spacy = pytest.importorskip("spacy")
+pytest.importorskip("talkingdb")
+
+from app.services.package_text_tokenizer import (  # noqa: E402
+    DEFAULT_MODEL,
+    TextTokenizer,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+CORPUS = ROOT / "bench_tokenizer_corpus.txt"
+REFERENCE = ROOT / "bench_tokenizer_reference.jsonl"
+
+if not spacy.util.is_package(DEFAULT_MODEL):
+    pytest.skip(f"spaCy model {DEFAULT_MODEL} is not installed", allow_module_level=True)
+
+
+def test_lean_profile_matches_reference():
+    assert REFERENCE.exists(), (
+        f"{REFERENCE.name} is missing; run `make tokenizer-reference`"
+    )
+    texts = [
+        line.rstrip("\n")
+        for line in CORPUS.read_text(encoding="utf-8").splitlines()
+        if line.strip()
+    ]
+    reference = [
+        json.loads(line)["tokens"]
+        for line in REFERENCE.read_text(encoding="utf-8").splitlines()
+        if line.strip()
+    ]
+    assert len(reference) == len(texts)
+
+    tokenizer = TextTokenizer(profile="lean")
+    mismatches = []
+    for number, (text, expected) in enumerate(zip(texts, reference), start=1):
+        got = [tokenizer.tokenize(text), tokenizer.tokenize(text, False)]
+        if got != expected:
+            mismatches.append(f"line {number}: {expected[0]} != {got[0]}")
+    assert not mismatches, "\n".join(mismatches[:5])